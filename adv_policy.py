@@ -0,0 +1,103 @@
+""" adv_policy.py """
+# Advertising schedule for the wake-up advertising window.
+#
+# Each window starts with a short burst at a fast interval, so a gateway
+# that is already scanning connects within a few hundred milliseconds, and
+# then backs off to slower intervals. How long the window lasts is learned
+# from the last _HISTORY windows, kept in the RTC memory section "A" as
+# (hour of day, connection latency) pairs followed by the number of
+# windows missed in a row:
+#
+#   - no history yet: the fixed 30 s window
+#   - the gateway connected before: twice the slowest recent latency,
+#     preferring windows at the same hour of day, doubled again for every
+#     window missed since the last connection
+#   - the gateway missed every recent window at this hour (or every
+#     window at all): only a short probe
+#   - every _FULL_WINDOW_EVERY-th window missed in a row: the full window,
+#     so a gateway that has become slower to connect is found again
+import struct
+
+_RTC_SECTION = "A"
+_HISTORY = 8
+_ENTRY_FORMAT = "<BH"       # hour, latency in 100 ms units
+_ENTRY_SIZE = 3
+_MISSED = 0xFFFF            # latency of a window without a connection
+_MISS_WRAP = 240            # misses in a row are counted 1..240, a multiple of _FULL_WINDOW_EVERY
+
+_ADAPTIVE = True
+_FIXED_INTERVAL_US = 1_000_000
+_DEFAULT_WINDOW_MS = 30 * 1000
+_MIN_WINDOW_MS = 3 * 1000
+_MAX_WINDOW_MS = 30 * 1000
+_WINDOW_MARGIN = 2
+_FULL_WINDOW_EVERY = 4
+
+# (interval, step length); the last step runs until the window ends.
+_STEPS = (
+    (100_000, 1_000),
+    (250_000, 4_000),
+    (500_000, 10_000),
+    (1_000_000, None),
+)
+
+class AdvertisingPolicy:
+    def __init__(self, rtc_manager):
+        self.rtc_manager = rtc_manager
+        self.history = []  # oldest first
+        self.misses = 0    # windows missed since the last connection
+        saved = rtc_manager.get_section(_RTC_SECTION)
+        if saved:
+            for pos in range(0, len(saved) - _ENTRY_SIZE + 1, _ENTRY_SIZE):
+                self.history.append(struct.unpack_from(_ENTRY_FORMAT, saved, pos))
+            if len(saved) % _ENTRY_SIZE:
+                self.misses = saved[-1]
+
+    # ------------------------- Window -------------------------
+    def window_ms(self, hour):
+        """How long to advertise in a window starting at the given hour."""
+        if not _ADAPTIVE or not self.history:
+            return _DEFAULT_WINDOW_MS
+        if self.misses and self.misses % _FULL_WINDOW_EVERY == 0:
+            return _DEFAULT_WINDOW_MS
+
+        same_hour = [latency for h, latency in self.history if h == hour]
+        if len(same_hour) >= 2 and all(latency == _MISSED for latency in same_hour):
+            return _MIN_WINDOW_MS
+
+        latencies = [latency for latency in same_hour if latency != _MISSED]
+        if not latencies:
+            latencies = [latency for h, latency in self.history if latency != _MISSED]
+        if not latencies:
+            return _MIN_WINDOW_MS if len(self.history) >= _HISTORY else _DEFAULT_WINDOW_MS
+
+        # Back off after misses: the gateway may take longer than it used to.
+        window = max(latencies) * 100 * _WINDOW_MARGIN << min(self.misses, _FULL_WINDOW_EVERY)
+        return min(max(window, _MIN_WINDOW_MS), _MAX_WINDOW_MS)
+
+    def schedule(self, hour):
+        """Yield (interval_us, duration_ms) steps covering the window."""
+        remaining = self.window_ms(hour)
+        if not _ADAPTIVE:
+            yield _FIXED_INTERVAL_US, remaining
+            return
+        for interval_us, duration_ms in _STEPS:
+            if remaining <= 0:
+                return
+            step = remaining if duration_ms is None else min(duration_ms, remaining)
+            yield interval_us, step
+            remaining -= step
+
+    # ------------------------- History -------------------------
+    def record(self, hour, latency_ms):
+        """Remember how the window went; latency_ms is None without a connection."""
+        latency = _MISSED if latency_ms is None else min(latency_ms // 100, _MISSED - 1)
+        self.history.append((hour, latency))
+        self.history = self.history[-_HISTORY:]
+        self.misses = 0 if latency_ms is not None else self.misses % _MISS_WRAP + 1
+
+        data = bytearray(_ENTRY_SIZE * len(self.history) + 1)
+        for n, entry in enumerate(self.history):
+            struct.pack_into(_ENTRY_FORMAT, data, n * _ENTRY_SIZE, *entry)
+        data[-1] = self.misses
+        self.rtc_manager.set_section(_RTC_SECTION, data)
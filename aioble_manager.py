@@ -2,18 +2,81 @@
 import aioble
 import bluetooth
 import json
+import time
 import uasyncio as asyncio
 import file_utils
+import ble_frames
+import alert_rules
+import awake_budget
+import channel_schedule
+import diagnostics
+from adv_policy import AdvertisingPolicy
+from export_pipeline import ExportPipeline
+import heap_probe
+import payload_spool
+import write_behind
 
 _ENV_SERVICE_UUID = bluetooth.UUID("5f97247b-4474-424c-a826-f8ec299b6937")
 _ENV_SETTING_UUID = bluetooth.UUID("5f97247b-4474-424c-a826-f8ec299b6938")
 _ENV_TEMP_UUID = bluetooth.UUID("5f97247b-4474-424c-a826-f8ec299b6939")
+_ENV_DIAG_UUID = bluetooth.UUID("5f97247b-4474-424c-a826-f8ec299b693a")
 
-_ADV_INTERVAL_US = 1_000_000 # 1sec
-_ADV_DURATION_MS = 30 * 1000 # 30sec
+_ADV_INTERVAL_US = 1_000_000 # 1sec, registration advertising (wake-up advertising: adv_policy.py)
 _DEVICE_NAME = "NLTHSensor"
 
+_ALERT_INTERVAL_US = 100_000  # alert burst (see alert_rules.py): fast interval, short window
+_ALERT_BURST_MS = 3 * 1000
+_ALERT_COMPANY_ID = 0xFFFF    # manufacturer data company ID reserved for testing
+
 _BLE_CHUNK_SIZE = 5
+_BLE_BLOCK_SIZE = 50   # records per deflate block in compressed mode
+_BLE_FRAME_SIZE = 20   # notification payload at the default ATT MTU of 23, until one is exchanged
+_NOTIFY_PACING_MS = 300
+_TX_BUF_SIZE = 512     # size of each export buffer (and of the spool read buffer)
+_PREFETCH_DEPTH = 4    # frames read and encoded ahead of the notifier
+_PREFETCH_ON_CONNECT = True  # start the export pipeline before the trigger write
+
+_SYNC_MAX_DELAY_MS = 2000  # time sync round trips longer than this are not trusted
+_SYNC_RETIME_LOGGED = False  # correct the records logged since the last sync for the measured drift
+
+_TAG_SEGMENT = 0       # export pipeline tags: a log segment was fully sent
+_TAG_SPOOL = 1         # the whole spool was sent
+
+_MAX_CONNECTIONS = 2   # centrals served at once, e.g. the gateway and a maintenance phone
+_WRITE_QUEUE_DEPTH = 4  # writes each capture characteristic holds until they are handled
+_ACCEPT_INTERVAL_US = 500_000  # advertising for another central while connected
+
+class _Session:
+    """One connected central: its own export pipeline (and so its own cursor
+    through the log), time sync and the trigger writes waiting for it."""
+    def __init__(self):
+        self.connection = None
+        # Spooled frames are read into this buffer, then queued for notification
+        # in the preallocated buffers of the export pipeline.
+        self.tx_buf = bytearray(_TX_BUF_SIZE)
+        self.tx_view = memoryview(self.tx_buf)
+        self.export = ExportPipeline(_PREFETCH_DEPTH, _TX_BUF_SIZE)
+        self.sync = None      # (t1, t2, t3) of the last time sync reply
+        self.deliveries = 0   # BLEManager deliveries when the pipeline was started
+        self.triggers = []    # (data, received_ms) of trigger writes not yet handled
+        self.triggered = asyncio.Event()
+        # gatts_notify() sends whether or not the central enabled the CCCD, and
+        # MicroPython does not report CCCD writes, so a central subscribes to
+        # its notifications with a trigger write (after enabling the CCCD).
+        self.subscribed = False
+
+    def open(self, connection):
+        self.connection = connection
+        self.subscribed = False
+        self.sync = None
+        self.triggers = []
+        self.triggered.clear()
+
+    def close(self):
+        self.export.cancel()
+        self.connection = None
+        self.subscribed = False
+        self.sync = None
 
 class BLEManager:
     def __init__(self, rtc_manager):
@@ -21,7 +84,14 @@ class BLEManager:
         self.rtc_manager = rtc_manager
 
         self._name = _DEVICE_NAME
-        self.connected_device = None
+        self.adv_policy = AdvertisingPolicy(rtc_manager)
+
+        # Buffers for every connection are allocated up front (see _Session).
+        self._sessions = [_Session() for _ in range(_MAX_CONNECTIONS)]
+        self._handlers = []   # handle_ble tasks of the connections being served
+        self._export_after = None
+        self._export_lock = asyncio.Lock()
+        self._deliveries = 0  # data dropped as delivered, by any session
 
         # Set up GATT services
         self._setup_gatt_services()
@@ -36,9 +106,10 @@ class BLEManager:
         self.device_setting_char = aioble.BufferedCharacteristic(
             self.service,
             _ENV_SETTING_UUID,
-            max_len=64,  
+            max_len=160,
             write=True,
             capture=True,
+            capture_depth=_WRITE_QUEUE_DEPTH,
         )
 
         # Temperature and humidity data service (Write & Notify)
@@ -49,6 +120,15 @@ class BLEManager:
             write=True,
             notify=True,
             capture=True,
+            capture_depth=_WRITE_QUEUE_DEPTH,
+        )
+
+        # Runtime counters for fleet diagnostics (Read, see diagnostics.py)
+        self.diagnostics_char = aioble.BufferedCharacteristic(
+            self.service,
+            _ENV_DIAG_UUID,
+            max_len=40 + 64,  # counters, then the heap_probe statistics
+            read=True,
         )
 
         # Register GATT services
@@ -65,98 +145,365 @@ class BLEManager:
             )
 
             print(f"Connected to {connection.device}")
-            self.connected_device = connection
-            await self.handle_ble(connection)
+            await self._serve(connection)
 
         print("Device registered and RTC sync complete. BLE advertising stopped.")
 
     async def advertise_for_wakeup(self):
-        """Start advertising for a forced wake-up scenario"""
-        print(f"Advertising BLE device due to forced wake-up...")
+        """Advertise for the gateway: a fast burst, then slower intervals (see adv_policy.py)"""
+        hour = self.rtc_manager.current_hour()
+        print(f"Advertising BLE device for {self.adv_policy.window_ms(hour) // 1000} sec...")
 
+        started = time.ticks_ms()
+        # Log writes wait in RAM until the radio is done (see write_behind.py).
+        write_behind.hold()
         try:
-            connection = await asyncio.wait_for(
-                aioble.advertise(
-                    _ADV_INTERVAL_US,
+            await self._advertise_and_serve(hour, started)
+        finally:
+            write_behind.commit()
+
+    async def _advertise_and_serve(self, hour, started):
+        connection = None
+        for interval_us, duration_ms in self.adv_policy.schedule(hour):
+            try:
+                connection = await aioble.advertise(
+                    interval_us,
                     name=self._name,
-                    services=[self.service.uuid]
-                ),
-                _ADV_DURATION_MS / 1000  # Convert timeout to seconds
-            )
-            print(f"Connected to {connection.device}")
-            self.connected_device = connection
-            await self.handle_ble(connection)
-
-        except asyncio.TimeoutError:
+                    services=[self.service.uuid],
+                    timeout_ms=duration_ms,
+                )
+                break
+            except asyncio.TimeoutError:
+                pass
+
+        if connection is None:
+            self.adv_policy.record(hour, None)
             print("No connection. Advertising timed out.")
+            return
+
+        latency_ms = time.ticks_diff(time.ticks_ms(), started)
+        self.adv_policy.record(hour, latency_ms)
+        print(f"Connected to {connection.device} after {latency_ms} ms")
+        await self._serve(connection)
+
+    async def advertise_alert(self):
+        """Short fast burst right after a sample started an alert, carrying it in manufacturer data"""
+        print(f"🚨 Advertising alert for {_ALERT_BURST_MS // 1000} sec...")
+        started = time.ticks_ms()
+        write_behind.hold()
+        try:
+            try:
+                connection = await aioble.advertise(
+                    _ALERT_INTERVAL_US,
+                    name=self._name,
+                    services=[self.service.uuid],
+                    manufacturer=(_ALERT_COMPANY_ID, alert_rules.adv_payload()),
+                    timeout_ms=_ALERT_BURST_MS,
+                )
+            except asyncio.TimeoutError:
+                print("No connection. Alert advertising timed out.")
+                return
+
+            print(f"Connected to {connection.device} after {time.ticks_diff(time.ticks_ms(), started)} ms")
+            await self._serve(connection)
+        finally:
+            write_behind.commit()
+
+    # ------------------------ Connections ------------------------
+    async def _serve(self, connection):
+        """Serve a central, and the others that connect while it is connected
+        (up to _MAX_CONNECTIONS), until the last one has disconnected"""
+        self._handlers = [asyncio.create_task(self.handle_ble(self._open_session(connection)))]
+        # Writes come in on characteristics shared by all connections and are
+        # passed to the session of the connection that wrote them.
+        tasks = [asyncio.create_task(self._dispatch_triggers()),
+                 asyncio.create_task(self._dispatch_settings())]
+        if _MAX_CONNECTIONS > 1:
+            tasks.append(asyncio.create_task(self._accept(connection)))
+        try:
+            for handler in self._handlers:  # grows as centrals connect
+                await handler
+        finally:
+            for task in tasks + self._handlers:
+                task.cancel()
+            # Cut short by the wake's deadline (see awake_budget.py): let every
+            # connection clean up before the wake goes to sleep.
+            for handler in self._handlers:
+                try:
+                    await handler
+                except asyncio.CancelledError:
+                    pass
+            self._handlers = []
+
+    async def _accept(self, first):
+        """Keep advertising while the first central is connected, so others (a
+        maintenance phone reading diagnostics while the gateway syncs) can
+        connect too. Advertising stops once the first one leaves, or it would
+        just reconnect."""
+        accepting = asyncio.create_task(self._accept_more())
+        try:
+            await first.disconnected()
+        finally:
+            accepting.cancel()
+
+    async def _accept_more(self):
+        # One connection per free session: a central that has been served
+        # and left does not get to connect again in this wake.
+        for _ in range(_MAX_CONNECTIONS - 1):
+            connection = await aioble.advertise(
+                _ACCEPT_INTERVAL_US,
+                name=self._name,
+                services=[self.service.uuid],
+            )
+            if connection is None:
+                return  # cancelled: aioble stops advertising and returns None
+            print(f"Connected to {connection.device} (another central)")
+            self._handlers.append(asyncio.create_task(self.handle_ble(self._open_session(connection))))
+
+    def _free_session(self):
+        for session in self._sessions:
+            if session.connection is None:
+                return session
+        return None
+
+    def _open_session(self, connection):
+        session = self._free_session()
+        session.open(connection)
+        return session
+
+    def _session_of(self, connection):
+        for session in self._sessions:
+            if session.connection is connection and connection is not None:
+                return session
+        return None
+
+    async def _dispatch_triggers(self):
+        """Queue export trigger writes for the session of the connection that wrote them"""
+        dropped = self.temp_humidity_char.capture_overflows
+        while True:
+            connection, data = await self.temp_humidity_char.written()
+            received_ms = self.rtc_manager.rtc_ms()
+            dropped = self._report_dropped(self.temp_humidity_char, dropped)
+            session = self._session_of(connection)
+            if session is not None and data:
+                session.subscribed = True
+                session.triggers.append((data, received_ms))
+                session.triggered.set()
+
+    async def _dispatch_settings(self):
+        """Apply settings writes, on behalf of the session that wrote them"""
+        dropped = self.device_setting_char.capture_overflows
+        while True:
+            connection, data = await self.device_setting_char.written()
+            dropped = self._report_dropped(self.device_setting_char, dropped)
+            if data:
+                await self.process_settings(data, self._session_of(connection))
+
+    def _report_dropped(self, characteristic, dropped):
+        """Report writes lost to a full capture queue since the last check"""
+        if characteristic.capture_overflows != dropped:
+            print(f"⚠️ {characteristic.capture_overflows - dropped} writes dropped, write queue full")
+            diagnostics.error(diagnostics.ERR_WRITE_QUEUE)
+        return characteristic.capture_overflows
 
     # ------------------------ BLE Data Transmission ------------------------
-    async def handle_ble(self, connection):
+    async def handle_ble(self, session):
         """Handle BLE Read/Notify Requests"""
+        connection = session.connection
+        connected_at = time.ticks_ms()
+        self.diagnostics_char.write(diagnostics.pack())
+        # Read and encode the first frames while the central discovers services.
+        if _PREFETCH_ON_CONNECT:
+            self._start_export(session, None)
         try:
             while connection.is_connected():
                 try:
-                    conn1, data1 = await asyncio.wait_for(self.device_setting_char.written(), 1)
-                    if data1:
-                        await self.process_settings(data1)
+                    await asyncio.wait_for(session.triggered.wait(), 1)
                 except asyncio.TimeoutError:
-                    pass
-
-                try:
-                    conn2, data2 = await asyncio.wait_for(self.temp_humidity_char.written(), 1)
-                    if data2:
-                        await self.time_sync(data2)
-                        await self.send_data()
-                except asyncio.TimeoutError:
-                    pass
+                    continue
+                session.triggered.clear()
+                while session.triggers and connection.is_connected():
+                    data, received_ms = session.triggers.pop(0)
+                    settings = await self.time_sync(session, data, received_ms)
+                    compress = ble_frames.negotiate(settings.get("compress")) if settings else None
+                    await self.send_data(session, compress)
+                    self.diagnostics_char.write(diagnostics.pack())
         
         except Exception as e:
             print(f"BLE Error: {e}")
-            self.connected_device = None
 
-    async def send_data(self):
-        """Send CSV data in BLE_CHUNK_SIZE chunks"""
+        finally:
+            session.close()
+            if connection.is_connected():
+                # Cut short by the wake's deadline (see awake_budget.py)
+                asyncio.create_task(connection.disconnect())
+        print(f"⏱️ Connection time: {time.ticks_diff(time.ticks_ms(), connected_at)} ms")
+
+    def hold_export(self, task):
+        """Make exports wait for a task writing the log alongside advertising"""
+        self._export_after = task
+
+    async def send_data(self, session, compress=None):
+        """Notify the export frames queued by the session's pipeline, deleting data once it is sent"""
+        # Concurrent sessions export one after the other, so the deletions
+        # of one export are settled before the next one sends anything.
+        async with self._export_lock:
+            return await self._send_data(session, compress)
+
+    async def _send_data(self, session, compress):
         try:
-            if not self.connected_device:
-                print("No connected device to send CSV data.")
+            if session.connection is None or not session.subscribed:
+                print("No subscribed device to send CSV data.")
                 return False
 
-            structured_data = file_utils.read_csv_file()
-            if structured_data is None or len(structured_data) == 0:
+            # The frames prefetched at connect time are only usable for the same
+            # format, and only if no other session delivered data since.
+            if not session.export.pristine(compress) or session.deliveries != self._deliveries:
+                self._start_export(session, compress)
+
+            print(f"Sending log via BLE (compress={compress})...")
+            diagnostics.export_started()
+            started = time.ticks_ms()
+            paced_ms = 0
+            sent = 0
+
+            while True:
+                item = await session.export.get()
+                if item is None:
+                    break
+                payload, tag = item
+
+                if payload is not None:
+                    try:
+                        # Only to this session's central, not every subscriber
+                        self.temp_humidity_char.notify(session.connection, payload)
+                    except Exception as e:
+                        print(f"❌ BLE send error (frame {sent + 1}): {e}")
+                        diagnostics.notify_failed()
+                        session.export.cancel()
+                        return False
+
+                    sent += 1
+                    diagnostics.sent(len(payload))
+                    await asyncio.sleep_ms(_NOTIFY_PACING_MS)
+                    paced_ms += _NOTIFY_PACING_MS
+
+                if tag is not None:
+                    if not session.connection.is_connected():
+                        # Frames may have been lost with the link: keep the data.
+                        print("❌ Central disconnected during export, nothing deleted")
+                        session.export.cancel()
+                        return False
+                    self._delivered(tag)
+
+            if not sent:
                 print("No data to send, sent empty response.")
-                return True
-
-            total_batches = (len(structured_data) + _BLE_CHUNK_SIZE - 1) // _BLE_CHUNK_SIZE
-            print(f"Sending {len(structured_data)} records via BLE in {total_batches} batches...")
-
-            for i in range(0, len(structured_data), _BLE_CHUNK_SIZE):
-                batch_data = structured_data[i:i + _BLE_CHUNK_SIZE]
-                json_payload = json.dumps({"data": batch_data}).encode('utf-8') 
-
-                try:
-                    self.temp_humidity_char.write(json_payload, send_update=True)
-                    print(f"Sent batch {i // _BLE_CHUNK_SIZE + 1} / {total_batches}")
-                except Exception as e:
-                    print(f"❌ BLE send error (batch {i // _BLE_CHUNK_SIZE + 1}): {e}")
-                    return False
-
-                await asyncio.sleep(0.3)  
-
+            # The spool no longer matches the log; it is seeded again on the next boot.
+            write_behind.reset_spool()
+            diagnostics.export_done()
+            self._print_sync_time(started, paced_ms)
             print("CSV Data sent successfully.")
-            file_utils.clear_csv_file()
-            print("Sent data cleared, only header remains.")
             return True
 
         except OSError as e:
             print(f"File error: {e}")
+            diagnostics.error(diagnostics.ERR_STORAGE)
+            session.export.cancel()
             return False
 
+    def _start_export(self, session, compress):
+        session.deliveries = self._deliveries
+        session.export.start(self._export_frames(session, compress), compress, self._export_after)
+
+    def _delivered(self, tag):
+        """Drop data whose frames have all been notified"""
+        kind, value, records = tag
+        diagnostics.sent(0, records)
+        if write_behind.dropped(value if kind == _TAG_SEGMENT else None):
+            # Another connection's export delivered it first
+            return
+        self._deliveries += 1
+        if kind == _TAG_SEGMENT:
+            print(f"Sent {records} records from segment {value}")
+            # The whole segment went out, so drop the file instead of rewriting the log.
+            write_behind.delete_segment(value)
+        else:
+            print(f"Sent {records} spooled records")
+            write_behind.clear()
+
+    def _print_sync_time(self, started, paced_ms):
+        """Report total sync time and the CPU share spent outside notification pacing"""
+        total_ms = time.ticks_diff(time.ticks_ms(), started)
+        print(f"⏱️ Sync time: {total_ms} ms (cpu {total_ms - paced_ms} ms)")
+
+    def _export_frames(self, session, compress):
+        """Yield (payload, tag) for a session's export pipeline: the spool as it
+        is on flash when it can be used, otherwise each segment encoded on the fly"""
+        # Data already delivered in this wake (by any connection) waits for
+        # deletion in write_behind.
+        if write_behind.dropped():
+            return
+        if compress is None and payload_spool.exists():
+            records = payload_spool.record_count()
+            # Spooled frames are read into the scratch buffer; the pipeline copies them.
+            for frame in payload_spool.frames(session.tx_view):
+                yield frame, None
+            yield None, (_TAG_SPOOL, None, records)
+            return
+
+        for segment in file_utils.list_segments():
+            if write_behind.dropped(segment):
+                continue
+            structured_data = file_utils.read_csv_file(segment)
+            for payload in self._segment_frames(session, structured_data, compress):
+                yield payload, None
+            yield None, (_TAG_SEGMENT, segment, len(structured_data))
+
+    def _segment_frames(self, session, structured_data, compress):
+        """Yield the notification payloads for one segment"""
+        if compress == ble_frames.COMPRESS_DEFLATE:
+            mtu = session.connection.mtu
+            frame_size = mtu - 3 if mtu else _BLE_FRAME_SIZE
+            for i in range(0, len(structured_data), _BLE_BLOCK_SIZE):
+                with heap_probe.phase("encode"):
+                    frames = ble_frames.deflate_frames(structured_data[i:i + _BLE_BLOCK_SIZE], frame_size)
+                for frame in frames:
+                    yield frame
+        else:
+            for i in range(0, len(structured_data), _BLE_CHUNK_SIZE):
+                with heap_probe.phase("encode"):
+                    payload = ble_frames.encode_batch(structured_data[i:i + _BLE_CHUNK_SIZE])
+                yield payload
+
     # ------------------------ BLE Settings Modification ------------------------
-    async def process_settings(self, data):
+    async def process_settings(self, data, session=None):
         """Process Write Requests (Device Settings Update)"""
         try:
             settings = json.loads(data.decode())
 
+            # Second half of a time sync (see time_sync)
+            if "sync" in settings:
+                self._finish_sync(session, int(settings["sync"]))
+                return
+
+            # Settings that may also come on their own: the awake-time budget per
+            # wake in seconds (see awake_budget.py), the alert rules (alert_rules.py),
+            # the sampling periods of slow channels (channel_schedule.py) and the
+            # acknowledgement of the heap statistics read from diagnostics (heap_probe.py)
+            if "heap_reset" in settings:
+                heap_probe.reset()
+                self.diagnostics_char.write(diagnostics.pack())
+            if "budget" in settings:
+                awake_budget.configure(int(settings["budget"]))
+            if "alerts" in settings:
+                alert_rules.configure(settings["alerts"])
+            if "channels" in settings:
+                channel_schedule.configure(settings["channels"])
+            optional = ("budget" in settings or "alerts" in settings or "channels" in settings
+                        or "heap_reset" in settings)
+            if optional and "time" not in settings and "period" not in settings:
+                return
+
             # Ensure required fields exist
             if not all(k in settings for k in ["time", "period"]):
                 print("Missing required fields in device settings.")
@@ -173,17 +520,57 @@ class BLEManager:
 
         except ValueError:
             print("JSON Parsing Error in Device Settings")
+            diagnostics.error(diagnostics.ERR_SETTINGS)
 
     
-    async def time_sync(self, data):
-        """Time sync"""
+    async def time_sync(self, session, data, received_ms):
+        """Time sync
+
+        With "t1" (central time in ms since 2000-01-01) the clock is synced
+        NTP-style instead of being set to the whole second in "time":
+        the device notifies t1, its receive time t2 and transmit time t3
+        (ble_frames.sync_frame), the central writes back its receive time
+        {"sync": t4} on the settings characteristic, and the RTC is stepped
+        by the offset ((t2 - t1) + (t3 - t4)) / 2, which cancels the write,
+        notification and polling latency as long as both legs are similar.
+        """
         try:
             settings = json.loads(data.decode())
             print(f"📥 Trigger Write Received: {settings}")
 
-            if "time" in settings:
+            if "t1" in settings:
+                t1 = int(settings["t1"])
+                t3 = self.rtc_manager.rtc_ms()
+                self.temp_humidity_char.notify(session.connection, ble_frames.sync_frame(t1, received_ms, t3))
+                session.sync = (t1, received_ms, t3)
+            elif "time" in settings:
                 latest_time = settings["time"]
                 self.rtc_manager.set_rtc_datetime(latest_time) # Time sync
 
+            return settings
+
         except ValueError:
             print("JSON Parsing Error in Time Sync")
+
+    def _finish_sync(self, session, t4):
+        """Apply the clock offset measured by a session's time sync round trip"""
+        if session is None or session.sync is None:
+            print("Time sync reply without a request")
+            return
+        t1, t2, t3 = session.sync
+        session.sync = None
+        delay = (t4 - t1) - (t3 - t2)
+        if not 0 <= delay <= _SYNC_MAX_DELAY_MS:
+            print(f"Time sync rejected: round trip {delay} ms")
+            diagnostics.error(diagnostics.ERR_SETTINGS)
+            return
+        offset = ((t2 - t1) + (t3 - t4)) // 2
+        print(f"⏱️ Clock offset {offset} ms (round trip {delay} ms)")
+        # Records since the last sync were stamped with the clock as it reads now.
+        last_sync, stamped_until = self.rtc_manager.last_sync, self.rtc_manager.current_epoch()
+        self.rtc_manager.adjust_rtc_ms(-offset)
+
+        error_ms = self.rtc_manager.record_sync(offset)
+        # Timestamps only have whole seconds, so smaller errors are left alone.
+        if _SYNC_RETIME_LOGGED and error_ms is not None and abs(error_ms) >= 1000:
+            write_behind.retime(last_sync, stamped_until, error_ms)
@@ -0,0 +1,152 @@
+""" alert_rules.py """
+# Threshold alerts evaluated on every sample.
+#
+# A rule watches one channel of the record ([epoch, temperature, humidity,
+# resistance] on the default board, see sensor_drivers.SENSORS) and fires
+# when the value is above or below a limit, or has moved by more than the
+# limit since the previous sample (a jump in the material resistance). A
+# rule alerts once when it starts firing and then only after its channel
+# is back in range, so a reading that stays high does not advertise on
+# every sample. boot.py answers a new alert with a short advertising
+# burst (BLEManager.advertise_alert) instead of waiting for the next
+# wake-up window.
+#
+# Rules are set with a {"alerts": [[channel, kind, limit], ...]} settings
+# write ({"alerts": []} removes them) and kept in the RTC memory section
+# "L", after the state: which rules are firing, the alert sequence number
+# and the previous sample.
+#
+#   channel   1 temperature, 2 humidity, 3 resistance, ... in record order
+#   kind      ">" above, "<" below, "jump" change from the previous sample
+#
+# The alert goes out as manufacturer data in the advertising packet
+# (adv_payload), little endian:
+#
+#   rules     B   bit n set: rule n started firing with this sample
+#   sequence  B   counts alerts, so the gateway can drop repeated bursts
+#   value     h   the first such rule's channel value, x10
+import struct
+import sensor_drivers
+
+_ENABLED = True
+_RTC_SECTION = "L"
+_RULE_FORMAT = "<BBf"      # channel, kind, limit
+_RULE_SIZE = 6
+_MAX_RULES = 8
+_ADV_FORMAT = "<BBh"
+_KINDS = (">", "<", "jump")
+_DEFAULT_RULES = ()        # e.g. ((2, ">", 80.0), (3, "jump", 200.0))
+
+_NAN = float("nan")
+
+_channels = ()    # channel names, in record order
+_rules = []       # (channel, kind index, limit)
+_firing = 0
+_sequence = 0
+_previous = ()
+_pending = None   # (rules mask, value) of an alert not yet advertised
+_rtc_manager = None
+
+def load(rtc_manager):
+    """Restore the rules and their state from RTC memory."""
+    global _rtc_manager, _channels, _rules, _firing, _sequence, _previous
+    _rtc_manager = rtc_manager
+    _channels = tuple(name for name, _ in sensor_drivers.channels())
+    _previous = (_NAN,) * len(_channels)
+    saved = rtc_manager.get_section(_RTC_SECTION)
+    size = _state_size()
+    if saved and len(saved) >= size and not (len(saved) - size) % _RULE_SIZE:
+        _firing, _sequence, *previous = struct.unpack_from(_state_format(), saved)
+        _previous = tuple(previous)
+        _rules = [struct.unpack_from(_RULE_FORMAT, saved, pos)
+                  for pos in range(size, len(saved), _RULE_SIZE)]
+    else:
+        _rules = [_parse(rule) for rule in _DEFAULT_RULES]
+
+def _state_format():
+    # firing mask, sequence, previous value of each channel
+    return "<BB" + "f" * len(_channels)
+
+def _state_size():
+    return 2 + 4 * len(_channels)
+
+def configure(rules):
+    """Replace the rules (settings write)."""
+    global _rules, _firing
+    if len(rules) > _MAX_RULES:
+        raise ValueError(f"At most {_MAX_RULES} alert rules")
+    _rules = [_parse(rule) for rule in rules]
+    _firing = 0
+    print(f"Alert rules set: {rules}")
+    _save()
+
+def _parse(rule):
+    channel, kind, limit = rule
+    if not 1 <= int(channel) <= len(_channels) or kind not in _KINDS:
+        raise ValueError(f"Invalid alert rule: {rule}")
+    return int(channel), _KINDS.index(kind), float(limit)
+
+def _save():
+    if _rtc_manager is None:
+        return
+    size = _state_size()
+    data = bytearray(size + _RULE_SIZE * len(_rules))
+    struct.pack_into(_state_format(), data, 0, _firing, _sequence, *_previous)
+    for n, rule in enumerate(_rules):
+        struct.pack_into(_RULE_FORMAT, data, size + n * _RULE_SIZE, *rule)
+    _rtc_manager.set_section(_RTC_SECTION, data)
+
+# ------------------------- Evaluation -------------------------
+
+def check(record):
+    """Evaluate the rules on a new record; True if one of them started firing."""
+    global _firing, _sequence, _previous, _pending
+    if not _ENABLED or not _rules:
+        return False
+    # Channels not sampled in this wake (channel_schedule.py) are left alone.
+    count = len(_channels)
+    values = [float(value) if value != "" else None for value in record[1:count + 1]]
+    values += [None] * (count - len(values))
+    started = 0
+    first = None
+    for n, (channel, kind, limit) in enumerate(_rules):
+        value = values[channel - 1]
+        if value is None:
+            continue
+        if kind == 0:
+            breach = value > limit
+        elif kind == 1:
+            breach = value < limit
+        else:
+            breach = abs(value - _previous[channel - 1]) > limit  # False after power-on (NaN)
+
+        if not breach:
+            _firing &= ~(1 << n)
+        elif not _firing & (1 << n):
+            _firing |= 1 << n
+            started |= 1 << n
+            if first is None:
+                first = value
+                print(f"🚨 Alert: {_channels[channel - 1]} {value} ({_KINDS[kind]} {limit})")
+    _previous = tuple(_previous[n] if value is None else value for n, value in enumerate(values))
+
+    if started:
+        _sequence = (_sequence + 1) & 0xFF
+        _pending = (started if _pending is None else _pending[0] | started, first)
+    _save()
+    return bool(started)
+
+def pending():
+    """True if an alert is waiting to be advertised."""
+    return _pending is not None
+
+def adv_payload():
+    """Manufacturer data for the alert advertising burst."""
+    mask, value = _pending
+    value = min(max(int(value * 10), -0x8000), 0x7FFF)
+    return struct.pack(_ADV_FORMAT, mask, _sequence, value)
+
+def clear():
+    """The alert has been advertised (or a regular window covered it)."""
+    global _pending
+    _pending = None
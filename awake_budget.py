@@ -0,0 +1,134 @@
+""" awake_budget.py """
+# Time limits for a wake.
+#
+# A wake may stay awake for the budget (_WAKE_BUDGET_MS, or what the
+# gateway set with a {"budget": seconds} settings write, kept in the RTC
+# memory section "B"); registration has its own, longer one. boot.main
+# runs each phase through run(), which cancels the phase at its deadline:
+# the phase's own limit or the end of the budget, whichever comes first.
+# Cancelling unwinds the phase's finally blocks (held log writes are
+# committed, the connection is closed), so boot.main saves its state and
+# goes to sleep as usual. Overruns are counted in diagnostics.
+#
+# Code that never yields cannot be cancelled, so machine.WDT backs the
+# deadlines up: a task feeds it while the event loop runs and the wake is
+# not more than _WDT_MARGIN_MS past its budget. A blocked loop or a
+# runaway wake resets the chip, and the next boot counts the watchdog
+# reset as an overrun too. Before a resident light sleep the timeout is
+# stretched to cover the sleep (sleeping()), and start() sets it back.
+import machine
+import struct
+import time
+import uasyncio as asyncio
+import diagnostics
+
+_ENABLED = True
+_RTC_SECTION = "B"
+_WAKE_BUDGET_MS = 120 * 1000
+_MIN_BUDGET_MS = 10 * 1000
+_MAX_BUDGET_MS = 30 * 60 * 1000
+_SENSOR_MS = 5 * 1000                 # BME280 and ADC reads, and the log append
+_SETTING_BUDGET_MS = 10 * 60 * 1000   # registration advertising ...
+SETTING_RETRY_MS = 5 * 60 * 1000      # ... then deep sleep and try again
+_WDT_TIMEOUT_MS = 30 * 1000
+_WDT_FEED_MS = 1000
+_WDT_MARGIN_MS = 5 * 1000
+
+# Phases, as reported in diagnostics.overrun_phase
+PHASE_SENSOR = 1
+PHASE_WAKEUP = 2     # wake-up advertising and the transfer that follows
+PHASE_SETTING = 3
+PHASE_WATCHDOG = 4   # reset by the watchdog
+PHASE_ALERT = 5      # alert advertising burst and the transfer that follows
+
+_PHASE_MS = {PHASE_SENSOR: _SENSOR_MS}
+
+_budget_ms = _WAKE_BUDGET_MS
+_wake_budget_ms = _WAKE_BUDGET_MS
+_wake_ticks = 0
+_wdt = None
+_wdt_timeout_ms = _WDT_TIMEOUT_MS
+_rtc_manager = None
+
+def load(rtc_manager):
+    """Restore the configured budget, start this wake's and the watchdog."""
+    global _rtc_manager, _wake_budget_ms
+    _rtc_manager = rtc_manager
+    saved = rtc_manager.get_section(_RTC_SECTION)
+    if saved and len(saved) == 2:
+        _wake_budget_ms = struct.unpack("<H", saved)[0] * 1000
+    if machine.reset_cause() == machine.WDT_RESET:
+        print("⚠️ Reset by the watchdog")
+        diagnostics.overrun(PHASE_WATCHDOG)
+    start()
+    if _ENABLED:
+        _watch()
+
+def configure(seconds):
+    """Set the budget of every following wake (settings write)."""
+    global _wake_budget_ms
+    _wake_budget_ms = min(max(seconds * 1000, _MIN_BUDGET_MS), _MAX_BUDGET_MS)
+    print(f"Awake budget set to {_wake_budget_ms // 1000} sec")
+    if _rtc_manager is not None:
+        _rtc_manager.set_section(_RTC_SECTION, struct.pack("<H", _wake_budget_ms // 1000))
+
+def start(setting=False):
+    """Start the budget of a wake (after boot or light sleep)."""
+    global _budget_ms, _wake_ticks
+    _budget_ms = _SETTING_BUDGET_MS if setting else _wake_budget_ms
+    _wake_ticks = time.ticks_ms()
+    if _wdt is not None and _wdt_timeout_ms != _WDT_TIMEOUT_MS:
+        _arm(_WDT_TIMEOUT_MS)
+
+def remaining_ms():
+    return _budget_ms - time.ticks_diff(time.ticks_ms(), _wake_ticks)
+
+# ------------------------- Phases -------------------------
+
+async def run(phase, coro):
+    """Run a phase until it finishes or its deadline passes; False if it was cut."""
+    if not _ENABLED:
+        await coro
+        return True
+    deadline_ms = max(remaining_ms(), 0)
+    if phase in _PHASE_MS:
+        deadline_ms = min(deadline_ms, _PHASE_MS[phase])
+    try:
+        await asyncio.wait_for_ms(coro, deadline_ms)
+        return True
+    except asyncio.TimeoutError:
+        print(f"⏱️ Phase {phase} overran its deadline ({deadline_ms} ms), cancelled")
+        diagnostics.overrun(phase)
+        return False
+
+# ------------------------- Watchdog -------------------------
+
+def _watch():
+    _arm(_WDT_TIMEOUT_MS)
+    asyncio.create_task(_feed())
+
+def _arm(timeout_ms):
+    # Creating the WDT again sets a new timeout (and feeds it).
+    global _wdt, _wdt_timeout_ms
+    _wdt = machine.WDT(timeout=timeout_ms)
+    _wdt_timeout_ms = timeout_ms
+
+async def _feed():
+    while remaining_ms() > -_WDT_MARGIN_MS:
+        _wdt.feed()
+        await asyncio.sleep_ms(_WDT_FEED_MS)
+    print("⚠️ Wake budget exceeded, leaving the watchdog to reset")
+
+def feed():
+    """Feed the watchdog before a blocking call."""
+    if _wdt is not None:
+        _wdt.feed()
+
+def sleeping(duration_ms):
+    """Make the watchdog outlast a light sleep of duration_ms."""
+    if _wdt is None:
+        return
+    if duration_ms + _WDT_MARGIN_MS > _WDT_TIMEOUT_MS:
+        _arm(duration_ms + _WDT_MARGIN_MS)
+    else:
+        _wdt.feed()
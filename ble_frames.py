@@ -0,0 +1,58 @@
+""" ble_frames.py """
+# On-air frame formats of the temperature/humidity export characteristic.
+#
+# Plain frames are one JSON batch ({"data": [...]}) per notification, so
+# they always start with "{". Compressed frames carry a slice of a zlib
+# stream holding the JSON batch of a whole block of records:
+#   byte 0: _FRAME_DEFLATE (more slices follow) or _FRAME_DEFLATE_END
+#   byte 1..: compressed bytes
+#
+# A time sync reply (see BLEManager.time_sync) is one _FRAME_SYNC frame
+# carrying the central's t1, the device receive time t2 and t3 - t2, all in
+# milliseconds since 2000-01-01; it fits the 20 bytes of the minimum MTU.
+import io
+import json
+import struct
+
+try:
+    import deflate
+except ImportError:
+    deflate = None
+
+COMPRESS_DEFLATE = "deflate"
+
+_FRAME_DEFLATE = 0x01
+_FRAME_DEFLATE_END = 0x02
+_FRAME_SYNC = 0x03
+_SYNC_FORMAT = "<BqqH"
+
+_DEFLATE_WBITS = 10  # 1 KiB window keeps the compressor heap small
+
+def negotiate(offered):
+    """Pick the transfer mode from the modes the central offered, or None for plain."""
+    if offered and COMPRESS_DEFLATE in offered and deflate:
+        return COMPRESS_DEFLATE
+    return None
+
+def encode_batch(records):
+    """Plain frame: one JSON batch."""
+    return json.dumps({"data": records}).encode('utf-8')
+
+def sync_frame(t1, t2, t3):
+    """Time sync reply: echo of t1, receive and transmit times."""
+    # t3 - t2 is unsigned; the RTC may be stepped between the two readings.
+    return struct.pack(_SYNC_FORMAT, _FRAME_SYNC, t1, t2, min(max(t3 - t2, 0), 0xFFFF))
+
+def deflate_frames(records, frame_size):
+    """Compress one block of records and split it into frames of at most frame_size bytes."""
+    stream = io.BytesIO()
+    with deflate.DeflateIO(stream, deflate.ZLIB, _DEFLATE_WBITS) as compressor:
+        compressor.write(encode_batch(records))
+    payload = stream.getvalue()
+
+    step = frame_size - 1
+    frames = []
+    for i in range(0, len(payload), step):
+        last = i + step >= len(payload)
+        frames.append(bytes([_FRAME_DEFLATE_END if last else _FRAME_DEFLATE]) + payload[i:i + step])
+    return frames
@@ -5,10 +5,18 @@ esp.osdebug(None)
 import uasyncio as asyncio
 import machine
 import network
+import alert_rules
+import awake_budget
+import channel_schedule
+import diagnostics
+import heap_probe
+import write_behind
 from rtc_manager import RTCManager
 from aioble_manager import BLEManager
 from sensor_logger import SensorLogger
 
+_HEAP_PROBE = False  # sample heap/GC around the hot paths, peaks kept in RTC memory
+
 def battery_saver():
     # Wi-Fi 비활성화
     network.WLAN(network.STA_IF).active(False)
@@ -18,41 +26,91 @@ def battery_saver():
 async def main():
     """ESP32 BLE + RTC + Deep Sleep 메인 프로세스"""
     rtc_manager = RTCManager()
+    diagnostics.load(rtc_manager)
+    awake_budget.load(rtc_manager)
+    write_behind.load(rtc_manager)
+    alert_rules.load(rtc_manager)
+    channel_schedule.load(rtc_manager)
+    if _HEAP_PROBE:
+        heap_probe.enable(rtc_manager)
     ble_manager = BLEManager(rtc_manager)
     sensor_logger = SensorLogger()
     
     # RTC 데이터 손실 또는 등록이 안 된 경우, BLE 등록 광고 실행
     if rtc_manager.last_log_time is None or rtc_manager.log_period is None:
         print("⚠️ RTC 설정값이 없습니다. 초기 등록을 시작합니다.")
-        await ble_manager.advertise_for_setting()
+        awake_budget.start(setting=True)
+        if not await awake_budget.run(awake_budget.PHASE_SETTING, ble_manager.advertise_for_setting()):
+            # 등록 시간 초과: 잠시 Deep Sleep 후 재부팅해서 다시 등록 광고
+            write_behind.commit()
+            diagnostics.save()
+            rtc_manager.enter_deep_sleep(awake_budget.SETTING_RETRY_MS)
+            return
         
-        current_time = rtc_manager.format_rtc_datetime()
-        sensor_logger.get_sensor_data(current_time)
+        await sensor_logger.get_sensor_data(rtc_manager.current_epoch())
+        write_behind.commit()
+        heap_probe.save()
+        diagnostics.save()
         rtc_manager.enter_deep_sleep()
         return 
     
+    # 짧은 측정 주기에서는 재부팅 없이 Light Sleep으로 상주 (드라이버/버퍼 유지)
+    while True:
+        await wake_cycle(rtc_manager, ble_manager, sensor_logger)
+
+        # 보류된 로그 쓰기를 먼저 반영
+        write_behind.commit()
+        heap_probe.save()
+        diagnostics.save()
+        if not rtc_manager.stays_resident():
+            # 마지막으로 Deep Sleep 진입
+            rtc_manager.enter_deep_sleep()
+            return
+        # 워치독 시간 제한을 Light Sleep 길이에 맞춘 뒤 슬립 (깨어나면 awake_budget.start()가 되돌림)
+        sleep_ms = rtc_manager.light_sleep_ms()
+        awake_budget.sleeping(sleep_ms)
+        rtc_manager.enter_light_sleep(sleep_ms)
+        diagnostics.wake_started()
+        awake_budget.start()
+
+async def wake_cycle(rtc_manager, ble_manager, sensor_logger):
+    """한 번의 wake에서 할 일: 측정 시간이면 측정, 광고 시간이면 광고 및 전송
+    (단계마다 awake_budget의 시간 제한 적용, 초과 시 취소 후 정상적으로 슬립)"""
     sensor_time = rtc_manager.is_sensor_time()
+    advertise_time = rtc_manager.is_advertise_time()
 
     if sensor_time:
         print("🔔 측정 시간입니다. 센서 데이터를 수집합니다.")
-        current_time = rtc_manager.format_rtc_datetime()
-        sensor_logger.get_sensor_data(current_time)
-
-        # RTC 메모리 업데이트
         last_log_time = rtc_manager.current_epoch()
-        rtc_manager.save_rtc_memory(last_log_time, rtc_manager.log_period, rtc_manager.last_advertise_time)
+        # 채널별 측정 주기에 따라 이번 wake에 읽을 센서만 측정 (channel_schedule.py)
+        channels = channel_schedule.due(last_log_time, rtc_manager.log_period)
+        logging = asyncio.create_task(awake_budget.run(
+            awake_budget.PHASE_SENSOR, sensor_logger.get_sensor_data(last_log_time, channels)))
 
-    advertise_time = rtc_manager.is_advertise_time()
+        if advertise_time:
+            # 측정/저장은 광고와 동시에 진행하고, 전송은 저장이 끝난 뒤 시작
+            ble_manager.hold_export(logging)
+        else:
+            await logging
 
     if advertise_time:
         print("📡 광고 시간입니다. BLE를 통해 데이터 전송 대기 중...")
-        await ble_manager.advertise_for_wakeup()
+        await awake_budget.run(awake_budget.PHASE_WAKEUP, ble_manager.advertise_for_wakeup())
 
         last_advertise_time = rtc_manager.current_epoch()
         rtc_manager.save_rtc_memory(advertise_time=last_advertise_time)
 
-    # 마지막으로 Deep Sleep 진입
-    rtc_manager.enter_deep_sleep()
+    if sensor_time:
+        await logging
+
+        # RTC 메모리 업데이트
+        rtc_manager.save_rtc_memory(last_log_time, rtc_manager.log_period, rtc_manager.last_advertise_time)
+
+    # 측정값이 경보 규칙을 벗어나면 다음 광고 시간을 기다리지 않고 바로 짧게 광고 (alert_rules.py)
+    if alert_rules.pending():
+        if not advertise_time:
+            await awake_budget.run(awake_budget.PHASE_ALERT, ble_manager.advertise_alert())
+        alert_rules.clear()
 
 battery_saver()
 asyncio.run(main())
@@ -0,0 +1,72 @@
+""" channel_schedule.py """
+# Sampling periods per probe (sensor_drivers.SENSORS).
+#
+# The log period (rtc_manager) is how often the node wakes to sample, and
+# so the period of the fastest channel. A channel with a period of its own
+# is sampled on the first wake at least that long after its last sample:
+# with a 60 s log period and {"channels": {"res": 900}} written to the
+# settings characteristic, the BME280 is read on every wake and the
+# material probe every 15 minutes. Records only carry the channels read
+# in their wake (see SensorLogger._log_record).
+#
+# The channel periods (0: every wake) and the epoch of each channel's last
+# sample are kept in the RTC memory section "M".
+#
+# The channels are the probes' schedule names, on the default board:
+#
+#   env   BME280 temperature and humidity (one forced conversion)
+#   res   material resistance (ADC)
+import struct
+import sensor_drivers
+
+_RTC_SECTION = "M"
+_MAX_PERIOD_S = 0xFFFF
+
+CHANNELS = sensor_drivers.names()
+_periods = [0] * len(CHANNELS)
+_last = [0] * len(CHANNELS)
+_rtc_manager = None
+
+def _rtc_format():
+    # periods (s), then last sample epochs, in CHANNELS order
+    return "<" + "H" * len(CHANNELS) + "I" * len(CHANNELS)
+
+def load(rtc_manager):
+    """Restore the channel periods and last samples from RTC memory."""
+    global _rtc_manager, CHANNELS, _periods, _last
+    _rtc_manager = rtc_manager
+    CHANNELS = sensor_drivers.names()
+    _periods = [0] * len(CHANNELS)
+    _last = [0] * len(CHANNELS)
+    saved = rtc_manager.get_section(_RTC_SECTION)
+    if saved and len(saved) == struct.calcsize(_rtc_format()):
+        values = struct.unpack(_rtc_format(), saved)
+        _periods = list(values[:len(CHANNELS)])
+        _last = list(values[len(CHANNELS):])
+
+def configure(periods):
+    """Set the periods of the channels named in periods (settings write)."""
+    for name, period in periods.items():
+        if name not in CHANNELS or not 0 <= int(period) <= _MAX_PERIOD_S:
+            raise ValueError(f"Invalid channel period: {name}={period}")
+        _periods[CHANNELS.index(name)] = int(period)
+    print(f"Channel periods: {dict(zip(CHANNELS, _periods))}")
+    _save()
+
+def _save():
+    if _rtc_manager is not None:
+        _rtc_manager.set_section(_RTC_SECTION, struct.pack(_rtc_format(), *(_periods + _last)))
+
+def due(epoch, log_period):
+    """The channels to sample on a wake at epoch."""
+    # Wakes land a little before or after the exact period, so half a log
+    # period of slack keeps a 900 s channel from slipping to every 960 s.
+    slack = (log_period or 0) // 2
+    return tuple(name for name, period, last in zip(CHANNELS, _periods, _last)
+                 if not period or epoch - last >= period - slack)
+
+def sampled(channels, epoch):
+    """Note the channels read at epoch."""
+    for name in channels:
+        _last[CHANNELS.index(name)] = epoch
+    _save()
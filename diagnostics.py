@@ -0,0 +1,156 @@
+""" diagnostics.py """
+# Runtime counters for fleet troubleshooting.
+#
+# The counters live in the RTC memory section "D" so they survive deep
+# sleep, are updated in place with plain integer arithmetic and written
+# back once per wake (save). pack() serves them on the read-only
+# diagnostics characteristic, little endian:
+#
+#   version          B   _VERSION
+#   wakes            I   boots since power-on
+#   awake_avg_ms     I   moving average of the awake time per wake
+#   sensor_ms        H   duration of the last sensor read
+#   bytes_sent       I   export payload bytes notified
+#   records_sent     I   records exported
+#   failed_notify    H   notifications that raised
+#   resends          H   exports started again after an interrupted one
+#   last_error       B   ERR_* code of the last error
+#   log_bytes        I   size of the log and the export spool on flash
+#   fs_free          I   free bytes on the filesystem
+#   overruns         H   phases cut at their deadline, and watchdog resets
+#   overrun_phase    B   awake_budget.PHASE_* of the last overrun
+#
+# followed, while heap_probe is enabled, by its statistics (heap_probe.pack).
+import struct
+import time
+import uos
+import file_utils
+import heap_probe
+import payload_spool
+
+_VERSION = 3
+_RTC_SECTION = "D"
+_RTC_FORMAT = "<IIHIIHHBBHB"
+_CHAR_FORMAT = "<BIIHIIHHBIIHB"
+_AWAKE_AVG_SHIFT = 3  # moving average over about 8 wakes
+_EXPORT_OPEN = 0x01   # flag: an export started and has not completed
+
+ERR_NONE = 0
+ERR_SENSOR = 1
+ERR_STORAGE = 2
+ERR_BLE_SEND = 3
+ERR_SETTINGS = 4
+ERR_MEMORY = 5
+ERR_WRITE_QUEUE = 6
+
+wakes = 0
+awake_avg_ms = 0
+sensor_ms = 0
+bytes_sent = 0
+records_sent = 0
+failed_notify = 0
+resends = 0
+last_error = ERR_NONE
+overruns = 0
+overrun_phase = 0
+_flags = 0
+_rtc_manager = None
+_wake_ticks = 0  # ticks_ms at the start of this wake
+
+def load(rtc_manager):
+    """Restore the counters from RTC memory and count this wake."""
+    global _rtc_manager, wakes, awake_avg_ms, sensor_ms, bytes_sent, records_sent
+    global failed_notify, resends, last_error, _flags, overruns, overrun_phase
+    _rtc_manager = rtc_manager
+    saved = rtc_manager.get_section(_RTC_SECTION)
+    if saved and len(saved) == struct.calcsize(_RTC_FORMAT):
+        (wakes, awake_avg_ms, sensor_ms, bytes_sent, records_sent,
+         failed_notify, resends, last_error, _flags, overruns, overrun_phase) = struct.unpack(_RTC_FORMAT, saved)
+    wakes += 1
+
+def wake_started():
+    """Count a wake from light sleep, which does not go through load()."""
+    global wakes, _wake_ticks
+    wakes += 1
+    _wake_ticks = time.ticks_ms()
+
+def save():
+    """Fold this wake's awake time into the average and write RTC memory."""
+    global awake_avg_ms
+    if _rtc_manager is None:
+        return
+    awake_ms = time.ticks_diff(time.ticks_ms(), _wake_ticks)  # ticks start at 0 on every boot
+    if wakes <= 1:
+        awake_avg_ms = awake_ms
+    else:
+        awake_avg_ms += (awake_ms - awake_avg_ms) >> _AWAKE_AVG_SHIFT
+    _rtc_manager.set_section(_RTC_SECTION, struct.pack(
+        _RTC_FORMAT, wakes & 0xFFFFFFFF, awake_avg_ms, sensor_ms, bytes_sent & 0xFFFFFFFF,
+        records_sent & 0xFFFFFFFF, min(failed_notify, 0xFFFF), min(resends, 0xFFFF), last_error, _flags,
+        min(overruns, 0xFFFF), overrun_phase))
+
+# ------------------------- Counters -------------------------
+
+def sensor_read(ms):
+    global sensor_ms
+    sensor_ms = min(ms, 0xFFFF)
+
+def sent(size, records=0):
+    global bytes_sent, records_sent
+    bytes_sent += size
+    records_sent += records
+
+def notify_failed():
+    global failed_notify
+    failed_notify += 1
+    error(ERR_BLE_SEND)
+
+def error(code):
+    global last_error
+    last_error = code
+
+def overrun(phase):
+    global overruns, overrun_phase
+    overruns += 1
+    overrun_phase = phase
+
+def export_started():
+    global resends, _flags
+    if _flags & _EXPORT_OPEN:
+        resends += 1
+    _flags |= _EXPORT_OPEN
+
+def export_done():
+    global _flags
+    _flags &= ~_EXPORT_OPEN
+
+# ------------------------- Characteristic -------------------------
+
+def _log_bytes():
+    paths = [payload_spool._SPOOL_FILE, payload_spool._TAIL_FILE]
+    try:
+        paths += [f"{file_utils._LOG_DIR}/{name}" for name in uos.listdir(file_utils._LOG_DIR)]
+    except OSError:
+        pass
+    total = 0
+    for path in paths:
+        try:
+            total += uos.stat(path)[6]
+        except OSError:
+            pass
+    return total
+
+def _fs_free():
+    try:
+        stat = uos.statvfs("/")
+        return stat[0] * stat[3]
+    except OSError:
+        return 0
+
+def pack():
+    """The counters as served on the diagnostics characteristic."""
+    return struct.pack(
+        _CHAR_FORMAT, _VERSION, wakes & 0xFFFFFFFF, awake_avg_ms, sensor_ms,
+        bytes_sent & 0xFFFFFFFF, records_sent & 0xFFFFFFFF, min(failed_notify, 0xFFFF),
+        min(resends, 0xFFFF), last_error, _log_bytes(), _fs_free(), min(overruns, 0xFFFF), overrun_phase
+    ) + (heap_probe.pack() if heap_probe.enabled() else b"")
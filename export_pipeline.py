@@ -0,0 +1,110 @@
+""" export_pipeline.py """
+# Bounded queue between the export producer and the notifier.
+#
+# A producer task walks a source of (payload, tag) items, copying each
+# payload into one of `depth` preallocated slots, and waits while every
+# slot is full. The notifier takes items with get(); a slot is handed back
+# on the following get(), so the payload needs no copy of its own. Tags
+# tell the notifier what has been delivered once the item is sent (for
+# example a finished log segment); an item may carry a tag only.
+import uasyncio as asyncio
+
+class ExportPipeline:
+    def __init__(self, depth, size):
+        self._slots = [memoryview(bytearray(size)) for _ in range(depth)]
+        self._items = [None] * depth  # (payload length or bytes, tag)
+        self._depth = depth
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._task = None
+        self._run = 0
+        self.mode = None
+        self._reset()
+
+    def _reset(self):
+        self._head = 0
+        self._count = 0
+        self._held = False
+        self._taken = 0
+        self._done = False
+        self.error = None
+
+    # ------------------------- Producer -------------------------
+    def start(self, source, mode=None, after=None):
+        """Start filling from source, dropping anything queued before; with
+        after (a task), only once that task has finished."""
+        self.cancel()
+        self._reset()
+        self._run += 1
+        self.mode = mode
+        self._task = asyncio.create_task(self._fill(source, self._run, after))
+
+    def cancel(self):
+        """Stop the producer and drop the queued items."""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        self._reset()
+        self._done = True
+        self._readable.set()
+
+    def pristine(self, mode):
+        """True if a run for mode is queued and nothing has been taken yet."""
+        return self._task is not None and self.mode == mode and self._taken == 0
+
+    async def _fill(self, source, run, after):
+        try:
+            if after is not None:
+                await after
+            for payload, tag in source:
+                while self._count == self._depth:
+                    self._writable.clear()
+                    await self._writable.wait()
+
+                slot = (self._head + self._count) % self._depth
+                if payload is None:
+                    self._items[slot] = (None, tag)
+                elif len(payload) <= len(self._slots[slot]):
+                    self._slots[slot][:len(payload)] = payload
+                    self._items[slot] = (len(payload), tag)
+                else:
+                    self._items[slot] = (bytes(payload), tag)  # larger than a slot
+                self._count += 1
+                self._readable.set()
+                # Let the notifier and the BLE IRQ handlers run between frames.
+                await asyncio.sleep_ms(0)
+        except Exception as e:
+            if run == self._run:
+                self.error = e
+        finally:
+            if run == self._run:
+                self._done = True
+                self._readable.set()
+
+    # ------------------------- Notifier -------------------------
+    async def get(self):
+        """Next (payload, tag), or None once the source is exhausted.
+
+        The payload (a memoryview into a slot, or None) is valid until the
+        next call. Raises the producer's error instead of ending early.
+        """
+        if self._held:
+            self._held = False
+            self._head = (self._head + 1) % self._depth
+            self._count -= 1
+            self._writable.set()
+
+        while self._count == 0:
+            if self._done:
+                if self.error:
+                    raise self.error
+                return None
+            self._readable.clear()
+            await self._readable.wait()
+
+        self._held = True
+        self._taken += 1
+        size, tag = self._items[self._head]
+        if not isinstance(size, int):
+            return size, tag
+        return self._slots[self._head][:size], tag
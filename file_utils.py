@@ -1,46 +1,229 @@
 """ file_utils.py """
 import uos
+import time
+import diagnostics
+import heap_probe
 
-_DATA_FILE = "data.csv"
-_DATA_HEADER = ["t", "tp", "hd"]
+_LOG_DIR = "log"
+_LEGACY_FILE = "data.csv"
+_DATA_HEADER = ["t", "tp", "hd"]  # t: epoch seconds since 2000-01-01
+
+_SEGMENT_PERIOD_S = 24 * 60 * 60  # one segment per day
+_SEGMENT_MAX_RECORDS = 1024       # or per N records, whichever comes first
+_INDEX_STRIDE = 16                # one (epoch, offset) index entry every K records
+
+# ------------------------- Segment Naming -------------------------
+
+def _segment_path(start_epoch):
+    return f"{_LOG_DIR}/{start_epoch:010d}.csv"
+
+def _index_path(start_epoch):
+    return f"{_LOG_DIR}/{start_epoch:010d}.idx"
+
+def _record_epoch(value):
+    """Epoch seconds of a record timestamp; segments written before records
+    carried epochs hold 'YYYY-MM-DDTHH:MM:SS' instead."""
+    if value[4:5] != "-":
+        return int(value)
+    return time.mktime((int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                        int(value[11:13]), int(value[14:16]), int(value[17:19]), 0, 0))
+
+def list_segments():
+    """Return the start epochs of all log segments, oldest first."""
+    try:
+        names = uos.listdir(_LOG_DIR)
+    except OSError:
+        return []
+    return sorted(int(name[:-4]) for name in names if name.endswith(".csv"))
+
+def _load_index(start_epoch):
+    """Load the sparse index of a segment as a list of (epoch, offset)."""
+    entries = []
+    try:
+        with open(_index_path(start_epoch), "r") as file:
+            for line in file:
+                epoch, offset = line.split(",")
+                entries.append((int(epoch), int(offset)))
+    except OSError:
+        pass
+    return entries
+
+def _count_tail_records(start_epoch, offset):
+    """Count the records written after the given byte offset of a segment."""
+    with open(_segment_path(start_epoch), "r") as file:
+        file.seek(offset)
+        return sum(1 for _ in file)
 
 # ------------------------- CSV File Operations -------------------------
 
 def create_csv_file():
-    """Check if the file exists; if not, create it and add headers."""
+    """Make sure the log directory exists and adopt a legacy single-file log."""
     try:
-        uos.stat(_DATA_FILE)  # Check if the file exists
+        uos.stat(_LOG_DIR)
     except OSError:
-        with open(_DATA_FILE, "w") as file:
-            file.write(",".join(_DATA_HEADER) + "\n")  # Add headers
-        print(f"Created new file: {_DATA_FILE}")
+        uos.mkdir(_LOG_DIR)
+        print(f"Created log directory: {_LOG_DIR}")
 
-def append_csv_file(record):
-    """Append new data to the CSV file."""
     try:
-        with open(_DATA_FILE, "a") as file:
-            file.write(",".join(map(str, record)) + "\n")
-    except Exception as e:
-        print(f"[ERROR] Failed to append to {_DATA_FILE}: {e}")
+        uos.stat(_LEGACY_FILE)
+        # Keep unsent data from the old layout as an un-indexed first segment.
+        uos.rename(_LEGACY_FILE, _segment_path(0))
+        print(f"Moved {_LEGACY_FILE} into {_segment_path(0)}")
+    except OSError:
+        pass
+
+def _open_segment(epoch):
+    """Return the segment the next record belongs to, rolling over if needed."""
+    segments = list_segments()
+    if segments:
+        start = segments[-1]
+        if start // _SEGMENT_PERIOD_S == epoch // _SEGMENT_PERIOD_S:
+            index = _load_index(start)
+            if index:
+                tail = _count_tail_records(start, index[-1][1])
+                count = (len(index) - 1) * _INDEX_STRIDE + tail
+                if count < _SEGMENT_MAX_RECORDS:
+                    return start, tail == _INDEX_STRIDE
 
-def read_csv_file():
-    """Read a CSV file (excluding headers)."""
+    with open(_segment_path(epoch), "w") as file:
+        file.write(",".join(_DATA_HEADER) + "\n")
+    return epoch, True
+
+def append_csv_file(record, epoch):
+    """Append new data to the current log segment."""
     try:
-        with open(_DATA_FILE, "r") as file:
-            lines = [line.strip() for line in file.readlines()]
-            if len(lines) <= 1:
-                print("No sensor data available.")
-                return []
-            return [line.split(",") for line in lines[1:]]  # Exclude headers
+        start, indexed = _open_segment(epoch)
+        path = _segment_path(start)
+        offset = uos.stat(path)[6]
+        with open(path, "a") as file:
+            file.write(",".join(map(str, record)) + "\n")
+        if indexed:
+            with open(_index_path(start), "a") as file:
+                file.write(f"{epoch},{offset}\n")
     except Exception as e:
-        print(f"[ERROR] Failed to load {_DATA_FILE}: {e}")
-        return []
+        print(f"[ERROR] Failed to append to {_LOG_DIR}: {e}")
+        diagnostics.error(diagnostics.ERR_STORAGE)
+
+def read_csv_file(start_epoch=None):
+    """Read one segment, or every segment if none is given (excluding headers)."""
+    segments = list_segments() if start_epoch is None else [start_epoch]
+    records = []
+    with heap_probe.phase("read"):
+        for start in segments:
+            try:
+                with open(_segment_path(start), "r") as file:
+                    file.readline()  # Skip headers
+                    for line in file:
+                        line = line.strip()
+                        if line:
+                            record = line.split(",")
+                            record[0] = _record_epoch(record[0])
+                            records.append(record)
+            except Exception as e:
+                print(f"[ERROR] Failed to load {_segment_path(start)}: {e}")
+    if not records:
+        print("No sensor data available.")
+    return records
+
+def read_range(start_epoch, end_epoch):
+    """Read the records logged in [start_epoch, end_epoch] using the segment indexes."""
+    segments = list_segments()
+    records = []
+    for n, start in enumerate(segments):
+        # Segments are contiguous in time, so the next segment bounds this one.
+        if start > end_epoch:
+            break
+        if n + 1 < len(segments) and segments[n + 1] <= start_epoch:
+            continue
+
+        offset = 0
+        for epoch, entry_offset in _load_index(start):
+            if epoch > start_epoch:
+                break
+            offset = entry_offset
+
+        try:
+            with open(_segment_path(start), "r") as file:
+                if offset:
+                    file.seek(offset)
+                else:
+                    file.readline()  # Skip headers
+                for line in file:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    record = line.split(",")
+                    record[0] = epoch = _record_epoch(record[0])
+                    if epoch > end_epoch:
+                        break
+                    if epoch >= start_epoch:
+                        records.append(record)
+        except Exception as e:
+            print(f"[ERROR] Failed to load {_segment_path(start)}: {e}")
+    return records
+
+def retime_records(since_epoch, until_epoch, error_ms):
+    """Correct the timestamps logged in (since_epoch, until_epoch] for a clock
+    error that grew linearly from 0 to error_ms over that span."""
+    segments = list_segments()
+    span = until_epoch - since_epoch
+    if span <= 0:
+        return
+
+    def corrected(epoch):
+        if since_epoch < epoch <= until_epoch:
+            return epoch - round(error_ms * (epoch - since_epoch) / span / 1000)
+        return epoch
+
+    retimed = 0
+    for n, start in enumerate(segments):
+        if n + 1 < len(segments) and segments[n + 1] <= since_epoch:
+            continue
+        path = _segment_path(start)
+        try:
+            # A timestamp can change width, so index offsets are mapped to the new file.
+            index = _load_index(start)
+            offsets = {}
+            with open(path, "r") as src, open(path + ".tmp", "w") as dst:
+                header = src.readline()
+                dst.write(header)
+                old_pos = new_pos = len(header)
+                for line in src:
+                    offsets[old_pos] = new_pos
+                    old_pos += len(line)
+                    value, rest = line.split(",", 1)
+                    epoch = _record_epoch(value)
+                    new_epoch = corrected(epoch)
+                    if new_epoch != epoch:
+                        line = f"{new_epoch},{rest}"
+                        retimed += 1
+                    dst.write(line)
+                    new_pos += len(line)
+            uos.rename(path + ".tmp", path)
+
+            if index:
+                with open(_index_path(start), "w") as file:
+                    for epoch, offset in index:
+                        file.write(f"{corrected(epoch)},{offsets.get(offset, offset)}\n")
+        except Exception as e:
+            print(f"[ERROR] Failed to retime {path}: {e}")
+            diagnostics.error(diagnostics.ERR_STORAGE)
+    print(f"Retimed {retimed} records by up to {-error_ms} ms")
+
+def delete_segment(start_epoch):
+    """Delete a whole segment and its index once its data has been delivered."""
+    for path in (_segment_path(start_epoch), _index_path(start_epoch)):
+        try:
+            uos.remove(path)
+        except OSError:
+            pass
+    print(f"Deleted segment: {_segment_path(start_epoch)}")
 
 def clear_csv_file():
-    """Clear the file content while keeping the headers (if provided)."""
+    """Delete every log segment."""
     try:
-        with open(_DATA_FILE, "w") as file:
-            file.write(",".join(_DATA_HEADER) + "\n")
-        print(f"Cleared file: {_DATA_FILE}")
+        for start in list_segments():
+            delete_segment(start)
+        print(f"Cleared log: {_LOG_DIR}")
     except Exception as e:
-        print(f"[ERROR] Failed to clear {_DATA_FILE}: {e}")
+        print(f"[ERROR] Failed to clear {_LOG_DIR}: {e}")
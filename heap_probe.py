@@ -0,0 +1,145 @@
+""" heap_probe.py """
+# Opt-in heap/GC instrumentation of the hot paths.
+#
+# Each phase samples gc.mem_alloc() and gc.mem_free() on entry and exit and
+# keeps, across wakes, in the RTC memory section "H":
+#
+#   peak_alloc   largest heap in use seen at a phase boundary (bytes)
+#   max_growth   largest growth of the heap over one call (bytes)
+#   min_free     smallest free heap seen (bytes)
+#   collections  calls during which the heap shrank, i.e. a GC ran
+#   calls        number of calls
+#
+# With the probe enabled, diagnostics.pack() appends pack() to the
+# diagnostics characteristic, and a {"heap_reset": 1} settings write from
+# the gateway, once it has read them, clears them (reset).
+#
+# Until enable() is called, phase() returns a shared no-op context manager,
+# so the instrumented code only pays for one function call. Once enabled,
+# every call gets its own context manager, so passes that overlap (two
+# connections encoding at once) each measure their own growth.
+import gc
+import struct
+
+PHASES = ("sensor", "read", "encode", "irq")
+
+_RTC_SECTION = "H"
+_ENTRY_FORMAT = "<IIIHH"
+_ENTRY_SIZE = 16
+
+class _Null:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class _Phase:
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.peak_alloc = 0
+        self.max_growth = 0
+        self.min_free = 0xFFFFFFFF
+        self.collections = 0
+        self.calls = 0
+
+    def sample(self):
+        """Record a phase boundary and return the heap in use."""
+        alloc = gc.mem_alloc()
+        free = gc.mem_free()
+        if alloc > self.peak_alloc:
+            self.peak_alloc = alloc
+        if free < self.min_free:
+            self.min_free = free
+        return alloc
+
+    def done(self, entry_alloc):
+        """Record the end of a call that started with entry_alloc in use."""
+        growth = self.sample() - entry_alloc
+        if growth < 0:
+            self.collections = min(self.collections + 1, 0xFFFF)
+        elif growth > self.max_growth:
+            self.max_growth = growth
+        self.calls = min(self.calls + 1, 0xFFFF)
+
+class _Pass:
+    def __init__(self, phase):
+        self._phase = phase
+        self._entry_alloc = 0
+
+    def __enter__(self):
+        self._entry_alloc = self._phase.sample()
+        return self
+
+    def __exit__(self, *exc):
+        self._phase.done(self._entry_alloc)
+        return False
+
+_NULL = _Null()
+_phases = None
+_rtc_manager = None
+
+def phase(name):
+    """Context manager measuring one pass through a hot path."""
+    if _phases is None:
+        return _NULL
+    return _Pass(_phases[name])
+
+def enabled():
+    return _phases is not None
+
+def enable(rtc_manager):
+    """Start sampling, continuing the statistics kept in RTC memory."""
+    global _phases, _rtc_manager
+    _rtc_manager = rtc_manager
+    _phases = {name: _Phase() for name in PHASES}
+
+    saved = rtc_manager.get_section(_RTC_SECTION)
+    if saved and len(saved) == _ENTRY_SIZE * len(PHASES):
+        for n, name in enumerate(PHASES):
+            p = _phases[name]
+            (p.peak_alloc, p.max_growth, p.min_free,
+             p.collections, p.calls) = struct.unpack_from(_ENTRY_FORMAT, saved, n * _ENTRY_SIZE)
+
+    _wrap_ble_irq(_phases["irq"])
+    print(f"Heap probe enabled: free={gc.mem_free()} alloc={gc.mem_alloc()}")
+
+def _wrap_ble_irq(irq_phase):
+    """Measure aioble's IRQ dispatch without touching the vendored library."""
+    from aioble import core
+
+    dispatch = core.ble_irq
+
+    def ble_irq(event, data):
+        with _Pass(irq_phase):
+            return dispatch(event, data)
+
+    core.ble.irq(ble_irq)
+
+def pack():
+    """The statistics in their RTC memory layout, also served on the diagnostics characteristic."""
+    data = bytearray(_ENTRY_SIZE * len(PHASES))
+    if _phases is not None:
+        for n, name in enumerate(PHASES):
+            p = _phases[name]
+            struct.pack_into(_ENTRY_FORMAT, data, n * _ENTRY_SIZE, p.peak_alloc, p.max_growth,
+                             min(p.min_free, 0xFFFFFFFF), p.collections, p.calls)
+    return data
+
+def save():
+    """Write the statistics to RTC memory (call before deep sleep)."""
+    if _phases is None:
+        return
+    _rtc_manager.set_section(_RTC_SECTION, pack())
+    for name, p in _phases.items():
+        if p.calls:
+            print(f"Heap {name}: peak={p.peak_alloc} growth={p.max_growth} min_free={p.min_free} gc={p.collections}/{p.calls}")
+
+def reset():
+    """Forget the statistics, e.g. after the gateway has collected them."""
+    if _phases is not None:
+        for p in _phases.values():
+            p.clear()
+        _rtc_manager.set_section(_RTC_SECTION, None)
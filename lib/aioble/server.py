@@ -39,6 +39,7 @@ _FLAG_WRITE_AUTHORIZED = const(0x4000)
 _FLAG_WRITE_CAPTURE = const(0x10000)
 
 
+# Default depth of each capture-enabled characteristic's write queue.
 _WRITE_CAPTURE_QUEUE_LIMIT = const(10)
 
 
@@ -57,12 +58,6 @@ def _server_irq(event, data):
 def _server_shutdown():
     global _registered_characteristics
     _registered_characteristics = {}
-    if hasattr(BaseCharacteristic, "_capture_task"):
-        BaseCharacteristic._capture_task.cancel()
-        del BaseCharacteristic._capture_queue
-        del BaseCharacteristic._capture_write_event
-        del BaseCharacteristic._capture_consumed_event
-        del BaseCharacteristic._capture_task
 
 
 register_irq_handler(_server_irq, _server_shutdown)
@@ -100,41 +95,16 @@ class BaseCharacteristic:
         else:
             ble.gatts_write(self._value_handle, data, send_update)
 
-    # When the a capture-enabled characteristic is created, create the
-    # necessary events (if not already created).
-    @staticmethod
-    def _init_capture():
-        if hasattr(BaseCharacteristic, "_capture_queue"):
-            return
-
-        BaseCharacteristic._capture_queue = deque((), _WRITE_CAPTURE_QUEUE_LIMIT)
-        BaseCharacteristic._capture_write_event = asyncio.ThreadSafeFlag()
-        BaseCharacteristic._capture_consumed_event = asyncio.ThreadSafeFlag()
-        BaseCharacteristic._capture_task = asyncio.create_task(
-            BaseCharacteristic._run_capture_task()
-        )
-
-    # Monitor the shared queue for incoming characteristic writes and forward
-    # them sequentially to the individual characteristic events.
-    @staticmethod
-    async def _run_capture_task():
-        write = BaseCharacteristic._capture_write_event
-        consumed = BaseCharacteristic._capture_consumed_event
-        q = BaseCharacteristic._capture_queue
-
-        while True:
-            if len(q):
-                conn, data, characteristic = q.popleft()
-                # Let the characteristic waiting in `written()` know that it
-                # can proceed.
-                characteristic._write_data = (conn, data)
-                characteristic._write_event.set()
-                # Wait for the characteristic to complete `written()` before
-                # continuing.
-                await consumed.wait()
-
-            if not len(q):
-                await write.wait()
+    # When a capture-enabled characteristic is created, give it its own
+    # bounded queue of (connection, value), so that a slow consumer of one
+    # characteristic never holds up writes to another.
+    def _init_capture(self, depth):
+        self._capture_queue = deque((), depth)
+        self._capture_depth = depth
+        # Writes dropped because the queue was full (the oldest one goes).
+        self.capture_overflows = 0
+        # Most writes that were waiting at once.
+        self.capture_high_water = 0
 
     # Wait for a write on this characteristic. Returns the connection that did
     # the write, or a tuple of (connection, value) if capture is enabled for
@@ -144,26 +114,24 @@ class BaseCharacteristic:
             # Not a writable characteristic.
             return
 
+        if self.flags & _FLAG_WRITE_CAPTURE:
+            # Writes that arrived while nobody was waiting are returned
+            # straight away, in order. The event may still be set after the
+            # queue was drained, so wait again until there is something.
+            with DeviceTimeout(None, timeout_ms):
+                while not len(self._capture_queue):
+                    await self._write_event.wait()
+            return self._capture_queue.popleft()
+
         # If no write has been seen then we need to wait. If the event has
         # already been set this will clear the event and continue
-        # immediately. In regular mode, this is set by the write IRQ
-        # directly (in _remote_write). In capture mode, this is set when it's
-        # our turn by _capture_task.
+        # immediately. This is set by the write IRQ directly (in _remote_write).
         with DeviceTimeout(None, timeout_ms):
             await self._write_event.wait()
 
-        # Return the write data and clear the stored copy.
-        # In default usage this will be just the connection handle.
-        # In capture mode this will be a tuple of (connection_handle, received_data)
+        # Return the connection of the write and clear the stored copy.
         data = self._write_data
         self._write_data = None
-
-        if self.flags & _FLAG_WRITE_CAPTURE:
-            # Notify the shared queue monitor that the event has been consumed
-            # by the caller to `written()` and another characteristic can now
-            # proceed.
-            BaseCharacteristic._capture_consumed_event.set()
-
         return data
 
     def on_read(self, connection):
@@ -178,11 +146,17 @@ class BaseCharacteristic:
 
             if characteristic.flags & _FLAG_WRITE_CAPTURE:
                 # For capture, we append the connection and the written value
-                # value to the shared queue along with the matching characteristic object.
-                # The deque will enforce the max queue len.
+                # to this characteristic's queue, dropping (and counting) the
+                # oldest write if it is full.
                 data = characteristic.read()
-                BaseCharacteristic._capture_queue.append((conn, data, characteristic))
-                BaseCharacteristic._capture_write_event.set()
+                q = characteristic._capture_queue
+                if len(q) >= characteristic._capture_depth:
+                    q.popleft()
+                    characteristic.capture_overflows += 1
+                q.append((conn, data))
+                if len(q) > characteristic.capture_high_water:
+                    characteristic.capture_high_water = len(q)
+                characteristic._write_event.set()
             else:
                 # Store the write connection handle to be later used to retrieve the data
                 # then set event to handle in written() task.
@@ -206,6 +180,7 @@ class Characteristic(BaseCharacteristic):
         indicate=False,
         initial=None,
         capture=False,
+        capture_depth=_WRITE_CAPTURE_QUEUE_LIMIT,
     ):
         service.characteristics.append(self)
         self.descriptors = []
@@ -219,15 +194,16 @@ class Characteristic(BaseCharacteristic):
             )
             if capture:
                 # Capture means that we keep track of all writes, and capture
-                # their values (and connection) in a queue. Otherwise we just
-                # track the connection of the most recent write.
+                # their values (and connection) in a queue of capture_depth
+                # writes. Otherwise we just track the connection of the most
+                # recent write.
                 flags |= _FLAG_WRITE_CAPTURE
-                BaseCharacteristic._init_capture()
+                self._init_capture(capture_depth)
 
-            # Set when this characteristic has a value waiting in self._write_data.
+            # Set when this characteristic has a write waiting: in
+            # self._write_data, or in the capture queue if capture is enabled.
             self._write_event = asyncio.ThreadSafeFlag()
-            # The connection of the most recent write, or a tuple of
-            # (connection, data) if capture is enabled.
+            # The connection of the most recent write (without capture).
             self._write_data = None
         if notify:
             flags |= _FLAG_NOTIFY
@@ -124,16 +124,13 @@ class BME280:
         self.i2c.writeto_mem(self.address, BME280_REGISTER_CONTROL,
                              self._l1_barray)
 
-    def read_raw_data(self, result):
-        """ Reads the raw (uncompensated) data from the sensor.
-
-            Args:
-                result: array of length 3 or alike where the result will be
-                stored, in temperature, pressure, humidity order
-            Returns:
-                None
-        """
+        # maximum forced mode conversion time (data sheet 9.1), in ms
+        self.measurement_ms = (1250 + 2300 * (1 << (self._mode_temp - 1)) +
+                               2300 * (1 << (self._mode_press - 1)) + 575 +
+                               2300 * (1 << (self._mode_hum - 1)) + 575 + 999) // 1000
 
+    def start_conversion(self):
+        """ Starts a forced mode conversion. """
         self._l1_barray[0] = self._mode_hum
         self.i2c.writeto_mem(self.address, BME280_REGISTER_CONTROL_HUM,
                              self._l1_barray)
@@ -141,15 +138,13 @@ class BME280:
         self.i2c.writeto_mem(self.address, BME280_REGISTER_CONTROL,
                              self._l1_barray)
 
-        # Wait for conversion to complete
-        for _ in range(BME280_TIMEOUT):
-            if self.i2c.readfrom_mem(self.address, BME280_REGISTER_STATUS, 1)[0] & 0x08:
-                time.sleep_ms(10)  # still busy
-            else:
-                break  # Sensor ready
-        else:
-            raise RuntimeError("Sensor BME280 not ready")
+    def busy(self):
+        """ True while a conversion is in progress. """
+        return bool(self.i2c.readfrom_mem(self.address, BME280_REGISTER_STATUS, 1)[0] & 0x08)
 
+    def read_raw_result(self, result):
+        """ Reads the raw result of the last conversion into result
+            (temperature, pressure, humidity order). """
         # burst readout from 0xF7 to 0xFE, recommended by datasheet
         self.i2c.readfrom_mem_into(self.address, 0xF7, self._l8_barray)
         readout = self._l8_barray
@@ -164,6 +159,29 @@ class BME280:
         result[1] = raw_press
         result[2] = raw_hum
 
+    def read_raw_data(self, result):
+        """ Reads the raw (uncompensated) data from the sensor.
+
+            Args:
+                result: array of length 3 or alike where the result will be
+                stored, in temperature, pressure, humidity order
+            Returns:
+                None
+        """
+
+        self.start_conversion()
+
+        # Wait for conversion to complete
+        for _ in range(BME280_TIMEOUT):
+            if self.busy():
+                time.sleep_ms(10)  # still busy
+            else:
+                break  # Sensor ready
+        else:
+            raise RuntimeError("Sensor BME280 not ready")
+
+        self.read_raw_result(result)
+
     def read_compensated_data(self, result=None):
         """ Reads the data from the sensor and returns the compensated data.
 
@@ -177,6 +195,15 @@ class BME280:
                 from the result parameter if not None
         """
         self.read_raw_data(self._l3_resultarray)
+        return self._compensate(result)
+
+    def read_result(self, result=None):
+        """ Returns the compensated data of a conversion started with
+            start_conversion(), once busy() is False. Does not wait. """
+        self.read_raw_result(self._l3_resultarray)
+        return self._compensate(result)
+
+    def _compensate(self, result):
         raw_temp, raw_press, raw_hum = self._l3_resultarray
         # temperature
         var1 = (((raw_temp // 8) - (self.dig_T1 * 2)) * self.dig_T2) // 2048
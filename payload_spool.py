@@ -0,0 +1,110 @@
+""" payload_spool.py """
+# Export frames encoded at log time, so a sync only has to stream bytes.
+#
+# spool.bin holds complete plain frames (see ble_frames.encode_batch), each
+# prefixed with its length as 2 bytes little endian. spool.tail holds the
+# frame still being filled, also already in its on-air form.
+import uos
+import json
+import struct
+import ble_frames
+
+_SPOOL_FILE = "spool.bin"
+_TAIL_FILE = "spool.tail"
+_FRAME_RECORDS = 5  # records per frame, same as aioble_manager._BLE_CHUNK_SIZE
+
+def exists():
+    try:
+        uos.stat(_SPOOL_FILE)
+        return True
+    except OSError:
+        return False
+
+def _read_tail():
+    try:
+        with open(_TAIL_FILE, "rb") as file:
+            return json.loads(file.read())["data"]
+    except (OSError, ValueError):
+        return []
+
+def _write_frames(spool, records):
+    for i in range(0, len(records), _FRAME_RECORDS):
+        batch = records[i:i + _FRAME_RECORDS]
+        payload = ble_frames.encode_batch(batch)
+        if len(batch) < _FRAME_RECORDS:
+            with open(_TAIL_FILE, "wb") as file:
+                file.write(payload)
+            return
+        spool.write(struct.pack("<H", len(payload)))
+        spool.write(payload)
+    try:
+        uos.remove(_TAIL_FILE)
+    except OSError:
+        pass
+
+def seed(records):
+    """Create the spool from records that are already in the log."""
+    try:
+        with open(_SPOOL_FILE, "wb") as spool:
+            _write_frames(spool, records)
+        print(f"Seeded {_SPOOL_FILE} with {len(records)} records")
+    except Exception as e:
+        print(f"[ERROR] Failed to seed {_SPOOL_FILE}: {e}")
+
+def append(record):
+    """Add one record, closing the tail frame into the spool once it is full."""
+    try:
+        records = _read_tail()
+        records.append([int(record[0])] + [str(v) for v in record[1:]])
+        with open(_SPOOL_FILE, "ab") as spool:
+            _write_frames(spool, records)
+    except Exception as e:
+        print(f"[ERROR] Failed to append to {_SPOOL_FILE}: {e}")
+
+def record_count():
+    """Number of spooled records, found from the frame headers alone."""
+    count = 0
+    header = bytearray(2)
+    try:
+        with open(_SPOOL_FILE, "rb") as spool:
+            while spool.readinto(header) == 2:
+                spool.seek(header[0] | header[1] << 8, 1)
+                count += _FRAME_RECORDS
+    except OSError:
+        pass
+    return count + len(_read_tail())
+
+def frames(view=None):
+    """Yield the spooled frames exactly as they go on air.
+
+    With a memoryview over a preallocated buffer, each frame is read into
+    that buffer and yielded as a slice of it instead of a new bytes object.
+    The slice is only valid until the next frame is read.
+    """
+    header = bytearray(2)
+    with open(_SPOOL_FILE, "rb") as spool:
+        while spool.readinto(header) == 2:
+            size = header[0] | header[1] << 8
+            if view is None or size > len(view):
+                yield spool.read(size)
+            else:
+                frame = view[:size]
+                spool.readinto(frame)
+                yield frame
+    try:
+        with open(_TAIL_FILE, "rb") as file:
+            if view is None:
+                yield file.read()
+            else:
+                size = file.readinto(view)
+                yield view[:size]
+    except OSError:
+        pass
+
+def reset():
+    """Drop the spool; it is seeded again from the log on the next boot."""
+    for path in (_SPOOL_FILE, _TAIL_FILE):
+        try:
+            uos.remove(path)
+        except OSError:
+            pass
@@ -1,8 +1,18 @@
 """ rtc_manager.py """
-from machine import RTC, deepsleep
+from machine import RTC, deepsleep, lightsleep
+import struct
 import time
 
 _DEEPSLEEP_DURATION_MS = 30 * 60 * 1000  #  30min
+_RESIDENT_PERIOD_S = 15  # log periods up to this stay resident in light sleep between samples
+
+# Drift of the RTC (and of the deep sleep timer, which runs off the same
+# slow clock), learned from the offsets measured by round-trip time syncs.
+_DRIFT_COMPENSATION = True
+_DRIFT_SECTION = "R"
+_DRIFT_FORMAT = "<IIif"            # last sync, drift reference, offset since the reference (ms), ppm
+_DRIFT_MIN_SPAN_S = 6 * 60 * 60    # shortest span a drift sample is taken over
+_DRIFT_MAX_PPM = 50_000            # samples beyond this are measurement errors
 
 class RTCManager:
     def __init__(self):
@@ -11,13 +21,21 @@ class RTCManager:
         self.last_log_time = None
         self.log_period = None
         self.last_advertise_time = None
+        self._sections = {}
         self._load_rtc_memory()
+        self._load_drift()
+        self._snapshot()
 
     # ------------------------- rtc memory -------------------------
     def _load_rtc_memory(self):
         """Load latest time & period from RTC memory"""
         try:
             rtc_data = self.rtc.memory()
+            end = rtc_data.find(b"\n")
+            if end >= 0:
+                self._sections = self._parse_sections(rtc_data[end + 1:])
+                rtc_data = rtc_data[:end]
+
             if not rtc_data:
                 print("RTC Memory is empty. Resetting values.")
                 self.latest_time, self.period = None, None
@@ -48,7 +66,7 @@ class RTCManager:
                 raise ValueError("All of latest_epoch, period_seconds, and advertise_time must be set.")
 
             rtc_data = f"{latest_epoch},{period_seconds},{advertise_time}"
-            self.rtc.memory(rtc_data.encode())  # Save to RTC memory
+            self._write_rtc_memory(rtc_data.encode())  # Save to RTC memory
 
             self.last_log_time = latest_epoch
             self.log_period = period_seconds
@@ -58,6 +76,50 @@ class RTCManager:
         except Exception as e:
             print(f"❌ RTC Memory Save Error: {e}")
 
+    # ------------------------- rtc memory sections -------------------------
+    # Other modules keep small state in RTC memory after the first line, as
+    # (tag, length, payload) entries; tags are single characters.
+    def _parse_sections(self, data):
+        sections = {}
+        pos = 0
+        while pos + 2 <= len(data):
+            size = data[pos + 1]
+            sections[chr(data[pos])] = bytes(data[pos + 2:pos + 2 + size])
+            pos += 2 + size
+        return sections
+
+    def _write_rtc_memory(self, header):
+        data = bytearray(header)
+        if self._sections:
+            data.append(0x0A)
+            for tag, payload in self._sections.items():
+                data.append(ord(tag))
+                data.append(len(payload))
+                data.extend(payload)
+        self.rtc.memory(data)
+
+    def _header(self):
+        if self.last_log_time is None or self.log_period is None or self.last_advertise_time is None:
+            return b""
+        return f"{self.last_log_time},{self.log_period},{self.last_advertise_time}".encode()
+
+    def get_section(self, tag):
+        """Return the payload stored under tag, or None."""
+        return self._sections.get(tag)
+
+    def set_section(self, tag, payload):
+        """Store up to 255 bytes under tag, keeping the rest of RTC memory."""
+        try:
+            if payload is None:
+                self._sections.pop(tag, None)
+            else:
+                if len(payload) > 255:
+                    raise ValueError(f"RTC section {tag} too long: {len(payload)}")
+                self._sections[tag] = bytes(payload)
+            self._write_rtc_memory(self._header())
+        except Exception as e:
+            print(f"❌ RTC Memory Save Error: {e}")
+
     # ------------------------- set rtc -------------------------
     def set_rtc_datetime(self, time_list):
         """Set RTC time using [YYYY, MM, DD, HH, MM, SS] format"""
@@ -70,21 +132,93 @@ class RTCManager:
             self.rtc.datetime((year, month, day, 0, hour, minute, second, 0))
             print(f"✅ RTC Time Set: {time_list}")
 
-            return time.mktime((year, month, day, hour, minute, second, 0, 0))
+            epoch = time.mktime((year, month, day, hour, minute, second, 0, 0))
+            self._snapshot(epoch * 1000)
+            # A whole-second set is too coarse to learn the drift from.
+            self._save_drift(epoch, epoch, 0, self.drift_ppm)
+            return epoch
 
         except Exception as e:
             print(f"RTC Time Set Error: {e}")
     
-    def format_rtc_datetime(self):
-        """Format RTC datetime to 'YYYY-MM-DDTHH:MM:SS'"""
-        dt = self.rtc.datetime()
-        return f"{dt[0]:04d}-{dt[1]:02d}-{dt[2]:02d}T{dt[4]:02d}:{dt[5]:02d}:{dt[6]:02d}"
+    def adjust_rtc_ms(self, delta_ms):
+        """Step the RTC by delta_ms, keeping millisecond precision"""
+        ms = self.rtc_ms() + delta_ms
+        t = time.gmtime(ms // 1000)
+        self.rtc.datetime((t[0], t[1], t[2], t[6], t[3], t[4], t[5], (ms % 1000) * 1000))
+        self._snapshot(ms)
+        print(f"✅ RTC adjusted by {delta_ms} ms")
+
+    # ------------------------- drift -------------------------
+    def _load_drift(self):
+        """Load the drift estimate kept in RTC memory"""
+        self.last_sync, self._drift_ref, self._drift_offset_ms, self.drift_ppm = 0, 0, 0, 0.0
+        saved = self.get_section(_DRIFT_SECTION)
+        if saved and len(saved) == struct.calcsize(_DRIFT_FORMAT):
+            self.last_sync, self._drift_ref, self._drift_offset_ms, self.drift_ppm = struct.unpack(_DRIFT_FORMAT, saved)
+
+    def _save_drift(self, last_sync, drift_ref, drift_offset_ms, drift_ppm):
+        self.last_sync, self._drift_ref, self._drift_offset_ms, self.drift_ppm = last_sync, drift_ref, drift_offset_ms, drift_ppm
+        self._snapshot_drift_ms = self._drift_ms(self._snapshot_ms // 1000)
+        self.set_section(_DRIFT_SECTION, struct.pack(_DRIFT_FORMAT, last_sync, drift_ref, drift_offset_ms, drift_ppm))
+
+    def _drift_ms(self, raw_epoch):
+        """How far the RTC is estimated to have run ahead since the last sync"""
+        if not _DRIFT_COMPENSATION or not self.last_sync:
+            return 0
+        return int((raw_epoch - self.last_sync) * self.drift_ppm / 1000)
+
+    def record_sync(self, offset_ms):
+        """Learn from a round-trip sync that measured the RTC offset_ms ahead of
+        the central; call it after stepping the RTC back by offset_ms.
+
+        Returns the error the drift-corrected time had at the sync (ms), or
+        None without an earlier sync, so records logged since last_sync can
+        be corrected.
+        """
+        now = self.rtc_ms() // 1000
+        residual_ms = None
+        if self.last_sync:
+            residual_ms = offset_ms - self._drift_ms(now + offset_ms // 1000)
+
+        drift_ref, drift_offset_ms, drift_ppm = self._drift_ref, self._drift_offset_ms + offset_ms, self.drift_ppm
+        if not drift_ref:
+            drift_ref, drift_offset_ms = now, 0
+        elif now - drift_ref >= _DRIFT_MIN_SPAN_S:
+            sample = drift_offset_ms * 1000 / (now - drift_ref)
+            if abs(sample) <= _DRIFT_MAX_PPM:
+                # The first sample is taken as is, later ones are averaged in.
+                drift_ppm = sample if not drift_ppm else (drift_ppm + sample) / 2
+                print(f"⏱️ RTC drift: {sample:.1f} ppm measured, {drift_ppm:.1f} ppm estimated")
+            drift_ref, drift_offset_ms = now, 0
+
+        self._save_drift(now, drift_ref, drift_offset_ms, drift_ppm)
+        return residual_ms
+
+    # ------------------------- clock snapshot -------------------------
+    # The RTC is read once per wake; later readings are the snapshot plus
+    # ticks_ms, so every consumer shares it without another RTC call.
+    def _snapshot(self, rtc_ms=None):
+        """Take the snapshot from the RTC, or from a time just written to it"""
+        if rtc_ms is None:
+            dt = self.rtc.datetime()
+            rtc_ms = time.mktime((dt[0], dt[1], dt[2], dt[4], dt[5], dt[6], 0, 0)) * 1000 + dt[7] // 1000
+        self._snapshot_ticks = time.ticks_ms()
+        self._snapshot_ms = rtc_ms
+        self._snapshot_drift_ms = self._drift_ms(rtc_ms // 1000)
+
+    def rtc_ms(self):
+        """Raw RTC time in milliseconds since 2000-01-01, including the sub-second part"""
+        return self._snapshot_ms + time.ticks_diff(time.ticks_ms(), self._snapshot_ticks)
 
     # ------------------------- check rtc time -------------------------
 
     def current_epoch(self):
-        dt = self.rtc.datetime()
-        return time.mktime((dt[0], dt[1], dt[2], dt[4], dt[5], dt[6], 0, 0))
+        """RTC time in epoch seconds, corrected for the drift since the last sync"""
+        return (self.rtc_ms() - self._snapshot_drift_ms) // 1000
+
+    def current_hour(self):
+        return time.gmtime(self.current_epoch())[3]
 
     def is_sensor_time(self):
         """Check if it's time to perform sensor measurement."""
@@ -108,12 +242,11 @@ class RTCManager:
     # ------------------------- deep sleep -------------------------
     def calculate_sleep_duration(self):
         """Calculate how long the ESP32 should stay in deep sleep (based on epoch time)"""
-        dt = self.rtc.datetime()
-        current_epoch_time = time.mktime((dt[0], dt[1], dt[2], dt[4], dt[5], dt[6], 0, 0))
+        current_ms = self.rtc_ms() - self._snapshot_drift_ms
 
         next_wakeup_time = self.last_log_time + self.log_period
-        remaining_seconds = next_wakeup_time - current_epoch_time
-        remaining_ms = remaining_seconds * 1000
+        # To the millisecond, so the time spent awake does not push every wake later.
+        remaining_ms = next_wakeup_time * 1000 - current_ms
 
         if remaining_ms <= 0:
             print("Wake-up time reached, no deep sleep needed.")
@@ -125,9 +258,33 @@ class RTCManager:
             print(f"🛌 Log period < Deep sleep period → {remaining_ms // 1000}sec")
             return remaining_ms
 
-    def enter_deep_sleep(self):
-        """Enter deep sleep mode for the required duration"""
-        duration_ms = self.calculate_sleep_duration()
+    def _rtc_duration_ms(self, ms):
+        """The sleep timer runs off the drifting RTC clock: scale a true duration to it"""
+        if not _DRIFT_COMPENSATION:
+            return ms
+        return -int(-ms * (1 + self.drift_ppm / 1_000_000))  # rounded up, never wake early
+
+    def stays_resident(self):
+        """Short log periods skip the reboot of deep sleep and light sleep instead"""
+        return self.log_period is not None and self.log_period <= _RESIDENT_PERIOD_S
+
+    def light_sleep_ms(self):
+        """How long a light sleep until the next sample lasts, in RTC ms"""
+        return self._rtc_duration_ms(self.calculate_sleep_duration())
+
+    def enter_light_sleep(self, duration_ms=None):
+        """Light sleep until the next sample (or for duration_ms); RAM, drivers and the BLE stack stay up"""
+        if duration_ms is None:
+            duration_ms = self.light_sleep_ms()
+        if duration_ms > 0:
+            print(f"Entering Light Sleep for {duration_ms} ms...")
+            lightsleep(duration_ms)
+        self._snapshot()
+
+    def enter_deep_sleep(self, duration_ms=None):
+        """Enter deep sleep mode for the required duration (or for duration_ms)"""
+        if duration_ms is None:
+            duration_ms = self._rtc_duration_ms(self.calculate_sleep_duration())
         if duration_ms <= 0:
             deepsleep(10)
         print(f"Entering Deep Sleep for {duration_ms // 1000} sec...")
@@ -0,0 +1,107 @@
+""" sensor_drivers.py """
+# Sensor drivers, and the probes fitted to this board.
+#
+# Every driver takes a reading in the same steps, so SensorLogger can start
+# all conversions at once, wait for the slowest one and then read the
+# probes one after another: acquisition takes the longest conversion time
+# instead of the sum of them.
+#
+#   conversion_ms   how long after start() the result is ready
+#   start()         trigger a conversion and return at once
+#   ready()         True once the result can be read
+#   read()          the result, one fixed-point integer per channel
+#
+# A driver class declares its channels as (name, decimals): with 2
+# decimals the integer 2215 is logged as "22.15".
+#
+# SENSORS lists the probes on this board as (schedule name, driver, args).
+# A record holds their channels in this order after the epoch; the
+# schedule name is what channel_schedule.py samples it by. Drivers for
+# other probes are added with register().
+from machine import I2C, Pin
+from bme import BME280
+from material_sensor import MaterialSensor
+
+_BME280_OVERSAMPLING = 4        # BME280_OSAMPLE_8 for temperature, pressure and humidity
+_I2C_PINS = {0: (22, 21)}       # bus: (scl, sda)
+_I2C_FREQ = 100000
+
+SENSORS = (
+    ("env", "bme280", {"bus": 0, "address": 0x76}),
+    ("res", "material", {"pin": 25}),
+)
+
+# ------------------------- Drivers -------------------------
+
+class BME280Driver:
+    channels = (("temperature", 2), ("humidity", 2))
+
+    def __init__(self, bus, address=0x76, oversampling=None):
+        mode = _BME280_OVERSAMPLING if oversampling is None else oversampling
+        self._sensor = BME280(mode=mode, address=address, i2c=_i2c(bus))
+        self.conversion_ms = self._sensor.measurement_ms
+
+    def start(self):
+        self._sensor.start_conversion()
+
+    def ready(self):
+        return not self._sensor.busy()
+
+    def read(self):
+        temperature, _, humidity = self._sensor.read_result()
+        return temperature, (humidity * 100 + 512) // 1024  # 0.01 C, 0.01 %RH, rounded
+
+
+class MaterialDriver:
+    channels = (("resistance", 1),)
+    conversion_ms = 0
+
+    def __init__(self, pin):
+        self._sensor = MaterialSensor(Pin(pin))
+
+    def start(self):
+        pass
+
+    def ready(self):
+        return True
+
+    def read(self):
+        value = self._sensor.read_resistance() * 10
+        return (int(value + 0.5) if value >= 0 else -int(-value + 0.5),)
+
+
+_DRIVERS = {"bme280": BME280Driver, "material": MaterialDriver}
+_buses = {}
+
+def register(kind, driver_class):
+    """Make a driver class available to SENSORS entries of this kind."""
+    _DRIVERS[kind] = driver_class
+
+def _i2c(bus):
+    if bus not in _buses:
+        scl, sda = _I2C_PINS[bus]
+        _buses[bus] = I2C(bus, scl=Pin(scl), sda=Pin(sda), freq=_I2C_FREQ)
+    return _buses[bus]
+
+# ------------------------- Board -------------------------
+
+def names():
+    """Schedule names of the probes, in record order."""
+    return tuple(name for name, _, _ in SENSORS)
+
+def channels():
+    """(name, decimals) of every channel, in record order."""
+    return tuple(channel for _, kind, _ in SENSORS for channel in _DRIVERS[kind].channels)
+
+def open_sensors():
+    """Create the drivers of the probes on this board, as (schedule name, driver)."""
+    return [(name, _DRIVERS[kind](**args)) for name, kind, args in SENSORS]
+
+def format_fixed(value, decimals):
+    """Logged text of a fixed-point value."""
+    if not decimals:
+        return str(value)
+    sign = "-" if value < 0 else ""
+    value = abs(value)
+    scale = 10 ** decimals
+    return f"{sign}{value // scale}.{value % scale:0{decimals}d}"
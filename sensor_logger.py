@@ -1,32 +1,92 @@
 """ sensor_logger.py """
-from machine import Pin, I2C
-from bme import BME280
+import time
+import uasyncio as asyncio
+import alert_rules
+import channel_schedule
+import diagnostics
 import file_utils
-from material_sensor import MaterialSensor
+import heap_probe
+import payload_spool
+import sensor_drivers
+import write_behind
+
+_SPOOL_EXPORT = True  # pre-encode BLE export frames at log time
+_PARALLEL_CONVERSIONS = True  # start every probe's conversion at once (sensor_drivers.py)
+_READY_TIMEOUT_MS = 100  # extra wait for a probe still converting after its conversion_ms
+_READY_POLL_MS = 2
 
 class SensorLogger:
     """Class to handle temperature, humidity, and material resistivity logging."""
     # ------------------------- Initialization -------------------------
-    def __init__(self):
-        # Initialize DHT20 (using I2C)
-        self.i2c = I2C(0, scl=Pin(22), sda=Pin(21), freq=100000)
-        self.sensor = BME280(i2c=self.i2c)
-        self.material_sensor = MaterialSensor(Pin(25))
+    def __init__(self, spool=_SPOOL_EXPORT):
+        # Probes on this board: BME280 on I2C, material sensor on the ADC, ...
+        self.sensors = sensor_drivers.open_sensors()
         
         # Load existing data
         file_utils.create_csv_file()
 
+        self.spool = spool
+        if spool and not payload_spool.exists():
+            payload_spool.seed(file_utils.read_csv_file())
+
     # ------------------------- Sensor Reading Methods -------------------------
-    def get_sensor_data(self, current_time):
-        """Read temperature & humidity from bme280 sensor."""
+    async def get_sensor_data(self, epoch, channels=None):
+        """Read the probes due in this wake (channel_schedule.py; all by default) and log
+        a record, yielding to the event loop while the probes convert."""
         try:
-            temperature, humidity = self.sensor.values
-            material_resistance = self.material_sensor.read_resistance()
-
-            new_record = [current_time, temperature, humidity, str(material_resistance)]
-            file_utils.append_csv_file(new_record)
-            print(f"Logged data: {new_record}")
-            return temperature, humidity
+            with heap_probe.phase("sensor"):
+                started = time.ticks_ms()
+                readings = {}
+                for group in self._groups(channels):
+                    for _, driver in group:
+                        driver.start()
+                    await asyncio.sleep_ms(max(driver.conversion_ms for _, driver in group))
+                    for name, driver in group:
+                        for _ in range(_READY_TIMEOUT_MS // _READY_POLL_MS):
+                            if driver.ready():
+                                break
+                            await asyncio.sleep_ms(_READY_POLL_MS)
+                        readings[name] = self._read(name, driver)
+                return self._log_record(epoch, readings, started)
         except Exception as e:
-            print(f"Error reading sensor data: {e}")
-            return None
\ No newline at end of file
+            self._sensor_error(e)
+            return None
+
+    def _groups(self, channels):
+        """The probes due, in groups that convert at the same time: all of them
+        together, so the wait is the longest conversion rather than the sum."""
+        due = [(name, driver) for name, driver in self.sensors if channels is None or name in channels]
+        if not due:
+            return []
+        return [due] if _PARALLEL_CONVERSIONS else [[sensor] for sensor in due]
+
+    def _read(self, name, driver):
+        if not driver.ready():
+            raise RuntimeError(f"Sensor {name} not ready")
+        return driver.read()
+
+    def _log_record(self, epoch, readings, started):
+        if not readings:
+            return None
+        diagnostics.sensor_read(time.ticks_diff(time.ticks_ms(), started))
+        channel_schedule.sampled(readings, epoch)
+
+        # Timestamps are epoch seconds (since 2000-01-01); the host formats them.
+        # Channels not sampled in this wake are empty, trailing ones left out.
+        new_record = [epoch]
+        for name, driver in self.sensors:
+            values = readings.get(name)
+            for n, (_, decimals) in enumerate(driver.channels):
+                new_record.append("" if values is None else sensor_drivers.format_fixed(values[n], decimals))
+        while new_record[-1] == "":
+            new_record.pop()
+        # Held in RAM while the radio is busy (write_behind.py)
+        write_behind.append(new_record, epoch, self.spool)
+        print(f"Logged data: {new_record}")
+        # Threshold alerts get their own advertising burst (alert_rules.py)
+        alert_rules.check(new_record)
+        return new_record
+
+    def _sensor_error(self, e):
+        print(f"Error reading sensor data: {e}")
+        diagnostics.error(diagnostics.ERR_MEMORY if isinstance(e, MemoryError) else diagnostics.ERR_SENSOR)
\ No newline at end of file
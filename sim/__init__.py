@@ -0,0 +1,20 @@
+""" sim
+
+Host-side simulation of the sensor node: the firmware in this repository
+runs unmodified on CPython against simulated MicroPython modules (RTC with
+controllable time and persistent memory, deep/light sleep, BME280 on I2C,
+ADC, flash filesystem in a temporary directory, BLE radio).
+
+    from sim import Board
+    board = Board()
+    board.provision(period=60)
+    board.run(1000)
+
+A scripted central can be attached with sim.ble_link.BLELink(board, ...);
+python3 -m sim.bench_ble sweeps link parameters for the log export.
+
+Not uploaded to the device.
+"""
+from sim.ble_link import BLELink, Gateway, LinkParams, Maintenance, Registrar
+from sim.board import Board, CycleResult, diurnal_environment, material_adc
+from sim.clock import EPOCH_2000, SimClock
@@ -0,0 +1,52 @@
+""" python -m sim: run wake cycles of the firmware on the host """
+import argparse
+import time
+
+from sim import Board
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run simulated wake cycles of boot.py")
+    parser.add_argument("--cycles", type=int, default=1000)
+    parser.add_argument("--period", type=int, default=60, help="log period in seconds")
+    parser.add_argument("--channels", nargs="+", default=[], metavar="NAME=SECONDS",
+                        help="periods of slow channels (channel_schedule.py), e.g. res=900")
+    parser.add_argument("--boot-ms", type=int, default=300)
+    parser.add_argument("--verbose", action="store_true", help="show firmware output")
+    parser.add_argument("--keep", action="store_true", help="keep the flash directory")
+    args = parser.parse_args()
+
+    board = Board(boot_ms=args.boot_ms, verbose=args.verbose)
+    channels = {name: int(seconds) for name, seconds in (item.split("=") for item in args.channels)}
+    board.provision(args.period, channels)
+
+    started = time.perf_counter()
+    results = board.run(args.cycles)
+    wall = time.perf_counter() - started
+
+    simulated_s = board.clock.monotonic()
+    # Short log periods stay resident in light sleep: one boot, many cycles.
+    cycles = max(len(board.wakes_us), 1)
+    awake_ms = (board.time_in.get("awake", 0) - board.time_in.get("lightsleep", 0)) / 1000
+    print(f"cycles:           {cycles} ({len(results)} boots)")
+    print(f"simulated time:   {simulated_s / 3600:.1f} h")
+    print(f"awake per cycle:  {awake_ms / cycles:.1f} ms (+{args.boot_ms} ms per boot)")
+    for state, us in sorted(board.time_in.items()):
+        print(f"time {state + ':':12s}{us / 1_000_000:10.1f} s")
+    print(f"RTC reads:        {board.rtc_reads / cycles:.1f} per cycle")
+    chip = next(iter(board.i2c_devices.values()))
+    print(f"BME280 reads:     {chip.conversions / cycles:.2f} per cycle")
+    print(f"ADC reads:        {board.adc_reads / cycles:.2f} per cycle")
+    print(f"records in log:   {board.logged_records()}")
+    if board.logged_records():
+        print(f"log bytes:        {board.log_bytes() / board.logged_records():.1f} per record")
+    print(f"flash writes:     {board.fs.writes}")
+    print(f"wall time:        {wall:.2f} s ({wall / cycles * 1000:.2f} ms/cycle)")
+    if args.keep:
+        print(f"flash directory:  {board.fs.root}")
+    else:
+        board.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+""" python -m sim.bench_adv: fixed vs adaptive wake-up advertising
+
+Runs the firmware for a number of simulated days with a gateway that is
+in range according to a scenario, once with the fixed 1 s / 30 s window
+and once with adv_policy's learned schedule, and reports discovery
+latency, advertising time and radio airtime per day:
+
+    python3 -m sim.bench_adv --days 3 --scenario always daytime absent
+
+Scenarios: always (gateway always scanning), daytime (08:00-18:00 only),
+absent (never in range).
+"""
+import argparse
+
+from sim import Board
+from sim.ble_link import BLELink, Gateway, LinkParams
+
+_SCENARIOS = {
+    "always": lambda epoch: True,
+    "daytime": lambda epoch: 8 <= (epoch % 86400) // 3600 < 18,
+    "absent": lambda epoch: False,
+}
+_POLICIES = {
+    "fixed": {"adv_policy": {"_ADAPTIVE": False}},
+    "adaptive": {},
+}
+
+
+def run(scenario, policy, days, period, scan_duty, seed):
+    board = Board(overrides=_POLICIES[policy])
+    try:
+        board.provision(period)
+        present = _SCENARIOS[scenario]
+        gateway = Gateway(present=lambda now: present(board.clock.epoch()))
+        link = BLELink(board, gateway, LinkParams(scan_duty=scan_duty, seed=seed))
+        end = board.clock.monotonic() + days * 86400
+        while board.clock.monotonic() < end:
+            board.boot()
+
+        latencies = sorted(s.discovery_s for s in link.sessions)
+        return {
+            "connections": len(latencies),
+            "discovery_mean_s": sum(latencies) / len(latencies) if latencies else None,
+            "discovery_p90_s": latencies[int(len(latencies) * 0.9)] if latencies else None,
+            "advertising_s_day": board.time_in.get("advertising", 0) / 1_000_000 / days,
+            "airtime_ms_day": board.time_in.get("adv_airtime", 0) / 1000 / days,
+        }
+    finally:
+        board.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare wake-up advertising policies")
+    parser.add_argument("--days", type=float, default=2)
+    parser.add_argument("--period", type=int, default=600, help="log period in seconds")
+    parser.add_argument("--scenario", nargs="+", default=list(_SCENARIOS), choices=list(_SCENARIOS))
+    parser.add_argument("--scan-duty", type=float, default=0.3, help="fraction of advertising events the gateway hears")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'scenario':9s} {'policy':9s} {'conns':>5} {'disc mean':>10} {'disc p90':>9} "
+          f"{'adv s/day':>10} {'airtime ms/day':>15}")
+    for scenario in args.scenario:
+        for policy in _POLICIES:
+            r = run(scenario, policy, args.days, args.period, args.scan_duty, args.seed)
+            mean = f"{r['discovery_mean_s']:10.2f}" if r["connections"] else f"{'-':>10}"
+            p90 = f"{r['discovery_p90_s']:9.2f}" if r["connections"] else f"{'-':>9}"
+            print(f"{scenario:9s} {policy:9s} {r['connections']:5d} {mean} {p90} "
+                  f"{r['advertising_s_day']:10.1f} {r['airtime_ms_day']:15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+""" python -m sim.bench_alert: alert-to-gateway latency with and without the alert burst
+
+Runs the firmware for a number of simulated days in an environment where
+the humidity jumps to --spike %RH for --spike-min minutes every
+--every hours, with the alert rule humidity > --limit. The gateway is
+always in range. For each spike it measures the time from the first
+sample above the limit to the gateway's next connection, once with the
+alert burst (alert_rules.py) and once with only the scheduled wake-up
+windows, and reports the charge per day the bursts cost:
+
+    python3 -m sim.bench_alert --days 2 --period 60 600
+
+The gateway hears the alert in the advertising data (manufacturer data,
+alert_rules.adv_payload) before it connects; "heard" counts those.
+"""
+import argparse
+import struct
+
+from sim import Board
+from sim import energy
+from sim.ble_link import BLELink, Gateway, LinkParams
+from sim.board import diurnal_environment
+
+_MODES = {
+    "burst": {},
+    "scheduled": {"alert_rules": {"_ENABLED": False}},
+}
+
+
+def run(mode, days, period, args):
+    overrides = {"alert_rules": {"_DEFAULT_RULES": ((2, ">", args.limit),)}}
+    for module, attrs in _MODES[mode].items():
+        overrides.setdefault(module, {}).update(attrs)
+
+    spikes = []  # spike onsets, seconds since the start
+
+    def environment(epoch):
+        temperature, humidity, pressure = diurnal_environment(epoch)
+        elapsed = epoch - board.clock.start_epoch
+        if elapsed % (args.every * 3600) >= args.every * 3600 - args.spike_min * 60:
+            humidity = args.spike
+        return temperature, humidity, pressure
+
+    board = Board(overrides=overrides, environment=environment)
+    try:
+        board.provision(period)
+        link = BLELink(board, Gateway(), LinkParams(scan_duty=args.scan_duty, seed=args.seed))
+        board.run_for(days * 86400)
+
+        chip = next(iter(board.i2c_devices.values()))
+        every = args.every * 3600
+        onset = every - args.spike_min * 60
+        while onset < board.clock.monotonic():
+            spikes.append(onset)
+            onset += every
+        connections = [session.connected_at for session in link.sessions]
+        samples = [us / 1e6 for us in chip.conversion_us]
+
+        latencies = []
+        for onset in spikes:
+            breach = next((t for t in samples if onset <= t < onset + args.spike_min * 60), None)
+            connected = next((t for t in connections if breach is not None and t >= breach), None)
+            if connected is not None:
+                latencies.append(connected - breach)
+        heard = [struct.unpack("<BBh", data) for _, data in link.heard if data]
+        return {
+            "spikes": len(spikes),
+            "latency_mean_s": sum(latencies) / len(latencies) if latencies else None,
+            "latency_max_s": max(latencies) if latencies else None,
+            "heard": len(heard),
+            "mah_per_day": sum(energy.mah_per_day(board).values()),
+        }
+    finally:
+        board.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Alert-to-gateway latency with and without the alert burst")
+    parser.add_argument("--days", type=float, default=1)
+    parser.add_argument("--period", type=int, nargs="+", default=[60, 600], help="log periods in seconds")
+    parser.add_argument("--limit", type=float, default=60.0, help="humidity alert limit in %%RH")
+    parser.add_argument("--spike", type=float, default=85.0, help="humidity during a spike")
+    parser.add_argument("--spike-min", type=int, default=20, help="spike length in minutes")
+    parser.add_argument("--every", type=float, default=5, help="hours between spikes")
+    parser.add_argument("--scan-duty", type=float, default=0.3, help="fraction of advertising events the gateway hears")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'period':>6} {'mode':>9} {'spikes':>6} {'heard':>5} {'latency s':>9} {'max s':>8} {'mAh/day':>8}")
+    for period in args.period:
+        for mode in _MODES:
+            r = run(mode, args.days, period, args)
+            mean = f"{r['latency_mean_s']:9.1f}" if r["latency_mean_s"] is not None else f"{'-':>9}"
+            worst = f"{r['latency_max_s']:8.1f}" if r["latency_max_s"] is not None else f"{'-':>8}"
+            print(f"{period:6d} {mode:>9} {r['spikes']:6d} {r['heard']:5d} {mean} {worst} {r['mah_per_day']:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
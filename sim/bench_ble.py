@@ -0,0 +1,117 @@
+""" python -m sim.bench_ble: export over the simulated BLE link
+
+Logs a number of records with the gateway out of range, then lets it
+connect at the next advertising window and measures the export for every
+combination of the swept link parameters:
+
+    python3 -m sim.bench_ble --interval 15 30 100 --loss 0 0.05 --mtu 23 247
+
+Reports discovery time, time to first notification (TTFB) from the
+connection and from the trigger write, throughput,
+link-layer retransmissions, dropped notifications and how many of the
+logged records the central could decode.
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+
+from sim import Board
+from sim.ble_link import BLELink, Gateway, LinkParams
+from sim.board import FIRMWARE_DIR
+
+sys.path.insert(0, os.path.join(FIRMWARE_DIR, "test"))
+from ble_decode import decode_frames  # noqa: E402
+
+_MAX_WAIT_CYCLES = 200
+
+
+def run_case(records, period, params, compress, prefetch=True, cpu_scale=0):
+    board = Board(overrides=None if prefetch else {"aioble_manager": {"_PREFETCH_ON_CONNECT": False}},
+                  cpu_scale=cpu_scale)
+    try:
+        board.provision(period)
+        gateway = Gateway(present=lambda now: False,
+                          trigger={"compress": [compress]} if compress else None)
+        link = BLELink(board, gateway, params)
+
+        while board.logged_records() < records:
+            board.boot()
+
+        gateway.present = lambda now: True
+        for _ in range(_MAX_WAIT_CYCLES):
+            logged = board.logged_records()
+            board.boot()
+            if link.sessions and link.sessions[-1].disconnected_at is not None:
+                break
+        if not link.sessions:
+            return {"error": "no connection"}
+
+        session = link.sessions[-1]
+        try:
+            decoded = len(decode_frames(session.notifications))
+        except ValueError:
+            decoded = None  # truncated frames the central cannot parse
+        ttfb = session.time_to_first_byte_s
+        trigger_ttfb = session.trigger_to_first_byte_s
+        return {
+            "records": logged,
+            "discovery_s": round(session.discovery_s, 3),
+            "ttfb_s": round(ttfb, 3) if ttfb is not None else None,
+            "trigger_ttfb_s": round(trigger_ttfb, 3) if trigger_ttfb is not None else None,
+            "session_s": round(session.duration_s, 3),
+            "notifications": len(session.notifications),
+            "bytes": session.notify_bytes,
+            "throughput_Bps": round(session.throughput_bps, 1),
+            "retransmissions": link.lost_packets,
+            "dropped": link.dropped_notifications,
+            "decoded": decoded,
+        }
+    finally:
+        board.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep BLE link parameters for the log export")
+    parser.add_argument("--records", type=int, nargs="+", default=[100])
+    parser.add_argument("--period", type=int, default=60, help="log period in seconds")
+    parser.add_argument("--interval", type=int, nargs="+", default=[30], help="connection interval in ms")
+    parser.add_argument("--loss", type=float, nargs="+", default=[0.0])
+    parser.add_argument("--mtu", type=int, nargs="+", default=[247])
+    parser.add_argument("--depth", type=int, nargs="+", default=[8], help="controller notify buffers")
+    parser.add_argument("--compress", nargs="+", default=["none"], choices=["none", "deflate"])
+    parser.add_argument("--no-prefetch", action="store_true", help="encode only after the trigger write")
+    parser.add_argument("--cpu-scale", type=float, default=0,
+                        help="charge host CPU time x this to the virtual clock (e.g. 100)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print one JSON object per case")
+    args = parser.parse_args()
+
+    cases = itertools.product(args.records, args.interval, args.loss, args.mtu, args.depth, args.compress)
+    if not args.json:
+        print(f"{'records':>7} {'ival':>4} {'loss':>5} {'mtu':>4} {'depth':>5} {'mode':>7} "
+              f"{'disc s':>7} {'ttfb s':>7} {'trig s':>7} {'sess s':>7} {'B/s':>8} {'retx':>5} {'drop':>5} {'decoded':>7}")
+    for records, interval, loss, mtu, depth, compress in cases:
+        params = LinkParams(conn_interval_ms=interval, loss=loss, mtu=mtu, buffer_depth=depth, seed=args.seed)
+        compress = None if compress == "none" else compress
+        result = run_case(records, args.period, params, compress, not args.no_prefetch, args.cpu_scale)
+        result.update({"interval_ms": interval, "loss": loss, "mtu": mtu, "depth": depth,
+                       "compress": compress or "none"})
+        if args.json:
+            print(json.dumps(result))
+        elif "error" in result:
+            print(f"{records:7d} {interval:4d} {loss:5.2f} {mtu:4d} {depth:5d} {compress or 'none':>7} {result['error']}")
+        else:
+            print(f"{result['records']:7d} {interval:4d} {loss:5.2f} {mtu:4d} {depth:5d} {compress or 'none':>7} "
+                  f"{result['discovery_s']:7.2f} {_fmt(result['ttfb_s'])} {_fmt(result['trigger_ttfb_s'])} {result['session_s']:7.2f} "
+                  f"{result['throughput_Bps']:8.1f} {result['retransmissions']:5d} {result['dropped']:5d} "
+                  f"{_fmt(result['decoded'], '7d')}")
+
+
+def _fmt(value, spec="7.2f"):
+    return format(value, spec) if value is not None else format("-", ">7")
+
+
+if __name__ == "__main__":
+    main()
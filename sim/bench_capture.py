@@ -0,0 +1,119 @@
+""" python -m sim.bench_capture: aioble capture-mode write queues under interleaved writes
+
+Serves two capture-enabled characteristics on the simulated radio (the
+aioble server in lib/, not the firmware): a slow one whose handler takes
+--slow-ms per write and a fast one handled at once. A central writes to
+them in turn, one write with response every connection event, so the
+slow characteristic gets more writes than its handler keeps up with.
+Reported per characteristic: writes handled and dropped, and the delay
+from the central's write to its handler:
+
+    python3 -m sim.bench_capture --writes 200 --slow-ms 100 200 --depth 4 10
+
+Each capture characteristic has its own queue of capture_depth writes,
+so the fast characteristic's delay stays at the link's, whatever the
+slow handler does.
+"""
+import argparse
+import asyncio
+import struct
+
+from sim import Board
+from sim.ble_link import BLELink, Gateway, LinkParams
+
+_SERVICE_UUID = "5f97247b-4474-424c-a826-f8ec299b6a00"
+_UUIDS = {"slow": "5f97247b-4474-424c-a826-f8ec299b6a01", "fast": "5f97247b-4474-424c-a826-f8ec299b6a02"}
+
+
+class Writer(Gateway):
+    """Central script: interleaved writes with response to both characteristics."""
+
+    def __init__(self, writes, drain_s=30.0):
+        super().__init__()
+        self.writes = writes
+        self.drain_s = drain_s
+        self.sent = {name: {} for name in _UUIDS}  # sequence: write time
+
+    async def run(self, link, conn):
+        await link.central_exchange_mtu(conn)
+        for seq in range(self.writes):
+            name = ("slow", "fast")[seq % 2]
+            self.sent[name][seq] = link.now()
+            await link.central_write(conn, _UUIDS[name], struct.pack("<I", seq))
+        await asyncio.sleep(self.drain_s)
+        await link.central_disconnect(conn)
+
+
+def run(writes, slow_ms, depth, params):
+    board = Board()
+    writer = Writer(writes)
+    BLELink(board, writer, params)
+    handled = {name: {} for name in _UUIDS}  # sequence: handler start time
+    try:
+        with board.install():
+            import aioble
+            import bluetooth
+            import uasyncio
+
+            service = aioble.Service(bluetooth.UUID(_SERVICE_UUID))
+            characteristics = {
+                name: aioble.BufferedCharacteristic(service, bluetooth.UUID(uuid), max_len=20, write=True,
+                                                    capture=True, capture_depth=depth)
+                for name, uuid in _UUIDS.items()
+            }
+            aioble.register_services(service)
+
+            async def consume(name, ms):
+                while True:
+                    _, data = await characteristics[name].written()
+                    handled[name][struct.unpack("<I", data)[0]] = board.clock.monotonic()
+                    await uasyncio.sleep_ms(ms)
+
+            async def main():
+                connection = await aioble.advertise(100_000, name="bench")
+                consumers = [uasyncio.create_task(consume("slow", slow_ms)),
+                             uasyncio.create_task(consume("fast", 0))]
+                await connection.disconnected(timeout_ms=None)
+                for task in consumers:
+                    task.cancel()
+
+            uasyncio.run(main())
+
+        result = {}
+        for name, characteristic in characteristics.items():
+            delays = [(handled[name][seq] - sent) * 1000 for seq, sent in writer.sent[name].items()
+                      if seq in handled[name]]
+            result[name] = {
+                "sent": len(writer.sent[name]),
+                "handled": len(delays),
+                "overflows": characteristic.capture_overflows,
+                "delay_mean_ms": sum(delays) / len(delays) if delays else None,
+                "delay_max_ms": max(delays) if delays else None,
+            }
+        return result
+    finally:
+        board.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="aioble capture-mode write queues under interleaved writes")
+    parser.add_argument("--writes", type=int, default=200, help="writes in total, alternating characteristics")
+    parser.add_argument("--slow-ms", type=int, nargs="+", default=[100], help="slow handler time per write")
+    parser.add_argument("--depth", type=int, nargs="+", default=[4, 10], help="capture queue depth")
+    parser.add_argument("--interval", type=int, default=30, help="connection interval in ms")
+    args = parser.parse_args()
+
+    print(f"{'slow ms':>7} {'depth':>5} {'char':>4} {'sent':>5} {'handled':>7} {'dropped':>7} "
+          f"{'delay ms':>9} {'max ms':>8}")
+    for slow_ms in args.slow_ms:
+        for depth in args.depth:
+            r = run(args.writes, slow_ms, depth, LinkParams(conn_interval_ms=args.interval))
+            for name, c in r.items():
+                mean = f"{c['delay_mean_ms']:9.1f}" if c["delay_mean_ms"] is not None else f"{'-':>9}"
+                worst = f"{c['delay_max_ms']:8.1f}" if c["delay_max_ms"] is not None else f"{'-':>8}"
+                print(f"{slow_ms:7d} {depth:5d} {name:>4} {c['sent']:5d} {c['handled']:7d} "
+                      f"{c['overflows']:7d} {mean} {worst}")
+
+
+if __name__ == "__main__":
+    main()
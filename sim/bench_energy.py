@@ -0,0 +1,127 @@
+""" python -m sim.bench_energy: charge per day and battery life of a configuration
+
+Runs the firmware for a number of simulated days with a gateway in range
+according to a scenario (see sim.bench_adv) and charges the time spent
+in each phase with sim.energy's currents:
+
+    boot, active CPU, light and deep sleep, BME280 conversion, flash
+    writes, advertising airtime and connected radio time
+
+Every combination of the listed values is one configuration, so a sweep
+is a single command:
+
+    python3 -m sim.bench_energy --days 2 --period 60 600 --oversampling 1 16 \\
+        --adv-every 30 120 --adv-interval 0 1000 --capacity 2000 --out energy.json
+
+--adv-interval 0 is adv_policy's adaptive schedule, any other value a
+fixed interval in ms for the whole window; --adv-window caps the window
+in seconds and --adv-every is the advertising period in minutes. The
+report gives mAh per day per phase, and battery life for a cell of
+--capacity mAh (sim.energy.battery_life_days).
+"""
+import argparse
+import itertools
+import json
+import platform
+import time
+
+from sim import Board
+from sim import energy
+from sim.ble_link import BLELink, Gateway, LinkParams
+
+_SCENARIOS = {
+    "always": lambda epoch: True,
+    "daytime": lambda epoch: 8 <= (epoch % 86400) // 3600 < 18,
+    "absent": lambda epoch: False,
+}
+# BME280 oversampling (per channel) to its ctrl register code
+_OVERSAMPLING = {1: 1, 2: 2, 4: 3, 8: 4, 16: 5}
+_PHASES = ("boot", "active", "sleep", "conversion", "flash_write", "adv_airtime", "connected")
+
+
+def overrides(oversampling, adv_every, adv_interval, adv_window):
+    policy = {"_DEFAULT_WINDOW_MS": adv_window * 1000, "_MAX_WINDOW_MS": adv_window * 1000}
+    if adv_interval:
+        policy.update(_ADAPTIVE=False, _FIXED_INTERVAL_US=adv_interval * 1000)
+    return {
+        "sensor_drivers": {"_BME280_OVERSAMPLING": _OVERSAMPLING[oversampling]},
+        "rtc_manager": {"_DEEPSLEEP_DURATION_MS": adv_every * 60 * 1000},
+        "adv_policy": policy,
+    }
+
+
+def run(config, days, capacity, scan_duty, seed):
+    board = Board(overrides=overrides(config["oversampling"], config["adv_every_min"],
+                                      config["adv_interval_ms"], config["adv_window_s"]))
+    try:
+        board.provision(config["period_s"])
+        present = _SCENARIOS[config["scenario"]]
+        gateway = Gateway(present=lambda now: present(board.clock.epoch()))
+        link = BLELink(board, gateway, LinkParams(conn_interval_ms=config["conn_interval_ms"],
+                                                  scan_duty=scan_duty, seed=seed))
+        board.run_for(days * 86400)
+
+        per_day = energy.mah_per_day(board)
+        per_day["sleep"] = per_day.pop("lightsleep") + per_day.pop("deepsleep")
+        total = sum(per_day.values())
+        return dict(config, **{
+            "mah_per_day": round(total, 3),
+            "phases_mah_per_day": {phase: round(per_day[phase], 4) for phase in _PHASES},
+            "mean_current_ma": round(total / 24, 4),
+            "battery_days": round(energy.battery_life_days(total, capacity), 1),
+            "boots": board.boots,
+            "connections": len(link.sessions),
+            "records": board.logged_records(),
+        })
+    finally:
+        board.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Charge per day and battery life over a configuration sweep")
+    parser.add_argument("--days", type=float, default=1)
+    parser.add_argument("--period", type=int, nargs="+", default=[60, 600, 3600], help="log periods in seconds")
+    parser.add_argument("--oversampling", type=int, nargs="+", default=[8], choices=list(_OVERSAMPLING))
+    parser.add_argument("--adv-every", type=int, nargs="+", default=[30], help="advertising period in minutes")
+    parser.add_argument("--adv-interval", type=int, nargs="+", default=[0],
+                        help="fixed advertising interval in ms (0: adaptive schedule)")
+    parser.add_argument("--adv-window", type=int, nargs="+", default=[30], help="longest advertising window in seconds")
+    parser.add_argument("--conn-interval", type=float, nargs="+", default=[30], help="connection interval in ms")
+    parser.add_argument("--scenario", nargs="+", default=["daytime"], choices=list(_SCENARIOS))
+    parser.add_argument("--capacity", type=float, default=2000, help="battery capacity in mAh")
+    parser.add_argument("--scan-duty", type=float, default=0.3, help="fraction of advertising events the gateway hears")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    print(f"{'period':>6} {'osr':>3} {'adv min':>7} {'adv ms':>6} {'win s':>5} {'conn ms':>7} {'scenario':>8} "
+          f"{'mAh/day':>8} {'days':>6}  " + " ".join(f"{phase[:6]:>6}" for phase in _PHASES))
+    results = []
+    for values in itertools.product(args.period, args.oversampling, args.adv_every, args.adv_interval,
+                                    args.adv_window, args.conn_interval, args.scenario):
+        config = dict(zip(("period_s", "oversampling", "adv_every_min", "adv_interval_ms",
+                           "adv_window_s", "conn_interval_ms", "scenario"), values))
+        r = run(config, args.days, args.capacity, args.scan_duty, args.seed)
+        results.append(r)
+        adv = f"{r['adv_interval_ms']:6d}" if r["adv_interval_ms"] else f"{'adapt':>6}"
+        print(f"{r['period_s']:6d} {r['oversampling']:3d} {r['adv_every_min']:7d} {adv} {r['adv_window_s']:5d} "
+              f"{r['conn_interval_ms']:7g} {r['scenario']:>8} {r['mah_per_day']:8.3f} {r['battery_days']:6.0f}  "
+              + " ".join(f"{r['phases_mah_per_day'][phase]:6.3f}" for phase in _PHASES))
+
+    report = {
+        "benchmark": "energy",
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "days": args.days,
+        "capacity_mah": args.capacity,
+        "currents_ma": energy.CURRENT_MA,
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Report written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+""" python -m sim.bench_multi: one central at a time vs concurrent connections
+
+Runs the firmware for a number of simulated days with the gateway always
+in range and a maintenance phone (sim.ble_link.Maintenance) that turns up
+--visits times at random and stays in range until it has connected and
+read the diagnostics characteristic. Both compete for the wake-up
+advertising. With one connection at a time (_MAX_CONNECTIONS = 1) the
+one that loses waits for the next window; with concurrent connections
+the node keeps advertising while connected and serves both, each with
+its own export session:
+
+    python3 -m sim.bench_multi --days 2 --visits 12
+
+Reported are the gateway syncs (connections that received data) and the
+windows where the phone took the node instead, the phone's wait from
+arrival to its first diagnostics read, and the charge per day.
+"""
+import argparse
+import random
+
+from sim import Board
+from sim import energy
+from sim.ble_link import BLELink, Gateway, LinkParams, Maintenance
+
+_MODES = {
+    "single": {"aioble_manager": {"_MAX_CONNECTIONS": 1}},
+    "concurrent": {},
+}
+
+
+class Visitor(Maintenance):
+    """Maintenance phone in range from each arrival until it has been served."""
+
+    def __init__(self, arrivals, **kwargs):
+        super().__init__(present=self._present, **kwargs)
+        self.arrivals = sorted(arrivals)
+        self.served = []  # (arrival, first read) per visit
+
+    def _present(self, now):
+        return len(self.served) < len(self.arrivals) and self.arrivals[len(self.served)] <= now
+
+    async def run(self, link, conn):
+        await super().run(link, conn)
+        if conn.session.reads and self.present(conn.session.connected_at):
+            self.served.append((self.arrivals[len(self.served)], conn.session.reads[0][0]))
+
+
+def run(mode, days, period, visits, args):
+    rng = random.Random(args.seed)
+    board = Board(overrides=_MODES[mode])
+    try:
+        board.provision(period)
+        start = board.clock.monotonic()
+        phone = Visitor([start + rng.uniform(0, days * 86400) for _ in range(visits)], stay_s=args.stay)
+        gateway = Gateway(sync=True)
+        link = BLELink(board, [gateway, phone], LinkParams(scan_duty=args.scan_duty, seed=args.seed))
+        board.run_for(days * 86400)
+
+        syncs = [s for s in link.sessions if s.central is gateway and s.notifications]
+        # Phone connections the gateway got no connection alongside
+        taken = [s for s in link.sessions if s.central is phone
+                 and not any(g.central is gateway and g.connected_at <= (s.disconnected_at or g.connected_at)
+                             and (g.disconnected_at or s.connected_at) >= s.connected_at
+                             for g in link.sessions)]
+        waits = [read - arrival for arrival, read in phone.served]
+        return {
+            "syncs": len(syncs),
+            "lost_windows": len(taken),
+            "visits": len(phone.served),
+            "wait_mean_s": sum(waits) / len(waits) if waits else None,
+            "wait_max_s": max(waits) if waits else None,
+            "mah_per_day": sum(energy.mah_per_day(board).values()),
+        }
+    finally:
+        board.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="One central at a time vs concurrent connections")
+    parser.add_argument("--days", type=float, default=1)
+    parser.add_argument("--period", type=int, default=600, help="log period in seconds")
+    parser.add_argument("--visits", type=int, default=8, help="maintenance phone visits")
+    parser.add_argument("--stay", type=float, default=20.0, help="seconds the phone stays connected")
+    parser.add_argument("--scan-duty", type=float, default=0.3, help="fraction of advertising events a central hears")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'mode':>10} {'syncs':>5} {'lost':>4} {'visits':>6} {'wait s':>8} {'max s':>8} {'mAh/day':>8}")
+    for mode in _MODES:
+        r = run(mode, args.days, args.period, args.visits, args)
+        mean = f"{r['wait_mean_s']:8.1f}" if r["wait_mean_s"] is not None else f"{'-':>8}"
+        worst = f"{r['wait_max_s']:8.1f}" if r["wait_max_s"] is not None else f"{'-':>8}"
+        print(f"{mode:>10} {r['syncs']:5d} {r['lost_windows']:4d} {r['visits']:6d} {mean} {worst} "
+              f"{r['mah_per_day']:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+""" python -m sim.bench_resident: deep sleep vs resident light sleep per sample
+
+Short log periods keep the firmware resident in light sleep between
+samples (RTCManager.stays_resident) instead of rebooting from deep sleep.
+For each period this runs both modes for the same simulated time (no
+gateway in range, so the advertising windows cost the same in both) and
+reports per sample:
+
+    energy (sim.energy), and latency from the timer wake-up to the start
+    of the BME280 conversion (samples taken without a sleep before them,
+    e.g. right after an advertising window, are left out)
+
+    python3 -m sim.bench_resident --period 5 10 30 60 --hours 2
+"""
+import argparse
+import bisect
+
+from sim import Board
+from sim import energy
+
+_MODES = {
+    "deepsleep": {"rtc_manager": {"_RESIDENT_PERIOD_S": 0}},
+    "resident": {"rtc_manager": {"_RESIDENT_PERIOD_S": 3600}},
+}
+
+
+def run(mode, period, hours):
+    board = Board(overrides=_MODES[mode])
+    try:
+        board.provision(period)
+        board.run(int(hours * 3600 / period))
+        chip = next(iter(board.i2c_devices.values()))
+        latencies = []
+        previous = None
+        for started in chip.conversion_us:
+            n = bisect.bisect_right(board.wakes_us, started)
+            if n and n != previous:
+                latencies.append((started - board.wakes_us[n - 1]) / 1000)
+            previous = n
+        samples = len(chip.conversion_us)
+        seconds = board.clock.monotonic()
+        total_mj = energy.energy_mj(board)
+        return {
+            "samples": samples,
+            "boots": board.boots,
+            "energy_mj": total_mj / samples,
+            "latency_ms": sum(latencies) / len(latencies) if latencies else None,
+            "current_ma": total_mj / energy.VOLTAGE / seconds,
+        }
+    finally:
+        board.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare deep sleep and resident light sleep per sample")
+    parser.add_argument("--period", type=int, nargs="+", default=[5, 10, 30, 60], help="log periods in seconds")
+    parser.add_argument("--hours", type=float, default=2)
+    args = parser.parse_args()
+
+    print(f"{'period s':>8} {'mode':>10} {'samples':>7} {'boots':>5} {'mJ/sample':>10} "
+          f"{'latency ms':>10} {'mean mA':>8}")
+    for period in args.period:
+        for mode in _MODES:
+            r = run(mode, period, args.hours)
+            latency = f"{r['latency_ms']:10.1f}" if r["latency_ms"] is not None else f"{'-':>10}"
+            print(f"{period:8d} {mode:>10} {r['samples']:7d} {r['boots']:5d} {r['energy_mj']:10.2f} "
+                  f"{latency} {r['current_ma']:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
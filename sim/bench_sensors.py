@@ -0,0 +1,81 @@
+""" python -m sim.bench_sensors: sensor acquisition time with parallel and sequential conversions
+
+Runs the firmware with one or more BME280 probes (0x76, 0x77 on the same
+bus) next to the material sensor, once starting every conversion at once
+and waiting for the slowest (SensorLogger, _PARALLEL_CONVERSIONS) and
+once converting the probes one after another. For each it reports the
+acquisition time of a record (start of the first conversion to the last
+read, as diagnostics.sensor_ms has it), the awake time per sample and the
+charge per day (sim.energy):
+
+    python3 -m sim.bench_sensors --probes 1 2 --oversampling 1 16 --hours 2
+
+No gateway is in range, so the advertising windows cost the same in every
+configuration.
+"""
+import argparse
+
+from sim import Board
+from sim import energy
+from sim.bench_energy import _OVERSAMPLING
+from sim.bme280_chip import BME280Chip
+from sim.board import diurnal_environment
+
+_ADDRESSES = (0x76, 0x77)
+_MODES = {"parallel": True, "sequential": False}
+
+
+def sensors(probes):
+    bme280 = tuple((f"env{n}" if n else "env", "bme280", {"bus": 0, "address": address})
+                   for n, address in enumerate(_ADDRESSES[:probes]))
+    return bme280 + (("res", "material", {"pin": 25}),)
+
+
+def run(mode, probes, oversampling, period, hours):
+    acquisitions = []
+
+    def sensor_read(ms):
+        acquisitions.append(ms)
+
+    board = Board(overrides={
+        "sensor_drivers": {"SENSORS": sensors(probes), "_BME280_OVERSAMPLING": _OVERSAMPLING[oversampling]},
+        "sensor_logger": {"_PARALLEL_CONVERSIONS": _MODES[mode]},
+        "diagnostics": {"sensor_read": sensor_read},
+    })
+    try:
+        for address in _ADDRESSES[1:probes]:
+            board.i2c_devices[address] = BME280Chip(board.clock, diurnal_environment, board.account)
+        board.provision(period)
+        board.run_for(hours * 3600)
+        samples = len(acquisitions)
+        awake_ms = (board.time_in.get("awake", 0) - board.time_in.get("lightsleep", 0)) / 1000
+        return {
+            "samples": samples,
+            "acquisition_ms": sum(acquisitions) / samples if samples else None,
+            "awake_ms": awake_ms / samples if samples else None,
+            "mah_per_day": sum(energy.mah_per_day(board).values()),
+        }
+    finally:
+        board.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sensor acquisition time with parallel and sequential conversions")
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 2], choices=range(1, len(_ADDRESSES) + 1),
+                        help="BME280 probes on the bus")
+    parser.add_argument("--oversampling", type=int, nargs="+", default=[8], choices=list(_OVERSAMPLING))
+    parser.add_argument("--period", type=int, default=60, help="log period in seconds")
+    parser.add_argument("--hours", type=float, default=2)
+    args = parser.parse_args()
+
+    print(f"{'probes':>6} {'osrs':>4} {'mode':>10} {'samples':>7} {'acquire ms':>10} {'awake ms':>8} {'mAh/day':>8}")
+    for probes in args.probes:
+        for oversampling in args.oversampling:
+            for mode in _MODES:
+                r = run(mode, probes, oversampling, args.period, args.hours)
+                print(f"{probes:6d} {oversampling:4d} {mode:>10} {r['samples']:7d} "
+                      f"{r['acquisition_ms']:10.1f} {r['awake_ms']:8.1f} {r['mah_per_day']:8.3f}")
+
+
+if __name__ == "__main__":
+    main()
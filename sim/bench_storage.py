@@ -0,0 +1,284 @@
+""" python -m sim.bench_storage: scaling of the log storage on flash
+
+Appends a synthetic sensor log (test/sample_trace.py) of each size to
+every storage backend, running the firmware modules on the simulated
+board, and measures:
+
+    append latency (mean, p50, p99, max), peak heap of an append,
+    full read time and peak heap, indexed range read of the last day,
+    clear time, bytes on disk and flash write operations
+
+    python3 -m sim.bench_storage --sizes 1000 10000 100000 1000000 --out storage.json
+
+The report is JSON (one object per backend and size) so runs can be
+compared over time. Timings are host wall time and only meaningful
+relative to each other; heap peaks come from tracemalloc.
+"""
+import argparse
+import json
+import os
+import platform
+import struct
+import sys
+import time
+import tracemalloc
+
+from sim import Board
+from sim.board import FIRMWARE_DIR
+
+sys.path.insert(0, os.path.join(FIRMWARE_DIR, "test"))
+from sample_trace import make_trace  # noqa: E402
+
+_LOG_PERIOD = 60
+_HEAP_SAMPLE = 1000  # appends traced for the append heap peak, at most half the run
+_TS_BLOCK = 64
+
+
+# ------------------------- Backends -------------------------
+# Each backend stores [epoch, temperature, humidity, resistance] records
+# on the simulated flash; modules are imported inside Board.install().
+
+class CsvBackend:
+    """The firmware log: day/size segmented CSV with a sparse index (file_utils)."""
+
+    name = "csv"
+
+    def __init__(self):
+        import file_utils
+
+        self.file_utils = file_utils
+        file_utils.create_csv_file()
+
+    def append(self, record, epoch):
+        self.file_utils.append_csv_file(record, epoch)
+
+    def read_all(self):
+        return len(self.file_utils.read_csv_file())
+
+    def read_range(self, start_epoch, end_epoch):
+        return len(self.file_utils.read_range(start_epoch, end_epoch))
+
+    def clear(self):
+        self.file_utils.clear_csv_file()
+
+
+class SpoolBackend:
+    """Export frames pre-encoded at log time (payload_spool)."""
+
+    name = "spool"
+
+    def __init__(self):
+        import payload_spool
+
+        self.payload_spool = payload_spool
+
+    def append(self, record, epoch):
+        self.payload_spool.append(record)
+
+    def read_all(self):
+        view = memoryview(bytearray(512))
+        count = 0
+        for frame in self.payload_spool.frames(view):
+            count += len(json.loads(bytes(frame))["data"])
+        return count
+
+    def read_range(self, start_epoch, end_epoch):
+        return None
+
+    def clear(self):
+        self.payload_spool.reset()
+
+
+class TsCodecBackend:
+    """Candidate: ts_codec blocks of _TS_BLOCK records, length-prefixed in one
+    file, with the open block kept as CSV lines until it is full."""
+
+    name = "ts_codec"
+    _BLOCKS = "ts.bin"
+    _TAIL = "ts.tail"
+
+    def __init__(self):
+        import ts_codec
+        import uos
+
+        self.ts_codec = ts_codec
+        self.uos = uos
+
+    def append(self, record, epoch):
+        with open(self._TAIL, "a") as file:
+            file.write(",".join([str(epoch)] + [str(v) for v in record[1:]]) + "\n")
+        with open(self._TAIL) as file:
+            lines = file.read().split()
+        if len(lines) < _TS_BLOCK:
+            return
+        rows = []
+        for line in lines:
+            fields = line.split(",")
+            rows.append([int(fields[0])] + [self.ts_codec.to_fixed(v, s) for v, s in zip(fields[1:], self.ts_codec.SCALES)])
+        block = self.ts_codec.encode(rows)
+        with open(self._BLOCKS, "ab") as file:
+            file.write(struct.pack("<H", len(block)))
+            file.write(block)
+        self.uos.remove(self._TAIL)
+
+    def read_all(self):
+        count = 0
+        try:
+            with open(self._BLOCKS, "rb") as file:
+                while True:
+                    header = file.read(2)
+                    if len(header) < 2:
+                        break
+                    count += len(self.ts_codec.decode(file.read(struct.unpack("<H", header)[0])))
+        except OSError:
+            pass
+        try:
+            with open(self._TAIL) as file:
+                count += len(file.read().split())
+        except OSError:
+            pass
+        return count
+
+    def read_range(self, start_epoch, end_epoch):
+        return None
+
+    def clear(self):
+        for path in (self._BLOCKS, self._TAIL):
+            try:
+                self.uos.remove(path)
+            except OSError:
+                pass
+
+
+BACKENDS = {backend.name: backend for backend in (CsvBackend, SpoolBackend, TsCodecBackend)}
+
+
+# ------------------------- Measurement -------------------------
+
+def _records(count):
+    for row in make_trace(count, _LOG_PERIOD):
+        yield row, row[0]
+
+
+def _percentile(sorted_values, fraction):
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+def _disk_usage(root):
+    total = 0
+    for base, _, files in os.walk(root):
+        for name in files:
+            total += os.path.getsize(os.path.join(base, name))
+    return total
+
+
+def _traced(func):
+    tracemalloc.start()
+    try:
+        result = func()
+        return result, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench(backend_class, count):
+    board = Board(flash_timing=False)  # host wall time is what is measured here
+    try:
+        with board.install():
+            backend = backend_class()
+            records = list(_records(count))
+            sample = min(_HEAP_SAMPLE, count // 2)
+            timed, traced = records[:count - sample], records[count - sample:]
+
+            latencies = []
+            for record, epoch in timed:
+                start = time.perf_counter_ns()
+                backend.append(record, epoch)
+                latencies.append(time.perf_counter_ns() - start)
+
+            # The last appends run under tracemalloc for the heap peak only.
+            tracemalloc.start()
+            for record, epoch in traced:
+                tracemalloc.reset_peak()
+                backend.append(record, epoch)
+            append_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            bytes_on_disk = _disk_usage(board.fs.root)
+            flash_writes = board.fs.writes
+
+            start = time.perf_counter()
+            read_count = backend.read_all()
+            read_s = time.perf_counter() - start
+            _, read_peak = _traced(backend.read_all)
+
+            last_epoch = records[-1][1]
+            start = time.perf_counter()
+            range_count = backend.read_range(last_epoch - 86400, last_epoch)
+            range_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            backend.clear()
+            clear_s = time.perf_counter() - start
+
+        latencies.sort()
+        return {
+            "backend": backend_class.name,
+            "records": count,
+            "append_us": {
+                "mean": round(sum(latencies) / len(latencies) / 1000, 2) if latencies else None,
+                "p50": round(_percentile(latencies, 0.50) / 1000, 2) if latencies else None,
+                "p99": round(_percentile(latencies, 0.99) / 1000, 2) if latencies else None,
+                "max": round(latencies[-1] / 1000, 2) if latencies else None,
+            },
+            "append_peak_bytes": append_peak,
+            "read_s": round(read_s, 4),
+            "read_records": read_count,
+            "read_peak_bytes": read_peak,
+            "range_read_s": round(range_s, 4) if range_count is not None else None,
+            "range_records": range_count,
+            "clear_s": round(clear_s, 4),
+            "bytes_on_disk": bytes_on_disk,
+            "bytes_per_record": round(bytes_on_disk / count, 2),
+            "flash_writes": flash_writes,
+        }
+    finally:
+        board.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the log storage backends")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--backend", nargs="+", default=list(BACKENDS), choices=list(BACKENDS))
+    parser.add_argument("--out", help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    results = []
+    for count in args.sizes:
+        for name in args.backend:
+            result = bench(BACKENDS[name], count)
+            results.append(result)
+            append = result["append_us"]
+            mean = f"{append['mean']:8.1f}" if append["mean"] is not None else f"{'-':>8}"
+            p99 = f"{append['p99']:8.1f}" if append["p99"] is not None else f"{'-':>8}"
+            print(f"{name:9s} {count:8d}  append {mean} us (p99 {p99})  "
+                  f"read {result['read_s']:8.3f} s / {result['read_peak_bytes'] / 1024:9.1f} KiB  "
+                  f"disk {result['bytes_per_record']:6.1f} B/rec  writes {result['flash_writes']}")
+
+    report = {
+        "benchmark": "storage",
+        "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "log_period_s": _LOG_PERIOD,
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as file:
+            json.dump(report, file, indent=2)
+        print(f"Report written to {args.out}")
+    else:
+        print(json.dumps(report))
+
+
+if __name__ == "__main__":
+    main()
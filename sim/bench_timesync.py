@@ -0,0 +1,124 @@
+""" python -m sim.bench_timesync: clock error left after a BLE time sync
+
+The node runs with a drifting RTC and no gateway for a while, then one
+gateway session syncs the clock, once with the whole-second "time" list
+and once with the round-trip exchange (t1 ... t4, see
+BLEManager.time_sync). Reported is the RTC error right after the session,
+over several seeds per connection interval and packet loss:
+
+    python3 -m sim.bench_timesync --interval 7.5 30 100 --loss 0 0.1
+
+With --days, the node instead runs for that long with a round-trip sync
+whenever the gateway is around (08:00-18:00), with and without the drift
+compensation of RTCManager, and the logged timestamps are compared with
+the true time of each wake:
+
+    python3 -m sim.bench_timesync --days 4 --drift 40 200
+"""
+import argparse
+import os
+
+from sim import Board
+from sim.ble_link import BLELink, Gateway, LinkParams
+
+_METHODS = {"seconds": False, "round-trip": True}
+_COMPENSATION = {
+    "off": {"rtc_manager": {"_DRIFT_COMPENSATION": False}},
+    "on": {},
+}
+
+
+def run(sync, interval_ms, loss, seed, drift_ppm, hours, period):
+    board = Board(rtc_drift_ppm=drift_ppm)
+    try:
+        board.provision(period)
+        gateway = Gateway(present=lambda now: False, sync=sync)
+        link = BLELink(board, gateway, LinkParams(conn_interval_ms=interval_ms, loss=loss, seed=seed))
+        end = board.clock.monotonic() + hours * 3600
+        while board.clock.monotonic() < end:
+            board.boot()
+        before = board.rtc_epoch() - board.clock.epoch()
+
+        gateway.present = lambda now: True
+        while not link.sessions or link.sessions[-1].disconnected_at is None:
+            board.boot()
+        session = link.sessions[-1]
+        # Error at the end of the session, before drift adds to it again.
+        elapsed = board.clock.monotonic() - session.disconnected_at
+        after = board.rtc_epoch() - board.clock.epoch() - elapsed * drift_ppm / 1_000_000
+        return before, after
+    finally:
+        board.cleanup()
+
+
+def _last_record_epoch(board):
+    log_dir = board.path("log")
+    names = sorted(name for name in os.listdir(log_dir) if name.endswith(".csv")) if os.path.isdir(log_dir) else []
+    if not names:
+        return None
+    with open(os.path.join(log_dir, names[-1])) as file:
+        lines = file.read().split()
+    if len(lines) < 2:
+        return None
+    return int(lines[-1].split(",")[0])
+
+
+def run_days(compensation, drift_ppm, days, period, seed):
+    """Timestamp error (logged minus true wake time, s) of every record after
+    the first day, which the drift estimate needs to settle."""
+    board = Board(rtc_drift_ppm=drift_ppm, overrides=_COMPENSATION[compensation])
+    try:
+        board.provision(period)
+        gateway = Gateway(present=lambda now: 8 <= (board.clock.epoch() % 86400) // 3600 < 18, sync=True)
+        BLELink(board, gateway, LinkParams(seed=seed))
+        errors = []
+        last = None
+        end = board.clock.monotonic() + days * 86400
+        while board.clock.monotonic() < end:
+            woke = board.clock.epoch() + board.boot_ms / 1000
+            board.boot()
+            logged = _last_record_epoch(board)
+            if logged is not None and logged != last and board.clock.monotonic() > 86400:
+                errors.append(logged - woke)
+            last = logged
+        return errors
+    finally:
+        board.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the clock error after a BLE time sync")
+    parser.add_argument("--interval", type=float, nargs="+", default=[7.5, 30, 100],
+                        help="connection intervals in ms")
+    parser.add_argument("--loss", type=float, nargs="+", default=[0.0, 0.1])
+    parser.add_argument("--seeds", type=int, default=8)
+    parser.add_argument("--drift", type=float, nargs="+", default=[40], help="RTC drift in ppm")
+    parser.add_argument("--hours", type=float, default=12, help="time before the sync")
+    parser.add_argument("--period", type=int, default=600, help="log period in seconds")
+    parser.add_argument("--days", type=float, help="run for days with daytime syncs instead")
+    args = parser.parse_args()
+
+    if args.days:
+        print(f"{'drift ppm':>9} {'compensation':>12} {'records':>7} {'mean err s':>10} "
+              f"{'mean |err| s':>12} {'max |err| s':>11}")
+        for drift in args.drift:
+            for compensation in _COMPENSATION:
+                errors = run_days(compensation, drift, args.days, args.period, 1)
+                print(f"{drift:9.1f} {compensation:>12} {len(errors):7d} {sum(errors) / len(errors):10.2f} "
+                      f"{sum(abs(e) for e in errors) / len(errors):12.2f} {max(abs(e) for e in errors):11.2f}")
+        return
+
+    print(f"{'ival ms':>7} {'loss':>5} {'method':>10} {'before s':>9} {'mean |err| ms':>14} {'max |err| ms':>13}")
+    for interval in args.interval:
+        for loss in args.loss:
+            for method, sync in _METHODS.items():
+                results = [run(sync, interval, loss, seed, args.drift[0], args.hours, args.period)
+                           for seed in range(1, args.seeds + 1)]
+                errors = [abs(after) * 1000 for _, after in results]
+                before = sum(b for b, _ in results) / len(results)
+                print(f"{interval:7.1f} {loss:5.2f} {method:>10} {before:9.3f} "
+                      f"{sum(errors) / len(errors):14.1f} {max(errors):13.1f}")
+
+
+if __name__ == "__main__":
+    main()
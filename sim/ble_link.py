@@ -0,0 +1,448 @@
+""" sim/ble_link.py """
+# In-process BLE link between the simulated peripheral (the firmware's
+# bluetooth.BLE, through aioble) and a scripted central.
+#
+# The link runs on the board's virtual-time event loop:
+#   - discovery: the central hears each advertising event (interval plus
+#     the 0-10 ms advDelay) with probability scan_duty * (1 - loss)
+#   - connection events every conn_interval_ms carry up to
+#     packets_per_event link-layer packets in each direction; a lost
+#     packet is retransmitted in the next event
+#   - notifications are truncated to MTU - 3 and queue in a controller
+#     buffer of buffer_depth entries (gatts_notify raises ENOMEM when it
+#     is full, gatts_write(send_update=True) drops like NimBLE does)
+#   - MTU exchange, indications and disconnects complete one connection
+#     event after they are requested, and reach the firmware as IRQs
+#   - several centrals (a list of scripts) may be in range; each connects
+#     on its own, and an advertising event is only answered by centrals
+#     that are not connected already
+import asyncio
+import errno
+import json
+import math
+import random
+import time
+
+from sim.clock import EPOCH_2000
+
+_IRQ_CENTRAL_CONNECT = 1
+_IRQ_CENTRAL_DISCONNECT = 2
+_IRQ_GATTS_WRITE = 3
+_IRQ_GATTS_INDICATE_DONE = 20
+_IRQ_MTU_EXCHANGED = 21
+
+_ATT_HEADER = 3
+_L2CAP_HEADER = 4
+
+ENV_SETTING_UUID = "5f97247b-4474-424c-a826-f8ec299b6938"
+ENV_TEMP_UUID = "5f97247b-4474-424c-a826-f8ec299b6939"
+ENV_DIAG_UUID = "5f97247b-4474-424c-a826-f8ec299b693a"
+
+_FRAME_SYNC = 0x03  # time sync reply (ble_frames.sync_frame)
+_ADV_TYPE_MANUFACTURER = 0xFF
+
+
+def manufacturer_data(adv_data):
+    """Manufacturer specific data (after the company ID) of an advertising payload, or None."""
+    pos = 0
+    while pos + 1 < len(adv_data):
+        length, ad_type = adv_data[pos], adv_data[pos + 1]
+        if ad_type == _ADV_TYPE_MANUFACTURER:
+            return bytes(adv_data[pos + 4:pos + 1 + length])
+        pos += 1 + length
+    return None
+
+
+class LinkParams:
+    def __init__(self, conn_interval_ms=30, loss=0.0, buffer_depth=8, mtu=247,
+                 data_length=251, packets_per_event=6, scan_duty=1.0, seed=1):
+        self.conn_interval_ms = conn_interval_ms
+        self.loss = loss
+        self.buffer_depth = buffer_depth
+        self.mtu = mtu
+        self.data_length = data_length
+        self.packets_per_event = packets_per_event
+        self.scan_duty = scan_duty
+        self.seed = seed
+
+
+class Session:
+    """What the central saw during one connection (times in simulated seconds)."""
+
+    def __init__(self, advertising_since, connected_at, central=None):
+        self.advertising_since = advertising_since
+        self.connected_at = connected_at
+        self.central = central
+        self.trigger_at = None
+        self.first_notify_at = None
+        self.last_notify_at = None
+        self.disconnected_at = None
+        self.notifications = []
+        self.received_at = []  # arrival time of each notification
+        self.notify_bytes = 0
+        self.reads = []  # (time, value) of read requests
+
+    @property
+    def discovery_s(self):
+        return self.connected_at - self.advertising_since
+
+    @property
+    def time_to_first_byte_s(self):
+        if self.first_notify_at is None:
+            return None
+        return self.first_notify_at - self.connected_at
+
+    @property
+    def trigger_to_first_byte_s(self):
+        if self.first_notify_at is None or self.trigger_at is None:
+            return None
+        return self.first_notify_at - self.trigger_at
+
+    @property
+    def duration_s(self):
+        return (self.disconnected_at or self.connected_at) - self.connected_at
+
+    @property
+    def throughput_bps(self):
+        if self.first_notify_at is None or self.last_notify_at == self.first_notify_at:
+            return 0.0
+        return self.notify_bytes / (self.last_notify_at - self.connected_at)
+
+
+class _Packet:
+    def __init__(self, fragments, deliver):
+        self.fragments = fragments
+        self.deliver = deliver
+
+
+class _Connection:
+    def __init__(self, handle, mtu):
+        self.handle = handle
+        self.mtu = mtu
+        self.open = True
+        self.to_central = []
+        self.to_peripheral = []
+        self.subscribed = set()
+        self.notify_queued = 0
+        self.session = None
+        self.central = None
+        self.tasks = []
+
+
+class Gateway:
+    """Central script: connect, exchange MTU, discover, subscribe, trigger the
+    export and disconnect once notifications stop."""
+
+    def __init__(self, present=lambda now: True, discovery_events=6, idle_timeout_s=3.0,
+                 trigger=None, sync=False):
+        self.present = present
+        self.discovery_events = discovery_events
+        self.idle_timeout_s = idle_timeout_s
+        # Extra fields for the trigger write, e.g. {"compress": ["deflate"]}.
+        self.trigger = trigger or {}
+        # Round-trip time sync (t1 ... t4) instead of the whole-second "time" only.
+        self.sync = sync
+
+    def trigger_payload(self, link):
+        t = time.gmtime(int(link.board.clock.epoch()) + EPOCH_2000)
+        payload = {"time": [t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec]}
+        if self.sync:
+            payload["t1"] = round(link.board.clock.epoch() * 1000)
+        payload.update(self.trigger)
+        return json.dumps(payload).encode()
+
+    async def finish_sync(self, link, conn):
+        """Answer the sync reply with its arrival time t4 on the settings characteristic."""
+        session = conn.session
+        checked = 0
+        while conn.open:
+            for n in range(checked, len(session.notifications)):
+                if session.notifications[n][:1] == bytes([_FRAME_SYNC]):
+                    t4 = round((link.board.clock.start_epoch + session.received_at[n]) * 1000)
+                    await link.central_write(conn, ENV_SETTING_UUID, json.dumps({"sync": t4}).encode())
+                    return
+            checked = len(session.notifications)
+            await link.connection_events()
+
+    async def run(self, link, conn):
+        await link.central_exchange_mtu(conn)
+        await link.connection_events(self.discovery_events)
+        link.central_subscribe(conn, ENV_TEMP_UUID)
+        conn.session.trigger_at = link.now()
+        await link.central_write(conn, ENV_TEMP_UUID, self.trigger_payload(link))
+        if self.sync:
+            await self.finish_sync(link, conn)
+        idle_since = link.now()
+        while conn.open:
+            last = conn.session.last_notify_at or idle_since
+            if link.now() - last >= self.idle_timeout_s:
+                break
+            await asyncio.sleep(0.1)
+        await link.central_disconnect(conn)
+
+
+class Registrar(Gateway):
+    """Central script that registers the node through the settings characteristic."""
+
+    def __init__(self, period, **kwargs):
+        super().__init__(**kwargs)
+        self.period = period
+
+    async def run(self, link, conn):
+        await link.central_exchange_mtu(conn)
+        await link.connection_events(self.discovery_events)
+        payload = json.loads(self.trigger_payload(link))
+        payload["period"] = self.period
+        await link.central_write(conn, ENV_SETTING_UUID, json.dumps(payload).encode())
+        await link.connection_events(2)
+        await link.central_disconnect(conn)
+
+
+class Maintenance(Gateway):
+    """Central script of a maintenance phone: read the diagnostics
+    characteristic every read_interval_s for stay_s, then disconnect."""
+
+    def __init__(self, stay_s=20.0, read_interval_s=2.0, **kwargs):
+        super().__init__(**kwargs)
+        self.stay_s = stay_s
+        self.read_interval_s = read_interval_s
+
+    async def run(self, link, conn):
+        await link.central_exchange_mtu(conn)
+        await link.connection_events(self.discovery_events)
+        until = link.now() + self.stay_s
+        while conn.open and link.now() < until:
+            value = await link.central_read(conn, ENV_DIAG_UUID)
+            conn.session.reads.append((link.now(), value))
+            await asyncio.sleep(self.read_interval_s)
+        await link.central_disconnect(conn)
+
+
+class BLELink:
+    def __init__(self, board, central=None, params=None):
+        self.board = board
+        # One central script, or a list of them
+        self.centrals = list(central) if isinstance(central, (list, tuple)) else [central or Gateway()]
+        self.central = self.centrals[0]
+        self.params = params or LinkParams()
+        self.rng = random.Random(self.params.seed)
+        self.sessions = []
+        # (time, manufacturer data) of every advertisement the central heard
+        # and connected to; passive scanning sees the advertising data only.
+        self.heard = []
+        self.lost_packets = 0
+        self.dropped_notifications = 0
+        self._next_handle = 0
+        board.link = self
+        self.reset()
+
+    # ------------------------- helpers -------------------------
+    def now(self):
+        return self.board.clock.monotonic()
+
+    @property
+    def interval_s(self):
+        return self.params.conn_interval_ms / 1000
+
+    async def connection_events(self, count=1):
+        await asyncio.sleep(count * self.interval_s)
+
+    def _uuid_handle(self, uuid):
+        from sim.bluetooth import UUID
+
+        uuid = UUID(uuid)
+        for handle, attribute in self._ble.attributes.items():
+            if attribute.uuid == uuid:
+                return handle
+        raise KeyError(uuid)
+
+    def _irq(self, event, data):
+        return self._ble._irq_dispatch(event, data)
+
+    def reset(self):
+        """Peripheral reset: any connection is gone and nothing is advertising."""
+        for conn in getattr(self, "_connections", {}).values():
+            self._close(conn)
+        self._connections = {}
+        self._ble = None
+        self._advertising_since = None
+        self._discovery = None
+
+    def _close(self, conn):
+        if conn.open:
+            conn.open = False
+            if not any(other.open for other in self._connections.values()):
+                self.board.radio_stop("connected")
+            if conn.session:
+                conn.session.disconnected_at = self.now()
+            # A reset closes connections after boot.py's event loop has stopped.
+            current = asyncio.current_task() if asyncio._get_running_loop() else None
+            for task in conn.tasks:
+                if task is not current:
+                    task.cancel()
+
+    # ------------------------- hooks from bluetooth.BLE -------------------------
+    def advertising_started(self, ble):
+        self._ble = ble
+        self._advertising_since = self.now()
+        self._discovery = asyncio.get_running_loop().create_task(self._discover(ble))
+
+    def advertising_stopped(self, ble):
+        if self._discovery and self._discovery is not asyncio.current_task():
+            self._discovery.cancel()
+        self._discovery = None
+
+    def notify_all(self, value_handle, data):
+        for conn in self._connections.values():
+            if value_handle in conn.subscribed:
+                try:
+                    self.notify(conn.handle, value_handle, data)
+                except OSError:
+                    self.dropped_notifications += 1
+
+    def notify(self, conn_handle, value_handle, data, indicate=False):
+        conn = self._connections.get(conn_handle)
+        if conn is None or not conn.open:
+            raise OSError(errno.ENOTCONN)
+        if conn.notify_queued >= self.params.buffer_depth:
+            raise OSError(errno.ENOMEM)
+        data = data[:conn.mtu - _ATT_HEADER]
+        size = len(data) + _ATT_HEADER + _L2CAP_HEADER
+        conn.notify_queued += 1
+
+        def deliver():
+            conn.notify_queued -= 1
+            self._central_received(conn, data)
+            if indicate:
+                self._irq(_IRQ_GATTS_INDICATE_DONE, (conn.handle, value_handle, 0))
+
+        conn.to_central.append(_Packet(math.ceil(size / self.params.data_length), deliver))
+
+    def exchange_mtu(self, conn_handle):
+        conn = self._connections.get(conn_handle)
+        if conn:
+            asyncio.get_running_loop().create_task(self.central_exchange_mtu(conn))
+
+    def disconnect(self, conn_handle):
+        conn = self._connections.get(conn_handle)
+        if conn is None:
+            return False
+        asyncio.get_running_loop().create_task(self._disconnect(conn))
+        return True
+
+    # ------------------------- link layer -------------------------
+    async def _discover(self, ble):
+        interval_s = ble.advertising[0] / 1_000_000
+        hear = self.params.scan_duty * (1 - self.params.loss)
+        central = None
+        while central is None:
+            await asyncio.sleep(interval_s + self.rng.uniform(0, 0.010))
+            connected = [conn.central for conn in self._connections.values() if conn.open]
+            for candidate in self.centrals:
+                if (candidate not in connected and candidate.present(self.now())
+                        and self.rng.random() < hear):
+                    central = candidate
+                    break
+        self.heard.append((self.now(), manufacturer_data(ble.advertising[1])))
+        # CONNECT_IND, then the first connection event.
+        await self.connection_events()
+        self._discovery = None
+        ble._stop_advertising()
+
+        self._next_handle += 1
+        conn = _Connection(self._next_handle, 23)
+        conn.central = central
+        conn.session = Session(self._advertising_since, self.now(), central)
+        self.sessions.append(conn.session)
+        self._connections[conn.handle] = conn
+        self.board.radio_start("connected")
+        self._irq(_IRQ_CENTRAL_CONNECT, (conn.handle, 0, b"\xc0\xde\x00\x00\x00\x01"))
+
+        loop = asyncio.get_running_loop()
+        conn.tasks = [loop.create_task(self._events(conn)), loop.create_task(self._central(conn))]
+
+    async def _central(self, conn):
+        try:
+            await conn.central.run(self, conn)
+        except asyncio.CancelledError:
+            pass
+
+    async def _events(self, conn):
+        """Connection events: move packets in both directions, retransmitting lost ones."""
+        while conn.open:
+            await self.connection_events()
+            budget = self.params.packets_per_event
+            for queue in (conn.to_peripheral, conn.to_central):
+                while queue and budget:
+                    packet = queue[0]
+                    while packet.fragments and budget:
+                        budget -= 1
+                        if self.rng.random() < self.params.loss:
+                            self.lost_packets += 1
+                            budget = 0
+                            break
+                        packet.fragments -= 1
+                    if packet.fragments:
+                        break
+                    queue.pop(0)
+                    packet.deliver()
+
+    async def _disconnect(self, conn):
+        await self.connection_events()
+        if conn.open:
+            self._close(conn)
+            del self._connections[conn.handle]
+            self._irq(_IRQ_CENTRAL_DISCONNECT, (conn.handle, 0, b"\xc0\xde\x00\x00\x00\x01"))
+
+    def _central_received(self, conn, data):
+        session = conn.session
+        now = self.now()
+        if session.first_notify_at is None:
+            session.first_notify_at = now
+        session.last_notify_at = now
+        session.notifications.append(data)
+        session.received_at.append(now)
+        session.notify_bytes += len(data)
+
+    # ------------------------- central side -------------------------
+    async def central_exchange_mtu(self, conn):
+        await self.connection_events()
+        if conn.open:
+            conn.mtu = min(self.params.mtu, self._ble.config("mtu"))
+            self._irq(_IRQ_MTU_EXCHANGED, (conn.handle, conn.mtu))
+
+    def central_subscribe(self, conn, uuid):
+        conn.subscribed.add(self._uuid_handle(uuid))
+
+    async def central_write(self, conn, uuid, data):
+        """Write with response: returns once the peripheral has the value.
+        Values longer than MTU - 3 go out as a long (prepared) write."""
+        handle = self._uuid_handle(uuid)
+        done = asyncio.get_running_loop().create_future()
+        data = bytes(data)
+
+        def deliver():
+            attribute = self._ble.attributes[handle]
+            attribute.value = data[:attribute.max_len]
+            self._irq(_IRQ_GATTS_WRITE, (conn.handle, handle))
+            if not done.done():
+                done.set_result(None)
+
+        writes = math.ceil(len(data) / (conn.mtu - _ATT_HEADER)) or 1
+        conn.to_peripheral.append(_Packet(writes, deliver))
+        await done
+
+    async def central_read(self, conn, uuid):
+        """Read request: the value in the GATT database one event later."""
+        handle = self._uuid_handle(uuid)
+        done = asyncio.get_running_loop().create_future()
+
+        def deliver():
+            if not done.done():
+                done.set_result(self._ble.attributes[handle].value)
+
+        conn.to_peripheral.append(_Packet(1, deliver))
+        return await done
+
+    async def central_disconnect(self, conn):
+        await self._disconnect(conn)
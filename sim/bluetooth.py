@@ -0,0 +1,172 @@
+""" sim/bluetooth.py """
+# MicroPython `bluetooth` module: a local GATT database and an advertiser.
+# Without a link simulator on the board (sim.ble_link) nobody listens;
+# with one, radio traffic and IRQs are forwarded to it.
+import errno
+import uuid as _uuid
+
+_board = None  # set by Board.install()
+
+# Radio time per advertising event: ADV_IND on three channels plus the
+# receive windows for scan and connect requests.
+_ADV_EVENT_AIRTIME_US = 1_500
+_ADV_DELAY_MEAN_US = 5_000
+
+FLAG_READ = 0x0002
+FLAG_WRITE_NO_RESPONSE = 0x0004
+FLAG_WRITE = 0x0008
+FLAG_NOTIFY = 0x0010
+FLAG_INDICATE = 0x0020
+
+
+class UUID:
+    def __init__(self, value):
+        if isinstance(value, UUID):
+            self._bytes = value._bytes
+        elif isinstance(value, int):
+            self._bytes = value.to_bytes(2, "little")
+        elif isinstance(value, (bytes, bytearray)):
+            self._bytes = bytes(value)
+        else:
+            self._bytes = _uuid.UUID(value).bytes[::-1]
+
+    def __bytes__(self):
+        return self._bytes
+
+    def __len__(self):
+        return len(self._bytes)
+
+    def __eq__(self, other):
+        return isinstance(other, UUID) and self._bytes == other._bytes
+
+    def __hash__(self):
+        return hash(self._bytes)
+
+    def __repr__(self):
+        if len(self._bytes) == 2:
+            return f"UUID(0x{int.from_bytes(self._bytes, 'little'):04x})"
+        return f"UUID('{_uuid.UUID(bytes=self._bytes[::-1])}')"
+
+
+class _Attribute:
+    def __init__(self, uuid, flags):
+        self.uuid = uuid
+        self.flags = flags
+        self.value = b""
+        self.max_len = 20
+        self.append = False
+
+
+class BLE:
+    def __init__(self):
+        self._active = False
+        self._irq = None
+        self._config = {"mtu": 256, "gap_name": b"MPY ESP32", "mac": (0, b"\x24\x0a\xc4\x00\x00\x01")}
+        self.attributes = {}
+        self.advertising = None
+        self._advertising_since = None
+        _board.ble = self
+
+    # ------------------------- controller -------------------------
+    def active(self, flag=None):
+        if flag is None:
+            return self._active
+        self._active = bool(flag)
+        if not flag:
+            self._stop_advertising()
+
+    def config(self, *args, **kwargs):
+        if args:
+            return self._config[args[0]]
+        self._config.update(kwargs)
+
+    def irq(self, handler):
+        self._irq = handler
+
+    # ------------------------- GAP -------------------------
+    def gap_advertise(self, interval_us, adv_data=None, resp_data=None, connectable=True):
+        if interval_us is None or interval_us == 0:
+            self._stop_advertising()
+            return
+        self._stop_advertising()
+        self.advertising = (interval_us, bytes(adv_data or b""), bytes(resp_data or b""), connectable)
+        self._advertising_since = _board.clock.us
+        _board.radio_start("advertising")
+        if _board.link:
+            _board.link.advertising_started(self)
+
+    def _stop_advertising(self):
+        if self.advertising is not None:
+            elapsed = _board.clock.us - self._advertising_since
+            events = elapsed // (self.advertising[0] + _ADV_DELAY_MEAN_US) + 1
+            _board.account("adv_airtime", events * _ADV_EVENT_AIRTIME_US)
+            self.advertising = None
+            _board.radio_stop("advertising")
+            if _board.link:
+                _board.link.advertising_stopped(self)
+
+    def gap_disconnect(self, conn_handle):
+        if _board.link:
+            return _board.link.disconnect(conn_handle)
+        return False
+
+    # ------------------------- GATT server -------------------------
+    def gatts_register_services(self, services):
+        self.attributes = {}
+        handle = 1
+        result = []
+        for service_uuid, characteristics in services:
+            handle += 1  # service declaration
+            handles = []
+            for characteristic in characteristics:
+                uuid, flags = characteristic[0], characteristic[1]
+                handle += 1  # characteristic declaration
+                self.attributes[handle] = _Attribute(uuid, flags)
+                handles.append(handle)
+                handle += 1
+                descriptors = characteristic[2] if len(characteristic) > 2 else ()
+                if flags & (FLAG_NOTIFY | FLAG_INDICATE):
+                    handle += 1  # CCCD
+                for descriptor_uuid, descriptor_flags in descriptors:
+                    self.attributes[handle] = _Attribute(descriptor_uuid, descriptor_flags)
+                    handles.append(handle)
+                    handle += 1
+            result.append(tuple(handles))
+        return tuple(result)
+
+    def gatts_read(self, value_handle):
+        return self.attributes[value_handle].value
+
+    def gatts_write(self, value_handle, data, send_update=False):
+        attribute = self.attributes[value_handle]
+        attribute.value = bytes(data)
+        if send_update and _board.link:
+            _board.link.notify_all(value_handle, attribute.value)
+
+    def gatts_set_buffer(self, value_handle, length, append=False):
+        attribute = self.attributes[value_handle]
+        attribute.max_len = length
+        attribute.append = append
+
+    def gatts_notify(self, conn_handle, value_handle, data=None):
+        if not _board.link:
+            raise OSError(errno.ENOTCONN)
+        if data is None:
+            data = self.attributes[value_handle].value
+        _board.link.notify(conn_handle, value_handle, bytes(data))
+
+    def gatts_indicate(self, conn_handle, value_handle, data=None):
+        if not _board.link:
+            raise OSError(errno.ENOTCONN)
+        if data is None:
+            data = self.attributes[value_handle].value
+        _board.link.notify(conn_handle, value_handle, bytes(data), indicate=True)
+
+    def gattc_exchange_mtu(self, conn_handle):
+        if not _board.link:
+            raise OSError(errno.ENOTCONN)
+        _board.link.exchange_mtu(conn_handle)
+
+    def _irq_dispatch(self, event, data):
+        if self._irq:
+            return self._irq(event, data)
@@ -0,0 +1,136 @@
+""" sim/bme280_chip.py """
+# Register-level BME280 emulator for the simulated I2C bus.
+#
+# Calibration registers hold datasheet-typical trimming values. A forced
+# conversion takes the datasheet maximum measurement time for the
+# configured oversampling, reports "measuring" in the status register
+# until then, and latches raw ADC values that the driver's integer
+# compensation turns back into the environment's temperature, pressure
+# and humidity.
+import struct
+
+_REG_CALIB_00 = 0x88
+_REG_CHIP_ID = 0xD0
+_REG_CALIB_26 = 0xE1
+_REG_CTRL_HUM = 0xF2
+_REG_STATUS = 0xF3
+_REG_CTRL_MEAS = 0xF4
+_REG_DATA = 0xF7
+
+_CHIP_ID = 0x60
+_STATUS_MEASURING = 0x08
+_OVERSAMPLING = (0, 1, 2, 4, 8, 16, 16, 16)
+
+T_CAL = (27504, 26435, -1000)
+P_CAL = (36477, -10685, 3024, 2855, 140, -7, 15500, -14600, 6000)
+H_CAL = (75, 362, 0, 313, 50, 30)
+
+
+def measurement_ms(osrs_t, osrs_p, osrs_h):
+    """Datasheet maximum measurement time for oversampling register settings."""
+    t, p, h = _OVERSAMPLING[osrs_t], _OVERSAMPLING[osrs_p], _OVERSAMPLING[osrs_h]
+    return 1.25 + 2.3 * t + (2.3 * p + 0.575 if p else 0) + (2.3 * h + 0.575 if h else 0)
+
+
+def _t_fine(raw_t):
+    t1, t2, t3 = T_CAL
+    var1 = (((raw_t // 8) - (t1 * 2)) * t2) // 2048
+    var2 = (raw_t // 16) - t1
+    var2 = (((var2 * var2) // 4096) * t3) // 16384
+    return var1 + var2
+
+
+def _pressure(raw_p, t_fine):
+    p1, p2, p3, p4, p5, p6, p7, p8, p9 = P_CAL
+    var1 = t_fine - 128000
+    var2 = var1 * var1 * p6
+    var2 = var2 + ((var1 * p5) << 17)
+    var2 = var2 + (p4 << 35)
+    var1 = (((var1 * var1 * p3) >> 8) + ((var1 * p2) << 12))
+    var1 = (((1 << 47) + var1) * p1) >> 33
+    if var1 == 0:
+        return 0
+    p = ((((1048576 - raw_p) << 31) - var2) * 3125) // var1
+    var1 = (p9 * (p >> 13) * (p >> 13)) >> 25
+    var2 = (p8 * p) >> 19
+    return ((p + var1 + var2) >> 8) + (p7 << 4)
+
+
+def _humidity(raw_h, t_fine):
+    h1, h2, h3, h4, h5, h6 = H_CAL
+    h = t_fine - 76800
+    h = (((((raw_h << 14) - (h4 << 20) - (h5 * h)) + 16384) >> 15) *
+         (((((((h * h6) >> 10) * (((h * h3) >> 11) + 32768)) >> 10) + 2097152) *
+           h2 + 8192) >> 14))
+    h = h - (((((h >> 15) * (h >> 15)) >> 7) * h1) >> 4)
+    h = min(max(h, 0), 419430400)
+    return h >> 12
+
+
+def _search(fn, target, lo, hi, increasing=True):
+    """Smallest raw value in [lo, hi] whose compensated value reaches target."""
+    while lo < hi:
+        mid = (lo + hi) // 2
+        value = fn(mid)
+        if (value < target) if increasing else (value > target):
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class BME280Chip:
+    def __init__(self, clock, environment, account=None):
+        self._clock = clock
+        # account(state, us), e.g. Board.account: charges conversion time.
+        self._account = account
+        # environment(epoch) -> (temperature C, humidity %RH, pressure Pa)
+        self._environment = environment
+        self.regs = bytearray(256)
+        self.regs[_REG_CHIP_ID] = _CHIP_ID
+        calib = struct.pack("<HhhHhhhhhhhh", *(T_CAL + P_CAL)) + b"\x00" + bytes([H_CAL[0]])
+        self.regs[_REG_CALIB_00:_REG_CALIB_00 + 26] = calib
+        h4, h5 = H_CAL[3], H_CAL[4]
+        self.regs[_REG_CALIB_26:_REG_CALIB_26 + 7] = struct.pack(
+            "<hBbBbb", H_CAL[1], H_CAL[2], h4 >> 4, (h4 & 0xF) | ((h5 & 0xF) << 4), h5 >> 4, H_CAL[5])
+        self._busy_until_us = 0
+        self.conversions = 0
+        self.conversion_us = []  # virtual time each forced conversion started
+
+    # ------------------------- I2C register access -------------------------
+    def read(self, reg, n):
+        if reg <= _REG_STATUS < reg + n:
+            busy = self._clock.us < self._busy_until_us
+            self.regs[_REG_STATUS] = _STATUS_MEASURING if busy else 0
+        return bytes(self.regs[reg:reg + n])
+
+    def write(self, reg, data):
+        self.regs[reg:reg + len(data)] = data
+        if reg <= _REG_CTRL_MEAS < reg + len(data) and self.regs[_REG_CTRL_MEAS] & 0x03 == 0x01:
+            self._start_conversion()
+
+    # ------------------------- conversion -------------------------
+    def _start_conversion(self):
+        ctrl = self.regs[_REG_CTRL_MEAS]
+        osrs_t, osrs_p, osrs_h = ctrl >> 5, (ctrl >> 2) & 0x7, self.regs[_REG_CTRL_HUM] & 0x7
+        busy_us = int(measurement_ms(osrs_t, osrs_p, osrs_h) * 1000)
+        self._busy_until_us = self._clock.us + busy_us
+        if self._account:
+            self._account("conversion", busy_us)
+        self.conversions += 1
+        self.conversion_us.append(self._clock.us)
+
+        temp, hum, press = self._environment(self._clock.epoch())
+        raw_t = _search(lambda r: (_t_fine(r) * 5 + 128) // 256, round(temp * 100), 0, (1 << 20) - 1)
+        t_fine = _t_fine(raw_t)
+        raw_p = _search(lambda r: _pressure(r, t_fine), round(press * 256), 0, (1 << 20) - 1,
+                        increasing=False)
+        raw_h = _search(lambda r: _humidity(r, t_fine), round(hum * 1024), 0, 0xFFFF)
+
+        self.regs[_REG_DATA:_REG_DATA + 8] = bytes((
+            raw_p >> 12, (raw_p >> 4) & 0xFF, (raw_p & 0xF) << 4,
+            raw_t >> 12, (raw_t >> 4) & 0xFF, (raw_t & 0xF) << 4,
+            raw_h >> 8, raw_h & 0xFF,
+        ))
+        # Back to sleep mode once the forced measurement is taken.
+        self.regs[_REG_CTRL_MEAS] &= ~0x03
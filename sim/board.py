@@ -0,0 +1,352 @@
+""" sim/board.py """
+# A simulated ESP32 node that runs the real firmware from this repository.
+#
+# Board.boot() executes boot.py from reset until it calls deepsleep(),
+# with machine, time, uos, uasyncio, bluetooth and friends replaced by
+# the modules in this package. RTC memory, the RTC itself and the flash
+# directory survive between boots; every firmware module is imported
+# again on each boot, exactly like a wake from deep sleep. Firmware that
+# stays resident in light sleep is stopped by Board.run() once its wakes
+# are used up (machine.PowerOff). An expired machine.WDT resets the board
+# (machine.WatchdogReset), which boots again straight away.
+import builtins
+import contextlib
+import importlib
+import io
+import math
+import os
+import shutil
+import sys
+import tempfile
+import time as host_time
+
+from sim import bluetooth, machine, mpy_time, stubs, uasyncio, uos
+from sim.bme280_chip import BME280Chip
+from sim.clock import EPOCH_2000, SimClock
+
+FIRMWARE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_BME280_ADDR = 0x76
+_FLASH_SIZE = 2 * 1024 * 1024
+
+
+def diurnal_environment(epoch):
+    """Temperature (C), humidity (%RH) and pressure (Pa) over a simulated day."""
+    day = 2 * math.pi * (epoch % 86400) / 86400
+    return 22.0 + 3.0 * math.sin(day), 45.0 - 8.0 * math.sin(day), 101325.0
+
+
+def material_adc(pin, epoch):
+    """Raw 12-bit ADC reading of the material probe, drifting slowly."""
+    return 1800 + int(epoch // 3600) % 50
+
+
+class SimFilesystem:
+    def __init__(self, root=None, size=_FLASH_SIZE):
+        self.root = root or tempfile.mkdtemp(prefix="esp32-sim-")
+        self.cwd = ""
+        self.size = size
+        self.writes = 0
+
+
+class CycleResult:
+    def __init__(self, awake_ms, sleep_ms):
+        self.awake_ms = awake_ms
+        self.sleep_ms = sleep_ms
+
+
+class Board:
+    def __init__(self, start=(2025, 3, 1, 0, 0, 0), root=None, boot_ms=300,
+                 rtc_drift_ppm=0, environment=diurnal_environment, adc=material_adc,
+                 overrides=None, flash_timing=True, cpu_scale=0, verbose=False):
+        self.clock = SimClock(start)
+        self.fs = SimFilesystem(root)
+        # Let file operations take virtual time (see uos._TimedFile).
+        self.flash_timing = flash_timing
+        # Host CPU time spent running firmware, times cpu_scale, passes on the
+        # virtual clock too (0: firmware code runs in zero virtual time). A
+        # MicroPython ESP32 at 80 MHz is very roughly 100x slower than CPython.
+        self.cpu_scale = cpu_scale
+        self._cpu_mark = 0.0
+        self.boot_ms = boot_ms
+        self.verbose = verbose
+        # Firmware constants to change, e.g. {"adv_policy": {"_ADAPTIVE": False}}.
+        self.overrides = overrides or {}
+
+        # RTC: starts at 2000-01-01 on power-on, and runs rtc_drift_ppm fast.
+        self.rtc_drift_ppm = rtc_drift_ppm
+        self._rtc_base = 0.0
+        self._rtc_base_us = 0
+        self.rtc_memory = b""
+
+        self.cpu_freq = 240_000_000
+        self.reset_cause = machine.PWRON_RESET
+        self.boot_us = 0
+        self.boots = 0
+        self.adc_reads = 0
+        self.rtc_reads = 0
+
+        self.i2c_devices = {_BME280_ADDR: BME280Chip(self.clock, environment, self.account)}
+        self._adc = adc
+        self.ble = None
+        self.link = None  # sim.ble_link.BLELink, if a central is simulated
+
+        # Accumulated virtual time per state, in microseconds.
+        self.time_in = {}
+        self._radio_since = {}
+        # Virtual time at the end of every deep or light sleep, and how many
+        # more wakes (or until when) the current run allows (None: no limit).
+        self.wakes_us = []
+        self.wake_budget = None
+        self.run_until_us = None
+        # machine.WDT: virtual time it expires at (None: not started this boot).
+        self.wdt_deadline_us = None
+        self._wdt_timeout_us = 0
+        self.watchdog_resets = 0
+
+        self._boot_code = compile(_read(os.path.join(FIRMWARE_DIR, "boot.py")), "boot.py", "exec")
+
+    # ------------------------- hardware state -------------------------
+    def rtc_epoch(self):
+        elapsed = (self.clock.us - self._rtc_base_us) / 1_000_000
+        return self._rtc_base + elapsed * (1 + self.rtc_drift_ppm / 1_000_000)
+
+    def rtc_datetime(self):
+        self.charge_cpu()
+        self.rtc_reads += 1
+        epoch = self.rtc_epoch()
+        t = host_time.gmtime(int(epoch) + EPOCH_2000)
+        subsec = int((epoch - int(epoch)) * 1_000_000)
+        return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_wday, t.tm_hour, t.tm_min, t.tm_sec, subsec)
+
+    def set_rtc_datetime(self, value):
+        year, month, day, _, hour, minute, second, subsec = value
+        self._rtc_base = mpy_time.mktime((year, month, day, hour, minute, second, 0, 0)) + subsec / 1_000_000
+        self._rtc_base_us = self.clock.us
+
+    def adc_value(self, pin):
+        return self._adc(pin, self.clock.epoch())
+
+    def account(self, state, us):
+        self.time_in[state] = self.time_in.get(state, 0) + us
+
+    def sleep(self, state, ms):
+        """Light or deep sleep: the timer runs off the (drifting) RTC clock."""
+        self.charge_cpu()
+        us = int(ms * 1000 / (1 + self.rtc_drift_ppm / 1_000_000))
+        self.clock.us += us
+        self.account(state, us)
+        if state == "lightsleep":
+            self.check_watchdog()
+        self.wakes_us.append(self.clock.us)
+        if self.wake_budget is not None:
+            self.wake_budget -= 1
+        if state == "lightsleep" and (
+                (self.wake_budget is not None and self.wake_budget <= 0) or
+                (self.run_until_us is not None and self.clock.us >= self.run_until_us)):
+            raise machine.PowerOff()
+
+    def charge_cpu(self):
+        if self.cpu_scale:
+            now = host_time.thread_time()
+            self.clock.us += int((now - self._cpu_mark) * self.cpu_scale * 1_000_000)
+            self._cpu_mark = now
+
+    def flash_time(self, us, write=False):
+        self.clock.us += int(us)
+        if write:
+            self.account("flash_write", int(us))
+
+    def watchdog(self, timeout_ms=None):
+        """Start (with timeout_ms) or feed the watchdog."""
+        self.check_watchdog()
+        if timeout_ms is not None:
+            self._wdt_timeout_us = timeout_ms * 1000
+        self.wdt_deadline_us = self.clock.us + self._wdt_timeout_us
+
+    def check_watchdog(self):
+        if self.wdt_deadline_us is not None and self.clock.us > self.wdt_deadline_us:
+            self.wdt_deadline_us = None
+            raise machine.WatchdogReset()
+
+    def radio_start(self, state):
+        self._radio_since.setdefault(state, self.clock.us)
+
+    def radio_stop(self, state):
+        since = self._radio_since.pop(state, None)
+        if since is not None:
+            self.account(state, self.clock.us - since)
+
+    # ------------------------- firmware -------------------------
+    @contextlib.contextmanager
+    def install(self):
+        """Swap in the simulated MicroPython modules and import firmware fresh."""
+        fakes = {
+            "machine": machine,
+            "time": mpy_time,
+            "uasyncio": uasyncio,
+            "asyncio": uasyncio,
+            "uos": uos,
+            "bluetooth": bluetooth,
+        }
+        fakes.update(stubs.modules())
+        for module in (machine, mpy_time, uasyncio, uos, bluetooth):
+            module._board = self
+
+        saved_modules = dict(sys.modules)
+        saved_path = list(sys.path)
+        sys.modules.update(fakes)
+        sys.path[:0] = [FIRMWARE_DIR, os.path.join(FIRMWARE_DIR, "lib")]
+        builtins.const = stubs.const
+        builtins.open = uos._open
+        _patch_str_buffers()
+        for name, attrs in self.overrides.items():
+            module = importlib.import_module(name)
+            for attr, value in attrs.items():
+                setattr(module, attr, value)
+        try:
+            if self.verbose:
+                yield
+            else:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    yield
+        finally:
+            builtins.open = uos._host_open
+            del builtins.const
+            sys.path[:] = saved_path
+            for name in list(sys.modules):
+                if name not in saved_modules:
+                    del sys.modules[name]
+            sys.modules.update({name: saved_modules[name] for name in fakes if name in saved_modules})
+
+    def boot(self):
+        """Run boot.py from reset until it enters deep sleep."""
+        self.boots += 1
+        self.boot_us = self.clock.us
+        # ROM bootloader, interpreter start-up and module imports.
+        self.clock.advance_ms(self.boot_ms)
+        self.account("boot", self.boot_ms * 1000)
+
+        sleep_ms = None
+        reset_cause = machine.DEEPSLEEP_RESET
+        self.wdt_deadline_us = None
+        start = self.clock.us
+        self._cpu_mark = host_time.thread_time()
+        with self.install():
+            try:
+                exec(self._boot_code, {"__name__": "__main__", "__file__": "boot.py"})
+            except machine.DeepSleep as e:
+                sleep_ms = e.ms
+            except machine.PowerOff:
+                pass
+            except machine.WatchdogReset:
+                self.watchdog_resets += 1
+                # The reset ends this wake: count it, or a watchdog that keeps
+                # firing would reboot forever within run().
+                self.wakes_us.append(self.clock.us)
+                if self.wake_budget is not None:
+                    self.wake_budget -= 1
+                sleep_ms = 0
+                reset_cause = machine.WDT_RESET
+            self.charge_cpu()
+        # Reset drops any connection and stops the radio.
+        if self.link:
+            self.link.reset()
+        for state in list(self._radio_since):
+            self.radio_stop(state)
+        awake_us = self.clock.us - start
+        self.account("awake", awake_us)
+
+        if sleep_ms is not None:
+            if sleep_ms:
+                self.sleep("deepsleep", sleep_ms)
+            self.reset_cause = reset_cause
+        return CycleResult(awake_us / 1000, sleep_ms)
+
+    def run(self, cycles):
+        """Run for a number of wake cycles (boots from deep sleep or wakes from
+        light sleep); stops early if the firmware sleeps forever."""
+        results = []
+        self.wake_budget = cycles
+        try:
+            while self.wake_budget > 0:
+                result = self.boot()
+                results.append(result)
+                if result.sleep_ms is None:
+                    break
+        finally:
+            self.wake_budget = None
+        return results
+
+    def run_for(self, seconds):
+        """Run wake cycles for an amount of simulated time, up to the first
+        wake after it; stops early if the firmware sleeps forever."""
+        self.run_until_us = self.clock.us + int(seconds * 1_000_000)
+        try:
+            while self.clock.us < self.run_until_us:
+                if self.boot().sleep_ms is None:
+                    break
+        finally:
+            self.run_until_us = None
+
+    def provision(self, period, channels=None):
+        """Register the node the way the settings write does: RTC time plus log
+        period, and optionally channel periods such as {"res": 900}."""
+        with self.install():
+            import channel_schedule
+            from rtc_manager import RTCManager
+
+            rtc_manager = RTCManager()
+            t = host_time.gmtime(int(self.clock.epoch()) + EPOCH_2000)
+            epoch = rtc_manager.set_rtc_datetime([t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec])
+            rtc_manager.save_rtc_memory(epoch, period, epoch)
+            if channels:
+                channel_schedule.load(rtc_manager)
+                channel_schedule.configure(channels)
+
+    # ------------------------- inspection -------------------------
+    def path(self, name):
+        return os.path.join(self.fs.root, name)
+
+    def log_bytes(self):
+        """Bytes held in the log segments, without their indexes."""
+        log_dir = self.path("log")
+        if not os.path.isdir(log_dir):
+            return 0
+        return sum(os.path.getsize(os.path.join(log_dir, name))
+                   for name in os.listdir(log_dir) if name.endswith(".csv"))
+
+    def logged_records(self):
+        """Records currently held in the log segments."""
+        log_dir = self.path("log")
+        if not os.path.isdir(log_dir):
+            return 0
+        count = 0
+        for name in os.listdir(log_dir):
+            if name.endswith(".csv"):
+                with open(os.path.join(log_dir, name)) as file:
+                    count += sum(1 for _ in file) - 1
+        return count
+
+    def cleanup(self):
+        shutil.rmtree(self.fs.root, ignore_errors=True)
+
+
+def _patch_str_buffers():
+    """MicroPython str supports the buffer protocol, so `bytes + str` works on
+    the device; aioble relies on it for the advertised name."""
+    from aioble import peripheral
+
+    append = peripheral._append
+
+    def _append(adv_data, resp_data, adv_type, value):
+        if isinstance(value, str):
+            value = value.encode()
+        return append(adv_data, resp_data, adv_type, value)
+
+    peripheral._append = _append
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as file:
+        return file.read()
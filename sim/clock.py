@@ -0,0 +1,34 @@
+""" sim/clock.py """
+# Virtual time shared by every simulated peripheral.
+#
+# Nothing in the simulator waits for real time: sleeps, conversions,
+# deep sleep and the event loop all advance this clock instead.
+import calendar
+import math
+
+# MicroPython on the ESP32 counts epoch seconds from 2000-01-01.
+EPOCH_2000 = 946684800
+
+
+class SimClock:
+    def __init__(self, start=(2025, 3, 1, 0, 0, 0)):
+        # True device-epoch seconds at the start of the simulation.
+        self.start_epoch = calendar.timegm(tuple(start) + (0, 0, 0)) - EPOCH_2000
+        # Integer microseconds since the start, so long runs do not accumulate
+        # floating point error.
+        self.us = 0
+
+    def advance(self, seconds):
+        if seconds > 0:
+            self.us += math.ceil(round(seconds * 1_000_000, 3))
+
+    def advance_ms(self, ms):
+        self.advance(ms / 1000)
+
+    def monotonic(self):
+        """Seconds since the start of the simulation."""
+        return self.us / 1_000_000
+
+    def epoch(self):
+        """True device-epoch seconds (float)."""
+        return self.start_epoch + self.us / 1_000_000
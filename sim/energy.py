@@ -0,0 +1,70 @@
+""" sim/energy.py """
+# Charge drawn by the node, from the time a simulation spent in each phase.
+#
+# Board.time_in accumulates virtual time per state; "awake" spans the whole
+# of boot.py including light sleep, so the CPU-active time is awake minus
+# lightsleep. The other phases run while the CPU is active and are charged
+# on top of it:
+#
+#   conversion    BME280 forced conversion (its length follows the
+#                 oversampling, see sim/bme280_chip.measurement_ms)
+#   flash_write   SPI flash program time of the log, spool and index writes
+#   adv_airtime   advertising TX events
+#   connected     radio time in a connection (an average over connection
+#                 events, not per packet)
+#
+# Currents are typical ESP32-WROOM-32 / BME280 / SPI flash figures at
+# 3.3 V, not measurements of this board; pass other ones to compare.
+
+VOLTAGE = 3.3
+
+CURRENT_MA = {
+    "boot": 45.0,          # ROM bootloader, interpreter start-up and imports
+    "active": 22.0,        # CPU at 80 MHz, radio idle
+    "lightsleep": 0.8,
+    "deepsleep": 0.010,
+    "conversion": 0.7,     # BME280 measuring
+    "flash_write": 15.0,   # SPI flash page program
+    "adv_airtime": 110.0,
+    "connected": 12.0,
+}
+
+# Battery: the share of the rated capacity used before brown-out, and the
+# self-discharge of a Li-ion/LiPo cell, which dominates at deep sleep currents.
+BATTERY_USABLE = 0.85
+SELF_DISCHARGE_PER_MONTH = 0.02
+
+
+def state_times_s(board):
+    """Seconds spent per charged phase."""
+    time_in = board.time_in
+    times = {
+        "boot": time_in.get("boot", 0),
+        "active": time_in.get("awake", 0) - time_in.get("lightsleep", 0),
+    }
+    for state in ("lightsleep", "deepsleep", "conversion", "flash_write", "adv_airtime", "connected"):
+        times[state] = time_in.get(state, 0)
+    return {state: us / 1e6 for state, us in times.items()}
+
+
+def charge_mas(board, currents=CURRENT_MA):
+    """Charge per phase in mA*s."""
+    return {state: seconds * currents[state] for state, seconds in state_times_s(board).items()}
+
+
+def energy_mj(board, currents=CURRENT_MA):
+    """Total energy in mJ."""
+    return sum(charge_mas(board, currents).values()) * VOLTAGE
+
+
+def mah_per_day(board, currents=CURRENT_MA):
+    """Charge per phase in mAh per simulated day."""
+    days = board.clock.monotonic() / 86400
+    return {state: mas / 3600 / days for state, mas in charge_mas(board, currents).items()}
+
+
+def battery_life_days(mah_day, capacity_mah, usable=BATTERY_USABLE,
+                      self_discharge=SELF_DISCHARGE_PER_MONTH):
+    """Days until a cell of capacity_mah is flat at mah_day of load."""
+    drain = mah_day + capacity_mah * self_discharge / 30
+    return capacity_mah * usable / drain
@@ -0,0 +1,138 @@
+""" sim/machine.py """
+# MicroPython `machine` module for the simulated board.
+import errno
+
+_board = None  # set by Board.install()
+
+PWRON_RESET = 1
+HARD_RESET = 2
+WDT_RESET = 3
+DEEPSLEEP_RESET = 4
+SOFT_RESET = 5
+
+_RTC_MEMORY_MAX = 2048
+
+
+class DeepSleep(BaseException):
+    """Raised by deepsleep() to unwind boot.py; the board then boots again."""
+
+    def __init__(self, ms):
+        super().__init__(ms)
+        self.ms = ms
+
+
+class PowerOff(BaseException):
+    """Raised from lightsleep() when the run ends while the firmware stays resident."""
+
+
+class WatchdogReset(BaseException):
+    """Raised when the watchdog expires; the board then boots again at once."""
+
+
+class WDT:
+    def __init__(self, id=0, timeout=5000):
+        _board.watchdog(timeout)
+
+    def feed(self):
+        _board.watchdog()
+
+
+def deepsleep(ms=0):
+    raise DeepSleep(ms)
+
+
+def lightsleep(ms=0):
+    _board.sleep("lightsleep", ms)
+
+
+def freq(hz=None):
+    if hz is None:
+        return _board.cpu_freq
+    _board.cpu_freq = hz
+
+
+def reset_cause():
+    return _board.reset_cause
+
+
+def unique_id():
+    return b"\x24\x0a\xc4\x00\x00\x01"
+
+
+class Pin:
+    IN = 1
+    OUT = 3
+    OPEN_DRAIN = 7
+    PULL_UP = 1
+    PULL_DOWN = 2
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self._value = value or 0
+
+    def value(self, v=None):
+        if v is None:
+            return self._value
+        self._value = v
+
+    def __repr__(self):
+        return f"Pin({self.id})"
+
+
+class I2C:
+    def __init__(self, id=0, scl=None, sda=None, freq=400000):
+        self.id = id
+
+    def _device(self, addr):
+        device = _board.i2c_devices.get(addr)
+        if device is None:
+            raise OSError(errno.ENODEV)
+        return device
+
+    def scan(self):
+        return sorted(_board.i2c_devices)
+
+    def readfrom_mem(self, addr, memaddr, nbytes, addrsize=8):
+        return self._device(addr).read(memaddr, nbytes)
+
+    def readfrom_mem_into(self, addr, memaddr, buf, addrsize=8):
+        buf[:] = self._device(addr).read(memaddr, len(buf))
+
+    def writeto_mem(self, addr, memaddr, buf, addrsize=8):
+        self._device(addr).write(memaddr, bytes(buf))
+
+
+class ADC:
+    ATTN_0DB = 0
+    ATTN_11DB = 3
+    WIDTH_12BIT = 3
+
+    def __init__(self, pin, atten=None):
+        self._pin = pin.id if isinstance(pin, Pin) else pin
+
+    def atten(self, value):
+        pass
+
+    def width(self, value):
+        pass
+
+    def read(self):
+        _board.adc_reads += 1
+        return _board.adc_value(self._pin)
+
+    def read_u16(self):
+        return self.read() << 4
+
+
+class RTC:
+    def datetime(self, value=None):
+        if value is None:
+            return _board.rtc_datetime()
+        _board.set_rtc_datetime(value)
+
+    def memory(self, data=None):
+        if data is None:
+            return bytes(_board.rtc_memory)
+        if len(data) > _RTC_MEMORY_MAX:
+            raise ValueError("buffer too long")
+        _board.rtc_memory = bytes(data)
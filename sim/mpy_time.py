@@ -0,0 +1,60 @@
+""" sim/mpy_time.py """
+# MicroPython `time` module on top of the simulated board.
+import calendar
+import time as _host_time
+
+from sim.clock import EPOCH_2000
+
+_TICKS_PERIOD = 1 << 30
+_TICKS_HALF = _TICKS_PERIOD // 2
+
+_board = None  # set by Board.install()
+
+
+def _us_since_boot():
+    _board.charge_cpu()
+    return _board.clock.us - _board.boot_us
+
+def ticks_ms():
+    return (_us_since_boot() // 1000) & (_TICKS_PERIOD - 1)
+
+def ticks_us():
+    return _us_since_boot() & (_TICKS_PERIOD - 1)
+
+def ticks_cpu():
+    return ticks_us()
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & (_TICKS_PERIOD - 1)
+
+def ticks_diff(ticks1, ticks2):
+    return ((ticks1 - ticks2 + _TICKS_HALF) & (_TICKS_PERIOD - 1)) - _TICKS_HALF
+
+def sleep(seconds):
+    _board.charge_cpu()
+    _board.clock.advance(seconds)
+
+def sleep_ms(ms):
+    _board.charge_cpu()
+    _board.clock.advance(ms / 1000)
+
+def sleep_us(us):
+    _board.charge_cpu()
+    _board.clock.advance(us / 1_000_000)
+
+def time():
+    return int(_board.rtc_epoch())
+
+def time_ns():
+    return int(_board.rtc_epoch() * 1_000_000_000)
+
+def mktime(t):
+    return calendar.timegm((t[0], t[1], t[2], t[3], t[4], t[5], 0, 0, 0)) - EPOCH_2000
+
+def gmtime(secs=None):
+    if secs is None:
+        secs = time()
+    t = _host_time.gmtime(int(secs) + EPOCH_2000)
+    return (t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec, t.tm_wday, t.tm_yday)
+
+localtime = gmtime
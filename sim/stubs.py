@@ -0,0 +1,75 @@
+""" sim/stubs.py """
+# Small MicroPython modules that only need to exist on the host.
+import gc
+import io
+import struct
+import tracemalloc
+import types
+import zlib
+
+_HEAP_SIZE = 110 * 1024  # MicroPython heap on an ESP32 without PSRAM
+
+
+def _module(name, **attrs):
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    return module
+
+
+def const(value):
+    return value
+
+
+class _WLAN:
+    def __init__(self, interface=0):
+        self._active = False
+
+    def active(self, flag=None):
+        if flag is None:
+            return self._active
+        self._active = bool(flag)
+
+
+class _DeflateIO:
+    """Compressing half of MicroPython's deflate.DeflateIO, backed by zlib."""
+
+    def __init__(self, stream, format=2, wbits=0, close=False):
+        self._stream = stream
+        self._close = close
+        wbits = max(wbits or 8, 9)
+        wbits = {1: -wbits, 3: 16 + wbits}.get(format, wbits)
+        self._compressor = zlib.compressobj(9, zlib.DEFLATED, wbits)
+
+    def write(self, data):
+        self._stream.write(self._compressor.compress(bytes(data)))
+        return len(data)
+
+    def close(self):
+        self._stream.write(self._compressor.flush())
+        if self._close:
+            self._stream.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _mem_alloc():
+    """Heap in use as seen by tracemalloc; 0 unless tracing is on."""
+    return tracemalloc.get_traced_memory()[0] if tracemalloc.is_tracing() else 0
+
+
+def modules():
+    return {
+        "esp": _module("esp", osdebug=lambda level: None),
+        "network": _module("network", STA_IF=0, AP_IF=1, WLAN=_WLAN),
+        "micropython": _module("micropython", const=const, schedule=lambda f, arg: f(arg)),
+        "gc": _module("gc", collect=gc.collect, enable=gc.enable, disable=gc.disable,
+                      isenabled=gc.isenabled, mem_alloc=_mem_alloc,
+                      mem_free=lambda: max(_HEAP_SIZE - _mem_alloc(), 0), threshold=lambda amount=None: -1),
+        "ustruct": struct,
+        "uio": io,
+        "deflate": _module("deflate", AUTO=0, RAW=1, ZLIB=2, GZIP=3, DeflateIO=_DeflateIO),
+    }
@@ -0,0 +1,105 @@
+""" sim/uasyncio.py """
+# MicroPython `asyncio` on top of CPython asyncio, driven by the board's
+# virtual clock. The firmware imports it both as `uasyncio` and `asyncio`.
+import asyncio
+import selectors
+from asyncio import *  # noqa: F401,F403
+
+_board = None  # set by Board.install()
+
+
+class SimDeadlock(Exception):
+    """The event loop went idle with nothing left that could wake it."""
+
+
+class _VirtualSelector(selectors.SelectSelector):
+    def __init__(self, clock):
+        super().__init__()
+        self._clock = clock
+
+    def select(self, timeout=None):
+        ready = super().select(0)
+        if ready:
+            return ready
+        if timeout is None:
+            raise SimDeadlock("event loop idle with no pending timers")
+        self._clock.advance(timeout)
+        if _board:
+            _board.check_watchdog()
+        return []
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    def __init__(self, clock):
+        super().__init__(_VirtualSelector(clock))
+        self._clock = clock
+
+    def time(self):
+        if _board:
+            _board.charge_cpu()
+        return self._clock.monotonic()
+
+
+class ThreadSafeFlag:
+    """Auto-clearing event, as used by aioble for IRQ to task signalling."""
+
+    def __init__(self):
+        self._event = asyncio.Event()
+
+    def set(self):
+        self._event.set()
+
+    def clear(self):
+        self._event.clear()
+
+    async def wait(self):
+        await self._event.wait()
+        self._event.clear()
+
+
+async def sleep_ms(ms):
+    await asyncio.sleep(ms / 1000)
+
+
+async def wait_for(aw, timeout):
+    """MicroPython semantics: always TimeoutError once the timeout expires,
+    even if the cancelled awaitable swallows the cancellation."""
+    task = asyncio.ensure_future(aw)
+    if timeout is None:
+        return await task
+    try:
+        done, _ = await asyncio.wait({task}, timeout=timeout)
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    if task in done:
+        return task.result()
+    task.cancel()
+    try:
+        await task
+    except (asyncio.CancelledError, Exception):
+        pass
+    raise asyncio.TimeoutError
+
+
+async def wait_for_ms(aw, timeout):
+    return await wait_for(aw, timeout / 1000)
+
+
+def run(coro):
+    loop = VirtualTimeLoop(_board.clock)
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        pending = asyncio.all_tasks(loop)
+        for task in pending:
+            task.cancel()
+        if pending:
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def get_event_loop():
+    return asyncio.get_event_loop()
@@ -0,0 +1,149 @@
+""" sim/uos.py """
+# MicroPython `uos` on a host directory standing in for the flash
+# filesystem. Paths are resolved against the board's virtual cwd, and
+# statvfs reports a fixed-size partition.
+import builtins
+import os
+
+_board = None  # set by Board.install()
+
+_BLOCK_SIZE = 4096
+
+_host_open = builtins.open
+
+
+def _path(path):
+    fs = _board.fs
+    if path.startswith("/"):
+        return os.path.join(fs.root, path.lstrip("/"))
+    return os.path.join(fs.root, fs.cwd, path)
+
+
+def _open(path, mode="r", *args, **kwargs):
+    """Stands in for the builtin open() while firmware runs, counting flash writes."""
+    # Host paths into the flash directory (the simulator reading it back) are
+    # left alone; any other path, absolute ones included, is a firmware path.
+    if isinstance(path, str) and not path.startswith(_board.fs.root + os.sep):
+        path = _path(path)
+    file = _host_open(path, mode, *args, **kwargs)
+    if "r" not in mode or "+" in mode:
+        _board.fs.writes += 1
+    if _board.flash_timing:
+        _board.flash_time(_OPEN_US)
+        return _TimedFile(file)
+    return file
+
+
+# Rough LittleFS-on-SPI-flash costs, charged to the virtual clock.
+_OPEN_US = 1_000
+_READ_CALL_US = 30
+_READ_BYTE_US = 0.5
+_WRITE_CALL_US = 100
+_WRITE_BYTE_US = 5
+
+
+class _TimedFile:
+    """File wrapper that lets reads and writes take virtual time."""
+
+    def __init__(self, file):
+        self._file = file
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._file.close()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self._file.readline()
+        if not line:
+            raise StopIteration
+        _board.flash_time(_READ_CALL_US + len(line) * _READ_BYTE_US)
+        return line
+
+    def read(self, *args):
+        data = self._file.read(*args)
+        _board.flash_time(_READ_CALL_US + len(data) * _READ_BYTE_US)
+        return data
+
+    def readline(self, *args):
+        data = self._file.readline(*args)
+        _board.flash_time(_READ_CALL_US + len(data) * _READ_BYTE_US)
+        return data
+
+    def readinto(self, buf):
+        size = self._file.readinto(buf)
+        _board.flash_time(_READ_CALL_US + (size or 0) * _READ_BYTE_US)
+        return size
+
+    def write(self, data):
+        size = self._file.write(data)
+        _board.flash_time(_WRITE_CALL_US + len(data) * _WRITE_BYTE_US, write=True)
+        return size
+
+
+def stat(path):
+    return tuple(os.stat(_path(path)))[:10]
+
+
+def listdir(path="."):
+    return sorted(os.listdir(_path(path)))
+
+
+def ilistdir(path="."):
+    for name in listdir(path):
+        full = os.path.join(_path(path), name)
+        yield (name, 0x4000 if os.path.isdir(full) else 0x8000, 0)
+
+
+def mkdir(path):
+    os.mkdir(_path(path))
+
+
+def rmdir(path):
+    os.rmdir(_path(path))
+
+
+def remove(path):
+    os.remove(_path(path))
+    _board.fs.writes += 1
+
+
+def rename(old, new):
+    os.rename(_path(old), _path(new))
+    _board.fs.writes += 1
+
+
+def getcwd():
+    cwd = _board.fs.cwd
+    return "/" + cwd if cwd else "/"
+
+
+def chdir(path):
+    fs = _board.fs
+    target = os.path.normpath(_path(path))
+    if not os.path.isdir(target):
+        raise OSError(2)
+    rel = os.path.relpath(target, fs.root)
+    fs.cwd = "" if rel == "." else rel
+
+
+def statvfs(path="/"):
+    fs = _board.fs
+    used = 0
+    for base, _, files in os.walk(fs.root):
+        for name in files:
+            used += -(-os.path.getsize(os.path.join(base, name)) // _BLOCK_SIZE)
+    blocks = fs.size // _BLOCK_SIZE
+    free = max(blocks - used, 0)
+    return (_BLOCK_SIZE, _BLOCK_SIZE, blocks, free, free, 0, 0, 0, 0, 255)
+
+
+def sync():
+    pass
@@ -0,0 +1,59 @@
+""" bench_deflate.py
+
+Plain JSON batches vs deflate frames for the BLE export: bytes on air,
+notifications, encode CPU time and the resulting sync time with the
+0.3 s notification pacing of BLEManager.send_data. Run it on the device
+(upload ble_frames.py and sample_trace.py alongside).
+"""
+import ble_frames
+from sample_trace import make_trace
+
+try:
+    from time import ticks_us, ticks_diff
+except ImportError:
+    from time import perf_counter
+
+    def ticks_us():
+        return int(perf_counter() * 1_000_000)
+
+    def ticks_diff(a, b):
+        return a - b
+
+_RECORD_COUNTS = [48, 336, 1440]
+_LOG_PERIOD = 1800
+_CHUNK_SIZE = 5        # aioble_manager._BLE_CHUNK_SIZE
+_BLOCK_SIZE = 50       # aioble_manager._BLE_BLOCK_SIZE
+_FRAME_SIZE = 244      # MTU 247 phone
+_PACING_S = 0.3        # asyncio.sleep between notifications in send_data
+
+def run_plain(records):
+    start = ticks_us()
+    frames = [ble_frames.encode_batch(records[i:i + _CHUNK_SIZE])
+              for i in range(0, len(records), _CHUNK_SIZE)]
+    return frames, ticks_diff(ticks_us(), start)
+
+def run_deflate(records):
+    start = ticks_us()
+    frames = []
+    for i in range(0, len(records), _BLOCK_SIZE):
+        frames += ble_frames.deflate_frames(records[i:i + _BLOCK_SIZE], _FRAME_SIZE)
+    return frames, ticks_diff(ticks_us(), start)
+
+def report(name, frames, cpu_us):
+    on_air = sum(len(f) for f in frames)
+    sync_s = cpu_us / 1_000_000 + len(frames) * _PACING_S
+    too_big = sum(1 for f in frames if len(f) > _FRAME_SIZE)
+    print(f"  {name:8s} on-air={on_air}B frames={len(frames)} cpu={cpu_us / 1000:.1f}ms "
+          f"sync~{sync_s:.1f}s truncated_at_mtu={too_big}")
+    return on_air
+
+
+if not ble_frames.deflate:
+    print("deflate module not available in this build")
+else:
+    for count in _RECORD_COUNTS:
+        records = make_trace(count, _LOG_PERIOD)
+        print(f"records={count}")
+        plain = report("plain", *run_plain(records))
+        compressed = report("deflate", *run_deflate(records))
+        print(f"  on-air ratio={plain / compressed:.1f}x")
@@ -0,0 +1,82 @@
+""" bench_send_alloc.py
+
+Heap allocations and GC cycles while exporting 10k records, for the
+export paths of BLEManager.send_data:
+  - segments: read_csv_file + JSON batch per notification
+  - spool: spooled frames as new bytes objects
+  - spool+view: spooled frames read into one reusable buffer
+Runs on the device in a scratch directory (upload file_utils.py,
+payload_spool.py, ble_frames.py and sample_trace.py alongside).
+"""
+import gc
+import uos
+import ble_frames
+import file_utils
+import payload_spool
+from sample_trace import make_trace
+
+_SCRATCH_DIR = "bench_alloc"
+_RECORD_COUNT = 10_000
+_LOG_PERIOD = 60
+_CHUNK_SIZE = 5       # aioble_manager._BLE_CHUNK_SIZE
+_TX_BUF_SIZE = 512    # aioble_manager._TX_BUF_SIZE
+
+class HeapMeter:
+    """Accumulate allocated bytes and count collections from mem_alloc samples."""
+
+    def __init__(self):
+        gc.collect()
+        self.allocated = 0
+        self.collections = 0
+        self._last = gc.mem_alloc()
+
+    def sample(self):
+        now = gc.mem_alloc()
+        if now < self._last:
+            self.collections += 1
+        else:
+            self.allocated += now - self._last
+        self._last = now
+
+def segment_frames():
+    for segment in file_utils.list_segments():
+        data = file_utils.read_csv_file(segment)
+        for i in range(0, len(data), _CHUNK_SIZE):
+            yield ble_frames.encode_batch(data[i:i + _CHUNK_SIZE])
+
+def run(name, frames):
+    meter = HeapMeter()
+    sent = 0
+    for payload in frames:
+        sent += len(payload)  # stands in for temp_humidity_char.write
+        meter.sample()
+    print(f"{name:10s} bytes={sent} allocated={meter.allocated}B gc_cycles={meter.collections}")
+
+def _remove_tree(path):
+    for name in uos.listdir(path):
+        child = f"{path}/{name}"
+        try:
+            uos.remove(child)
+        except OSError:
+            _remove_tree(child)
+    uos.rmdir(path)
+
+
+home = uos.getcwd()
+uos.mkdir(_SCRATCH_DIR)
+uos.chdir(_SCRATCH_DIR)
+try:
+    file_utils.create_csv_file()
+    records = [[str(v) for v in r] for r in make_trace(_RECORD_COUNT, _LOG_PERIOD)]
+    for record in records:
+        file_utils.append_csv_file(record, int(record[0]))
+    payload_spool.seed(records)
+    del records
+
+    view = memoryview(bytearray(_TX_BUF_SIZE))
+    run("segments", segment_frames())
+    run("spool", payload_spool.frames())
+    run("spool+view", payload_spool.frames(view))
+finally:
+    uos.chdir(home)
+    _remove_tree(_SCRATCH_DIR)
@@ -0,0 +1,86 @@
+""" bench_spool.py
+
+Sync-time CPU cost of exporting the log: re-reading and re-encoding the
+segments (send_data) vs streaming the frames spooled at log time, plus
+the extra cost the spool adds to each logged record. Runs on the device
+in a scratch directory (upload payload_spool.py, ble_frames.py,
+file_utils.py and sample_trace.py alongside).
+"""
+import uos
+import json
+import ble_frames
+import file_utils
+import payload_spool
+from sample_trace import make_trace
+
+try:
+    from time import ticks_us, ticks_diff
+except ImportError:
+    from time import perf_counter
+
+    def ticks_us():
+        return int(perf_counter() * 1_000_000)
+
+    def ticks_diff(a, b):
+        return a - b
+
+_SCRATCH_DIR = "bench_spool"
+_RECORD_COUNTS = [48, 336]
+_LOG_PERIOD = 1800
+_CHUNK_SIZE = 5  # aioble_manager._BLE_CHUNK_SIZE
+
+def _remove_tree(path):
+    for name in uos.listdir(path):
+        child = f"{path}/{name}"
+        try:
+            uos.remove(child)
+        except OSError:
+            _remove_tree(child)
+    uos.rmdir(path)
+
+def bench(count):
+    file_utils.create_csv_file()
+    records = [[str(v) for v in r] for r in make_trace(count, _LOG_PERIOD)]
+
+    log_us = 0
+    spool_us = 0
+    for record in records:
+        start = ticks_us()
+        file_utils.append_csv_file(record, int(record[0]))
+        log_us += ticks_diff(ticks_us(), start)
+        start = ticks_us()
+        payload_spool.append(record)
+        spool_us += ticks_diff(ticks_us(), start)
+
+    start = ticks_us()
+    encoded = []
+    for segment in file_utils.list_segments():
+        data = file_utils.read_csv_file(segment)
+        for i in range(0, len(data), _CHUNK_SIZE):
+            encoded.append(ble_frames.encode_batch(data[i:i + _CHUNK_SIZE]))
+    encode_us = ticks_diff(ticks_us(), start)
+
+    start = ticks_us()
+    spooled = list(payload_spool.frames())
+    stream_us = ticks_diff(ticks_us(), start)
+
+    # send_data restarts batching at segment boundaries, so compare the records.
+    unpack = lambda frames: [r for f in frames for r in json.loads(f)["data"]]
+    assert unpack(spooled) == unpack(encoded) == records, "spool differs from the log"
+    print(f"records={count} frames={len(spooled)}")
+    print(f"  log time: csv={log_us / count:.0f} us/record spool=+{spool_us / count:.0f} us/record")
+    print(f"  sync cpu: re-encode={encode_us / 1000:.1f} ms spool={stream_us / 1000:.1f} ms")
+
+    file_utils.clear_csv_file()
+    payload_spool.reset()
+
+
+home = uos.getcwd()
+uos.mkdir(_SCRATCH_DIR)
+uos.chdir(_SCRATCH_DIR)
+try:
+    for count in _RECORD_COUNTS:
+        bench(count)
+finally:
+    uos.chdir(home)
+    _remove_tree(_SCRATCH_DIR)
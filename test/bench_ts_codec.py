@@ -0,0 +1,64 @@
+""" bench_ts_codec.py
+
+ts_codec compression ratio and per-record cost on realistic sensor traces.
+Run it on the device (upload next to ts_codec.py) or on the host with
+`PYTHONPATH=.:test python3 test/bench_ts_codec.py`.
+"""
+import json
+
+import ts_codec
+from sample_trace import make_trace
+
+try:
+    from time import ticks_us, ticks_diff
+except ImportError:
+    from time import perf_counter
+
+    def ticks_us():
+        return int(perf_counter() * 1_000_000)
+
+    def ticks_diff(a, b):
+        return a - b
+
+_TRACE_SIZES = [48, 336, 1440]   # 1 day @30min, 1 week @30min, 1 day @1min
+_LOG_PERIODS = [1800, 1800, 60]
+_BATCH_SIZE = 48
+
+def to_rows(records):
+    return [
+        (r[0],) + tuple(ts_codec.to_fixed(v, s) for v, s in zip(r[1:], ts_codec.SCALES))
+        for r in records
+    ]
+
+def bench(count, period):
+    records = make_trace(count, period)
+    rows = to_rows(records)
+
+    csv_bytes = sum(len(",".join(map(str, r))) + 1 for r in records)
+    json_bytes = 0
+    codec_bytes = 0
+    encode_us = 0
+    decode_us = 0
+    for i in range(0, count, _BATCH_SIZE):
+        batch = rows[i:i + _BATCH_SIZE]
+        json_bytes += len(json.dumps({"data": records[i:i + _BATCH_SIZE]}))
+
+        start = ticks_us()
+        data = ts_codec.encode(batch)
+        encode_us += ticks_diff(ticks_us(), start)
+        codec_bytes += len(data)
+
+        start = ticks_us()
+        decoded = ts_codec.decode(data)
+        decode_us += ticks_diff(ticks_us(), start)
+        assert decoded == [tuple(r) for r in batch]
+
+    print(f"records={count} period={period}s")
+    print(f"  csv={csv_bytes}B json={json_bytes}B codec={codec_bytes}B "
+          f"({codec_bytes / count:.1f} B/record)")
+    print(f"  ratio vs csv={csv_bytes / codec_bytes:.1f}x vs json={json_bytes / codec_bytes:.1f}x")
+    print(f"  encode={encode_us / count:.1f} us/record decode={decode_us / count:.1f} us/record")
+
+
+for size, period in zip(_TRACE_SIZES, _LOG_PERIODS):
+    bench(size, period)
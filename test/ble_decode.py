@@ -0,0 +1,98 @@
+""" ble_decode.py
+
+Host-side decoder for export notifications of the temperature/humidity
+characteristic. Plain frames are JSON batches; deflate frames are joined
+until the end-of-block frame and inflated (see ble_frames.py). Time
+sync replies are skipped (decode_sync reads them).
+
+Records carry their timestamp as epoch seconds since 2000-01-01 (the
+MicroPython epoch); the decoder turns it into 'YYYY-MM-DDTHH:MM:SS'.
+
+Usage: python3 test/ble_decode.py notifications.txt
+       (one hex-encoded notification payload per line)
+"""
+import json
+import struct
+import sys
+import time
+import zlib
+
+_EPOCH_2000 = 946684800  # 2000-01-01 in Unix time
+
+_CHANNELS = 3  # temperature, humidity, resistance
+
+_FRAME_DEFLATE = 0x01
+_FRAME_DEFLATE_END = 0x02
+_FRAME_SYNC = 0x03
+_SYNC_FORMAT = "<BqqH"
+
+# Diagnostics characteristic (see diagnostics.py)
+_DIAG_FORMAT = "<BIIHIIHHBIIHB"
+_DIAG_V2_FORMAT = "<BIHHIIHHBIIHB"  # awake_avg_ms as H
+_DIAG_FIELDS = ("version", "wakes", "awake_avg_ms", "sensor_ms", "bytes_sent", "records_sent",
+                "failed_notify", "resends", "last_error", "log_bytes", "fs_free", "overruns", "overrun_phase")
+_DIAG_V1_FORMAT = "<BIHHIIHHBII"
+# heap_probe statistics after the counters, one entry per phase, when the probe is on
+_HEAP_PHASES = ("sensor", "read", "encode", "irq")
+_HEAP_FORMAT = "<IIIHH"
+_HEAP_FIELDS = ("peak_alloc", "max_growth", "min_free", "collections", "calls")
+
+def format_timestamp(value):
+    """ISO timestamp of a record; older firmware already sent ISO strings."""
+    if isinstance(value, str) and not value.isdigit():
+        return value
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(int(value) + _EPOCH_2000))
+
+
+def decode_frames(frames):
+    """Turn a sequence of notification payloads into the list of records."""
+    records = []
+    pending = bytearray()
+    for frame in frames:
+        if frame[:1] == b"{":
+            records += json.loads(frame)["data"]
+        elif frame[0] in (_FRAME_DEFLATE, _FRAME_DEFLATE_END):
+            pending += frame[1:]
+            if frame[0] == _FRAME_DEFLATE_END:
+                records += json.loads(zlib.decompress(bytes(pending)))["data"]
+                pending = bytearray()
+        elif frame[0] == _FRAME_SYNC:
+            continue  # time sync reply, see decode_sync
+        else:
+            raise ValueError(f"Unknown frame type: 0x{frame[0]:02x}")
+    if pending:
+        raise ValueError("Truncated deflate block")
+    return [[format_timestamp(record[0])] + sparse_values(record[1:]) for record in records]
+
+
+def sparse_values(values):
+    """Channel values of a record with None for the channels not sampled in its
+    wake, which the firmware leaves empty or out (see channel_schedule.py)."""
+    values = [None if value == "" else value for value in values]
+    return values + [None] * (_CHANNELS - len(values))
+
+
+def decode_sync(frame):
+    """Turn a time sync reply into (t1, t2, t3) in ms since 2000-01-01."""
+    _, t1, t2, elapsed = struct.unpack(_SYNC_FORMAT, frame)
+    return t1, t2, t2 + elapsed
+
+
+def decode_diagnostics(data):
+    """Turn a diagnostics characteristic value into a dict of counters."""
+    if len(data) == struct.calcsize(_DIAG_V1_FORMAT):
+        return dict(zip(_DIAG_FIELDS, struct.unpack(_DIAG_V1_FORMAT, data)))
+    layout = _DIAG_V2_FORMAT if data[0] == 2 else _DIAG_FORMAT
+    size = struct.calcsize(layout)
+    counters = dict(zip(_DIAG_FIELDS, struct.unpack(layout, data[:size])))
+    if len(data) > size:
+        entries = struct.iter_unpack(_HEAP_FORMAT, data[size:])
+        counters["heap"] = {name: dict(zip(_HEAP_FIELDS, entry)) for name, entry in zip(_HEAP_PHASES, entries)}
+    return counters
+
+
+if __name__ == "__main__":
+    with open(sys.argv[1]) as file:
+        frames = [bytes.fromhex(line.strip()) for line in file if line.strip()]
+    for record in decode_frames(frames):
+        print(",".join("" if value is None else str(value) for value in record))
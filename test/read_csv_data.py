@@ -1,24 +1,33 @@
-_DATA_FILE = "data.csv"
+import uos
+
+_LOG_DIR = "log"
 
 def read_csv_data():
-    """📖 CSV 파일을 읽고 데이터를 리스트로 반환"""
+    """📖 로그 세그먼트 CSV 파일들을 읽고 데이터를 리스트로 반환"""
     try:
-        with open(_DATA_FILE, "r") as file:
-            lines = file.readlines()  # 모든 줄을 읽음
+        segments = sorted(name for name in uos.listdir(_LOG_DIR) if name.endswith(".csv"))
+    except OSError:
+        print(f"⚠️ No log directory: {_LOG_DIR}")
+        return []
 
-        if len(lines) <= 1:
-            print("⚠️ No sensor data available.")
-            return []
+    parsed_data = []
+    for name in segments:
+        path = f"{_LOG_DIR}/{name}"
+        try:
+            with open(path, "r") as file:
+                lines = file.readlines()  # 모든 줄을 읽음
 
-        data_lines = lines[1:]  # 첫 줄(헤더) 제외
-        parsed_data = [line.strip().split(",") for line in data_lines]  # 데이터 파싱
-        print(f"✅ Read {len(parsed_data)} records from {_DATA_FILE}")
-        return parsed_data
+            data_lines = lines[1:]  # 첫 줄(헤더) 제외
+            parsed_data += [line.strip().split(",") for line in data_lines]  # 데이터 파싱
+            print(f"✅ Read {len(data_lines)} records from {path}")
 
-    except Exception as e:
-        print(f"⚠️ Error reading {_DATA_FILE}: {e}")
-        return []
+        except Exception as e:
+            print(f"⚠️ Error reading {path}: {e}")
+
+    if not parsed_data:
+        print("⚠️ No sensor data available.")
+    return parsed_data
     
 
 csv_data = read_csv_data()
-print(csv_data)
\ No newline at end of file
+print(csv_data)
@@ -0,0 +1,23 @@
+""" sample_trace.py
+
+Synthetic sensor logs shared by the benchmark scripts.
+"""
+import math
+
+def make_trace(count, period, seed=1):
+    """Diurnal temperature/humidity with sensor noise and a slowly drifting resistance."""
+    state = seed
+    rows = []
+    epoch = 794_000_000
+    resistance = 1200.0
+    for i in range(count):
+        state = (state * 1103515245 + 12345) & 0x7FFFFFFF
+        noise = (state % 1000) / 1000 - 0.5
+        day = 2 * math.pi * (epoch % 86400) / 86400
+        temp = 22.0 + 3.0 * math.sin(day) + 0.05 * noise
+        hum = 45.0 - 8.0 * math.sin(day) + 0.2 * noise
+        resistance += noise
+        rows.append([epoch, "{:.2f}".format(temp), "{:.02f}".format(hum), str(resistance)])
+        # Wake-up jitter: the RTC occasionally lands a second late.
+        epoch += period + (1 if state % 7 == 0 else 0)
+    return rows
@@ -0,0 +1,168 @@
+""" ts_codec.py """
+# Columnar compressor for batches of sensor records.
+#
+# A batch is a list of rows (epoch, v1, ..., vk) of integers, with the
+# channel values already in fixed point (see to_fixed). Layout:
+#
+#   version (1 byte), row count (varint), channel count (varint)
+#   timestamps: first epoch (varint), first delta (zigzag varint),
+#               delta-of-deltas bit-packed at the width of the largest one
+#   each channel: first value (zigzag varint), deltas (zigzag varints)
+#
+# Only plain Python is used so the same module decodes on the host.
+
+_VERSION = 1
+
+# Fixed-point scale per channel: temperature, humidity, resistance.
+SCALES = (100, 100, 10)
+
+# ------------------------- Fixed Point -------------------------
+
+def to_fixed(value, scale):
+    """Convert a logged value ('23.45', 23.45) to a fixed-point integer."""
+    value = float(value) * scale
+    return int(value + 0.5) if value >= 0 else -int(-value + 0.5)
+
+def from_fixed(value, scale):
+    return value / scale
+
+# ------------------------- Primitives -------------------------
+
+def _zigzag(n):
+    return n << 1 if n >= 0 else ((-n) << 1) - 1
+
+def _unzigzag(n):
+    return n >> 1 if not n & 1 else -((n + 1) >> 1)
+
+def _put_varint(out, n):
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+def _get_varint(data, pos):
+    n = 0
+    shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return n, pos
+        shift += 7
+
+def _pack_bits(out, values):
+    """Append the bit width, then the values packed LSB first at that width."""
+    width = 0
+    for v in values:
+        while v >> width:
+            width += 1
+    out.append(width)
+    if not width:
+        return
+    acc = 0
+    bits = 0
+    for v in values:
+        acc |= v << bits
+        bits += width
+        while bits >= 8:
+            out.append(acc & 0xFF)
+            acc >>= 8
+            bits -= 8
+    if bits:
+        out.append(acc & 0xFF)
+
+def _unpack_bits(data, pos, count):
+    width = data[pos]
+    pos += 1
+    if not width:
+        return [0] * count, pos
+    mask = (1 << width) - 1
+    values = []
+    acc = 0
+    bits = 0
+    for _ in range(count):
+        while bits < width:
+            acc |= data[pos] << bits
+            pos += 1
+            bits += 8
+        values.append(acc & mask)
+        acc >>= width
+        bits -= width
+    return values, pos
+
+# ------------------------- Batch Codec -------------------------
+
+def encode(rows):
+    """Encode a list of (epoch, v1, ..., vk) integer rows into bytes."""
+    out = bytearray()
+    out.append(_VERSION)
+    count = len(rows)
+    _put_varint(out, count)
+    if not count:
+        _put_varint(out, 0)
+        return bytes(out)
+
+    channels = len(rows[0]) - 1
+    _put_varint(out, channels)
+
+    # Timestamps: nearly periodic, so the delta-of-deltas are mostly zero.
+    prev = rows[0][0]
+    _put_varint(out, prev)
+    if count > 1:
+        delta = rows[1][0] - prev
+        _put_varint(out, _zigzag(delta))
+        prev = rows[1][0]
+        dods = []
+        for row in rows[2:]:
+            d = row[0] - prev
+            dods.append(_zigzag(d - delta))
+            delta = d
+            prev = row[0]
+        _pack_bits(out, dods)
+
+    # Channels: slowly changing, so small zigzag deltas fit in one byte.
+    for c in range(1, channels + 1):
+        prev = rows[0][c]
+        _put_varint(out, _zigzag(prev))
+        for row in rows[1:]:
+            v = row[c]
+            _put_varint(out, _zigzag(v - prev))
+            prev = v
+
+    return bytes(out)
+
+def decode(data):
+    """Decode bytes produced by encode() back into a list of integer rows."""
+    if not data or data[0] != _VERSION:
+        raise ValueError("Unsupported ts_codec batch")
+    count, pos = _get_varint(data, 1)
+    channels, pos = _get_varint(data, pos)
+    if not count:
+        return []
+
+    epoch, pos = _get_varint(data, pos)
+    epochs = [epoch]
+    if count > 1:
+        delta, pos = _get_varint(data, pos)
+        delta = _unzigzag(delta)
+        epoch += delta
+        epochs.append(epoch)
+        dods, pos = _unpack_bits(data, pos, count - 2)
+        for dod in dods:
+            delta += _unzigzag(dod)
+            epoch += delta
+            epochs.append(epoch)
+
+    columns = [epochs]
+    for _ in range(channels):
+        v, pos = _get_varint(data, pos)
+        v = _unzigzag(v)
+        column = [v]
+        for _ in range(count - 1):
+            d, pos = _get_varint(data, pos)
+            v += _unzigzag(d)
+            column.append(v)
+        columns.append(column)
+
+    return [tuple(column[i] for column in columns) for i in range(count)]
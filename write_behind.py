@@ -0,0 +1,202 @@
+""" write_behind.py """
+# Log mutations held in RAM while the radio is busy.
+#
+# Flash writes stall the CPU and compete with BLE interrupt servicing, so
+# from the start of the wake-up advertising window until the connection
+# ends, appends to the log and the spool and the deletions that follow a
+# delivered export are queued instead of written (hold). commit() applies
+# them in one batch: deletions first, since an export only ever sees what
+# is already on flash, then the appends in order.
+#
+# The queue is mirrored in the RTC memory section "W" as one entry per
+# line, so a reset before the commit loses nothing; load() replays what is
+# left on the next boot. Entries are dropped from the mirror as they are
+# applied, so at most one is applied twice.
+#
+# When the mirror would outgrow RTC memory during a hold, the segment
+# deletions are applied at once (an export reads a segment in one go and
+# skips the ones dropped() reports), and if that is not enough the appends
+# and corrections move to a journal file on flash, replayed by commit()
+# before what is still queued. Appends never reach the log during a hold,
+# so an export cannot send, and then delete, a record it did not read.
+#
+#   a<csv record>           append to the log (A: to the log and the spool)
+#   d<segment>              delete a delivered log segment
+#   c                       delete the whole log
+#   s                       drop the export spool
+#   r<since>,<until>,<ms>   correct logged timestamps (file_utils.retime_records),
+#                           applied after the appends, which it may cover
+#   j<lines>                journal lines already replayed (during commit only)
+import uos
+import file_utils
+import payload_spool
+
+_RTC_SECTION = "W"
+_RTC_MAX = 255 - 8  # leaves room for the j<lines> entry of a commit
+_JOURNAL_FILE = "deferred.txt"
+
+_held = False
+_entries = []  # mirror lines, in the order they were queued
+_deleted = []  # deletions applied early in this hold
+_journaled = False
+_rtc_manager = None
+
+def load(rtc_manager):
+    """Attach to RTC memory and apply anything a reset left behind."""
+    global _rtc_manager, _entries, _journaled
+    _rtc_manager = rtc_manager
+    saved = rtc_manager.get_section(_RTC_SECTION)
+    try:
+        uos.stat(_JOURNAL_FILE)
+        _journaled = True
+    except OSError:
+        pass
+    if saved or _journaled:
+        _entries = saved.decode().split("\n") if saved else []
+        print(f"Replaying {len(_entries)} deferred log writes{' and a journal' if _journaled else ''}")
+        commit()
+
+def hold():
+    """Queue log mutations from now until commit()."""
+    global _held
+    _held = True
+
+# ------------------------- Mutations -------------------------
+
+def append(record, epoch, spool=False):
+    """Append a record to the log (and to the spool)."""
+    if _held:
+        _queue(f"{'A' if spool else 'a'}{','.join(map(str, record))}")
+        return
+    file_utils.append_csv_file(record, epoch)
+    if spool:
+        payload_spool.append(record)
+
+def delete_segment(start_epoch):
+    if _held:
+        _queue(f"d{start_epoch}")
+    else:
+        file_utils.delete_segment(start_epoch)
+
+def clear():
+    if _held:
+        _queue("c")
+    else:
+        file_utils.clear_csv_file()
+
+def reset_spool():
+    if _held:
+        _queue("s")
+    else:
+        payload_spool.reset()
+
+def retime(since_epoch, until_epoch, error_ms):
+    """Correct logged timestamps for a measured clock error; the spool is dropped
+    since its frames carry the old timestamps."""
+    if _held:
+        _queue(f"r{since_epoch},{until_epoch},{error_ms}")
+    else:
+        _retime(f"{since_epoch},{until_epoch},{error_ms}")
+
+def _retime(args):
+    since_epoch, until_epoch, error_ms = map(int, args.split(","))
+    file_utils.retime_records(since_epoch, until_epoch, error_ms)
+    payload_spool.reset()
+
+def dropped(start_epoch=None):
+    """True if the segment (or, without one, the whole log) is queued for deletion."""
+    if "c" in _entries:
+        return True
+    entry = f"d{start_epoch}"
+    return start_epoch is not None and (entry in _entries or entry in _deleted)
+
+def _queue(entry):
+    global _entries, _journaled
+    _entries.append(entry)
+    if len("\n".join(_entries)) > _RTC_MAX:
+        # The mirror would not fit in RTC memory: delete delivered segments now.
+        for entry in _entries:
+            if entry[0] == "d":
+                file_utils.delete_segment(int(entry[1:]))
+                _deleted.append(entry)
+        _entries = [entry for entry in _entries if entry[0] != "d"]
+    if len("\n".join(_entries)) > _RTC_MAX:
+        # Still too long: move the appends to the journal, keeping their order.
+        print("Deferred log writes exceed RTC memory, journaling appends")
+        with open(_JOURNAL_FILE, "a") as file:
+            for entry in _entries:
+                if entry[0] in "aAr":
+                    file.write(entry + "\n")
+        _journaled = True
+        _entries = [entry for entry in _entries if entry[0] not in "aAr"]
+    _mirror()
+
+def _mirror():
+    if _rtc_manager is not None:
+        _rtc_manager.set_section(_RTC_SECTION, "\n".join(_entries).encode() if _entries else None)
+
+# ------------------------- Commit -------------------------
+
+def commit():
+    """Apply the queued mutations and stop holding."""
+    global _held, _entries, _deleted
+    _held = False
+    _deleted = []
+    if not _entries and not _journaled:
+        return
+    deletions = [entry for entry in _entries if entry[0] not in "aArj"]
+    appends = [entry for entry in _entries if entry[0] in "aArj"]
+
+    for entry in deletions:
+        if entry == "c":
+            file_utils.clear_csv_file()
+        elif entry == "s":
+            payload_spool.reset()
+        else:
+            file_utils.delete_segment(int(entry[1:]))
+    _entries = appends
+    _mirror()
+
+    journaled = _replay_journal()
+    while _entries:
+        _apply(_entries[0])
+        _entries = _entries[1:]
+        _mirror()
+    print(f"Committed {len(deletions)} deletions and {len(appends) + journaled} appends")
+
+def _apply(entry):
+    if entry[0] == "r":
+        _retime(entry[1:])
+    else:
+        record = entry[1:].split(",")
+        record[0] = int(record[0])
+        file_utils.append_csv_file(record, record[0])
+        if entry[0] == "A":
+            payload_spool.append(record)
+
+def _replay_journal():
+    """Apply the journaled entries, keeping the count done in the mirror as j<lines>."""
+    global _entries, _journaled
+    if not _journaled:
+        return 0
+    done = 0
+    if _entries and _entries[0][0] == "j":
+        done = int(_entries[0][1:])
+        _entries = _entries[1:]
+    count = 0
+    with open(_JOURNAL_FILE, "r") as file:
+        for line in file:
+            line = line.rstrip("\n")
+            if not line:
+                continue
+            count += 1
+            if count <= done:
+                continue
+            _apply(line)
+            _entries = [f"j{count}"] + [entry for entry in _entries if entry[0] != "j"]
+            _mirror()
+    uos.remove(_JOURNAL_FILE)
+    _journaled = False
+    _entries = [entry for entry in _entries if entry[0] != "j"]
+    _mirror()
+    return count - done